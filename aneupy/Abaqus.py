@@ -31,12 +31,54 @@ from regionToolset import *
 from odbAccess import *
 from odbSection import *
 
+import numpy as np
+
+import abaqusConstants
+
+try:
+    from aneupy import Iges, Index, Materials, Scheduler, Trace
+except ImportError:
+    import Iges
+    import Index
+    import Materials
+    import Scheduler
+    import Trace
+
+# Entity types of the selections and their repository in a part
+ENTITIES = {'face': 'faces', 'edge': 'edges', 'node': 'nodes'}
+
+# Options of the IGES import, of mdb.openIges and of PartFromGeometryFile
+IGES_OPTIONS = {'msbo': True, 'trimCurve': DEFAULT, 'scaleFromFile': OFF}
+PART_OPTIONS = {'combine': False, 'stitchTolerance': 1.0, 'dimensionality': THREE_D, 'type': DEFORMABLE_BODY,
+                'convertToAnalytical': 1, 'stitchEdges': 1}
+
 
 class Database(object):
+    """ Abaqus model database.
+
+        The parts imported from IGES files are kept in parts, by the SHA-1
+        of the file and the import options, so that the models of the
+        database copy them instead of importing the same file again. The
+        last database created is the default one of the models.
+
+        library is the Materials.Library, or the file of one, of the
+        materials added by name to the models. materials keeps the model
+        where each material (by its Materials.Library.key) was first
+        created, so that the other models copy it.
 
-    def __init__(self, **kwargs):
+    """
+
+    current = None
+
+    def __init__(self, library=None, **kwargs):
         Mdb()
 
+        self.parts = {}
+        self.scans = {}
+        self.materials = {}
+        self.library = library if isinstance(library, Materials.Library) else Materials.Library(library)
+        Database.current = self
+
         for odb in session.odbs.values():
             odb.close()
 
@@ -49,60 +91,277 @@ class Database(object):
 
         mdb.saveAs(pathName=os.path.join(file_path, file_name + file_extension))
 
+    def coexecution(self, name, fluid, solid, cpus=1, tokens=None):
+        """ Writes the input files of the fluid and solid Models and returns
+            their co-execution as a Scheduler.Job, to be run by a Scheduler
+        """
+
+        inputs = {}
+        for model in (fluid, solid):
+            job = '{0}_{1}'.format(name, model.name)
+            mdb.Job(name=job, model=model.name, numCpus=cpus)
+            mdb.jobs[job].writeInput(consistencyChecking=OFF)
+            inputs[job] = job + '.inp'
+
+        return Scheduler.Job(name, inputs, directory=os.getcwd(), cpus=cpus, tokens=tokens)
+
 
 class Model(object):
 
-    def __init__(self, name, cfd=False, **kwargs):
+    def __init__(self, name, cfd=False, tracer=None, database=None, **kwargs):
+        """ tracer is an optional Trace.Recorder where the calls to mdb and
+            to the Abaqus model are recorded. database is the Database that
+            shares the imported parts, Database.current by default
+        """
 
         self.name = name
         self.cfd = cfd
+        self.database = database or Database.current
 
         self.parts = {}
         self.materials = {}
+        self.sections = {}
         self.instances = {}
+        self.indices = {}
+
+        self.tracer = tracer
+        self.mdb = Trace.instrument(mdb, tracer, 'abaqus')
 
         if self.cfd:
-            self.model = mdb.Model(name=name, modelType=CFD)
+            model = self.mdb.Model(name=name, modelType=CFD)
         else:
-            self.model = mdb.Model(name=name, modelType=STANDARD_EXPLICIT)
+            model = self.mdb.Model(name=name, modelType=STANDARD_EXPLICIT)
+
+        self.model = Trace.instrument(model, tracer, 'abaqus')
 
         if 'Model-1' in mdb.models and name != 'Model-1':
             del mdb.models['Model-1']
 
-    def part_from_iges(self, iges_file, name=None):
+    def part_from_iges(self, iges_file, name=None, scan=True, **kwargs):
+        """ Imports a part from an IGES file.
+
+            kwargs override IGES_OPTIONS and PART_OPTIONS. The file is first
+            checked with Iges.scan (unless scan is False), which raises
+            Iges.IgesError for broken files, and its statistics are kept in
+            the database. A file already imported with the same options, in
+            this or another model of the database, is copied from that part.
+
+        """
 
         if not name:
             name = os.path.splitext(os.path.basename(iges_file))[0]
 
-        iges = mdb.openIges(iges_file, msbo=True, trimCurve=DEFAULT, scaleFromFile=OFF)
+        iges_options = dict((key, kwargs.get(key, value)) for key, value in IGES_OPTIONS.items())
+        part_options = dict((key, kwargs.get(key, value)) for key, value in PART_OPTIONS.items())
+
+        digest = Iges.digest(iges_file)
+        key = (digest, tuple(sorted(iges_options.items())), tuple(sorted(part_options.items())))
+        parts = self.database.parts if self.database is not None else {}
+
+        if key in parts:
+            self.parts[name] = self.model.Part(name=name, objectToCopy=parts[key])
+            return self.parts[name]
+
+        if scan:
+            scans = self.database.scans if self.database is not None else {}
+            if digest not in scans:
+                scans[digest] = Iges.scan(iges_file)
+
+        iges = self.mdb.openIges(iges_file, **iges_options)
+
+        self.parts[name] = self.model.PartFromGeometryFile(name=name, geometryFile=iges, **part_options)
+        parts[key] = self.parts[name]
+
+        return self.parts[name]
+
+    def index(self, part, entity_type='face'):
+        """ Returns the Index.BoxTree of the faces, edges or nodes of a part.
+
+            The bounding boxes are read from Abaqus once per part and entity
+            type, and kept until invalidate.
+
+        """
 
-        self.parts[name] = self.model.PartFromGeometryFile(name=name,
-            geometryFile=iges, combine=False, stitchTolerance=1.0,
-            dimensionality=THREE_D, type=DEFORMABLE_BODY, convertToAnalytical=1, stitchEdges=1)
+        key = (part, entity_type)
+        if key not in self.indices:
+            entities = getattr(self.parts[part], ENTITIES[entity_type])
 
-    def add_material(self, name, **kwargs):
-        self.materials[name] = self.model.Material(name=name)
+            if entity_type == 'node':
+                labels = np.array([node.label for node in entities], dtype=np.int64)
+                low = np.array([node.coordinates for node in entities], dtype=float).reshape(-1, 3)
+                high = low
+            else:
+                labels = None
+                boxes = [entities[i:i + 1].getBoundingBox() for i in range(len(entities))]
+                low = np.array([box['low'] for box in boxes], dtype=float).reshape(-1, 3)
+                high = np.array([box['high'] for box in boxes], dtype=float).reshape(-1, 3)
 
-        self.density = kwargs.get('density', self.density)
+            self.indices[key] = (Index.BoxTree(low, high), labels)
 
-        self.materials[name].Density(table=((1000.0, ), ))
-        self.materials[name].Viscosity(table=((0.001,), ))
+        return self.indices[key][0]
 
-        self.materials[name].Elastic(table=((materiales[i]['E'], materiales[i]['Nu']), ))
+    def invalidate(self, part=None):
+        """ Drops the indices of a part, or of all of them, after its geometry or mesh changes"""
 
-        self.materials[name].Hyperelastic(
-            materialType=ISOTROPIC, testData=OFF, type=ARRUDA_BOYCE,
-            volumetricResponse=VOLUMETRIC_DATA, table=((1.0, 2.0, 3.0), ))
+        for key in list(self.indices):
+            if part is None or key[0] == part:
+                del self.indices[key]
 
-        self.materials[name].Conductivity(table=((11.0, ), ))
-        self.materials[name].Plastic(table=((2.0, 0.0), (3.0, 3.0)))
-        self.materials[name].Expansion(table=((333.0, ), ))
+    def select(self, part, entity_type='face', coord=None, radius=0., plane=None, box=None, tolerance=1.E-6):
+        """ Returns the indices of the entities of a part matching a query.
 
+            coord are one or more points, and selects the entities within
+            radius of any of them. plane is a pair (origin, normal), and
+            selects the entities lying on it within tolerance. box is a pair
+            (low, high), and selects the entities inside it. The queries
+            given are combined with and.
 
-        mdb.models['aneurysm_fluid'].HomogeneousFluidSection(name='Section-1', material='Material-1')
-        mdb.models['aneurysm_solid'].HomogeneousSolidSection(name='Section-1', material='Material-1', thickness=None)
+        """
 
+        tree = self.index(part, entity_type)
+        selected = None
+
+        if coord is not None:
+            selected = self._near(part, entity_type, coord, max(radius, tolerance))
+        if plane is not None:
+            found = tree.on_plane(plane[0], plane[1], tolerance)
+            selected = found if selected is None else np.intersect1d(selected, found)
+        if box is not None:
+            found = tree.in_box(box[0], box[1])
+            selected = found if selected is None else np.intersect1d(selected, found)
+
+        if selected is None:
+            raise ValueError('A coord, plane or box query is needed to select entities')
+
+        return selected
+
+    def _near(self, part, entity_type, coord, radius):
+        """ Returns the indices of the entities within radius of any of the
+            points coord. The index gives the candidates whose bounding boxes
+            are, and the faces and edges among them are kept if getClosest,
+            called once per candidate with its points, finds them within
+            radius.
+        """
+
+        points = np.asarray(coord, dtype=float).reshape(-1, 3)
+        q, e = self.index(part, entity_type).pairs(points, radius)
+        if entity_type == 'node' or not len(e):
+            return np.unique(e)
+
+        entities = getattr(self.parts[part], ENTITIES[entity_type])
+        order = np.argsort(e, kind='mergesort')
+        q, e = q[order], e[order]
+        starts = np.flatnonzero(np.concatenate(([True], e[1:] != e[:-1])))
+        ends = np.concatenate((starts[1:], [len(e)]))
+
+        selected = []
+        for index, i0, i1 in zip(e[starts].tolist(), starts.tolist(), ends.tolist()):
+            near = points[q[i0:i1]]
+            closest = entities[index:index + 1].getClosest(coordinates=tuple(tuple(p) for p in near.tolist()),
+                                                           searchTolerance=radius)
+            distances = [np.sqrt(((np.asarray(value[1]) - near[k])**2).sum()) for k, value in closest.items()]
+            if distances and min(distances) <= radius:
+                selected.append(index)
+
+        return np.array(selected, dtype=np.int64)
+
+    def _sequence(self, part, entity_type, selected):
+        entities = getattr(self.parts[part], ENTITIES[entity_type])
+
+        if entity_type == 'node':
+            return entities.sequenceFromLabels(labels=self.indices[(part, entity_type)][1][selected].tolist())
+
+        return entities.getSequenceFromMask(mask=(Index.mask(selected), ))
+
+    def create_set(self, name, part, entity_type='face', **kwargs):
+        """ Creates a set of the entities of a part selected with a query (see select)"""
+
+        selected = self.select(part, entity_type, **kwargs)
+        sequence = self._sequence(part, entity_type, selected)
+
+        return self.parts[part].Set(name=name, **{ENTITIES[entity_type]: sequence})
+
+    def create_surface(self, name, part, entity_type='face', **kwargs):
+        """ Creates a surface of the faces or edges of a part selected with a query (see select)"""
+
+        if entity_type not in ('face', 'edge'):
+            raise ValueError('Surfaces are made of faces or edges, not {0}s'.format(entity_type))
+
+        selected = self.select(part, entity_type, **kwargs)
+        sequence = self._sequence(part, entity_type, selected)
+
+        side = 'side1Faces' if entity_type == 'face' else 'side1Edges'
+        return self.parts[part].Surface(name=name, **{side: sequence})
+
+    def add_material(self, name, library=None, **kwargs):
+        """ Creates a material of the library (that of the database by default).
+
+            kwargs replace properties of the material, as density,
+            viscosity, E and nu or hyperelastic (see Materials.Library.add),
+            and define materials that are not in the library. Fluid models
+            only get the density and viscosity. A material already created
+            in another model of the database is copied from it.
+
+        """
+
+        if library is None:
+            library = self.database.library if self.database is not None else Materials.Library()
+
+        material = library.get(name, **kwargs)
+        if self.cfd:
+            material = dict((key, value) for key, value in material.items() if key in ('density', 'viscosity'))
+        if not material:
+            raise ValueError('Material {0} has no properties for model {1}'.format(name, self.name))
+
+        key = (name, Materials.Library.key(material))
+        if self.materials.get(name) == key:
+            return self.model.materials[name]
+
+        source = self.database.materials.get(key) if self.database is not None else None
+        if source is not None and source != self.name and source in mdb.models:
+            self.model.copyMaterials(sourceModel=mdb.models[source], materialsToCopy=(name, ))
+            self.materials[name] = key
+            return self.model.materials[name]
+
+        created = self.model.Material(name=name)
+
+        if 'density' in material:
+            created.Density(table=((material['density'], ), ))
+        if 'viscosity' in material:
+            created.Viscosity(table=((material['viscosity'], ), ))
+        if 'elastic' in material:
+            created.Elastic(table=(tuple(material['elastic']), ))
+        if 'hyperelastic' in material:
+            hyperelastic = material['hyperelastic']
+            created.Hyperelastic(materialType=ISOTROPIC, testData=OFF,
+                                 type=getattr(abaqusConstants, Materials.TYPES[hyperelastic['model']]),
+                                 volumetricResponse=VOLUMETRIC_DATA,
+                                 table=(tuple(hyperelastic['parameters']) + (hyperelastic['D'], ), ))
+
+        self.materials[name] = key
+        if self.database is not None:
+            self.database.materials.setdefault(key, self.name)
+
+        return created
+
+    def add_section(self, name, material, **kwargs):
+        """ Creates a homogeneous fluid or solid section of a material, adding
+            the material from the library if the model does not have it yet
+        """
+
+        if material not in self.materials:
+            self.add_material(material)
+
+        if name in self.sections:
+            return self.sections[name]
+
+        if self.cfd:
+            self.sections[name] = self.model.HomogeneousFluidSection(name=name, material=material, **kwargs)
+        else:
+            self.sections[name] = self.model.HomogeneousSolidSection(name=name, material=material,
+                                                                     thickness=kwargs.pop('thickness', None), **kwargs)
 
+        return self.sections[name]
 
     def create_assembly(self):
         for name, part in self.parts.items():
@@ -6,4 +6,4 @@ class Aneurysm():
         pass
 
     def print_m(self):
-        print "hola"
+        print("hola")
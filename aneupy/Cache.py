@@ -0,0 +1,205 @@
+# =============================================================================
+#
+# Cache.py
+#
+# Content addressed disk cache for shapes, IGES files and CAD information
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+VERSION = 'aneupy-cache-1'
+
+
+def canonical(obj, digits=12):
+    """ Returns a JSON serializable copy of obj with rounded floats.
+
+        Floats are written with a fixed number of significant digits, so that
+        inputs that only differ in round-off hash to the same key. Sequences
+        and arrays become lists and dictionary keys are sorted on dumping.
+
+    """
+
+    if isinstance(obj, dict):
+        return dict((str(k), canonical(v, digits)) for k, v in obj.items())
+
+    if hasattr(obj, 'tolist'):
+        obj = obj.tolist()
+
+    if isinstance(obj, (list, tuple)):
+        return [canonical(v, digits) for v in obj]
+
+    if isinstance(obj, float):
+        value = float('{0:.{1}g}'.format(obj, digits))
+        return 0. if value == 0. else value
+
+    return obj
+
+
+def hash_key(*args):
+    """ Returns the SHA-256 hex digest of the canonical form of args"""
+
+    text = json.dumps(canonical([VERSION] + list(args)), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class Cache(object):
+    """ Size bounded disk cache addressed by the hash of the inputs.
+
+        Entries are files named after their key and kind (file extension),
+        so shapes, IGES files and JSON documents of the same key live side by
+        side. A hit refreshes the modification time of the entry, which is
+        used to evict the least recently used entries when the cache grows
+        beyond max_size bytes. Files are written atomically, so several
+        processes can share the same directory.
+
+    """
+
+    def __init__(self, directory, max_size=2**30):
+        self.directory = directory
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.evictions = 0
+
+        self._size = None
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def key(self, *args):
+        return hash_key(*args)
+
+    def path(self, key, kind):
+        return os.path.join(self.directory, key[:2], key + kind)
+
+    def get(self, key, kind):
+        """ Returns the path of an entry or None if it is not cached"""
+
+        path = self.path(key, kind)
+
+        if os.path.isfile(path):
+            self.hits += 1
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            return path
+
+        self.misses += 1
+        return None
+
+    def put(self, key, kind, source):
+        """ Stores a copy of the file source and returns the path of the entry"""
+
+        path = self.path(key, kind)
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                pass
+
+        # An entry written again replaces the old one, whose size is no longer cached
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+
+        handle, temp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        os.close(handle)
+        shutil.copyfile(source, temp)
+        os.rename(temp, path)
+
+        self.puts += 1
+        self._size = self.size() if self._size is None else self._size + os.path.getsize(path) - replaced
+        if self._size > self.max_size:
+            self.evict()
+
+        return path
+
+    def get_json(self, key):
+        path = self.get(key, '.json')
+        if path is None:
+            return None
+
+        with open(path) as input_file:
+            return json.load(input_file)
+
+    def put_json(self, key, data):
+        handle, temp = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w') as output_file:
+            json.dump(data, output_file, sort_keys=True)
+
+        try:
+            return self.put(key, '.json', temp)
+        finally:
+            os.remove(temp)
+
+    def entries(self):
+        """ Returns (mtime, size, path) of all the entries"""
+
+        entries = []
+        for folder in os.listdir(self.directory):
+            folder = os.path.join(self.directory, folder)
+            if not os.path.isdir(folder):
+                continue
+
+            for name in os.listdir(folder):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        return entries
+
+    def size(self):
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache fits max_size"""
+
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+
+        for mtime, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+
+        self._size = size
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            os.remove(path)
+        self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        entries = self.entries()
+
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.,
+                'puts': self.puts,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'size': sum(entry[1] for entry in entries)}
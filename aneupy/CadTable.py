@@ -0,0 +1,249 @@
+# =============================================================================
+#
+# CadTable.py
+#
+# Columnar binary store of the CAD information of many models
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import os
+import io
+import json
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ENTITY_TYPES = ('sections', 'shells', 'solids')
+
+PROPERTIES = ('Length', 'Area', 'Volume', 'I11', 'I12', 'I13', 'I21', 'I22', 'I23', 'I31', 'I32', 'I33',
+              'Ix', 'Iy', 'Iz')
+
+DTYPE = np.dtype([('model', '<i4'), ('type', '<i1'), ('name', '<i4')] +
+                 [(prop, '<f8') for prop in PROPERTIES] + [('CDG', '<f8', (3,))])
+
+
+class CadTable(object):
+    """ Appendable store of the CAD information written by Domain.save.
+
+        The store is a directory with one fixed size record per entity in
+        entities.bin (see DTYPE), plus the model and entity names, one per
+        line, in models.txt and names.txt. The model, type and name fields of
+        a record index those lists and ENTITY_TYPES. Properties missing in a
+        model are NaN.
+
+        records maps entities.bin with np.memmap, so queries over all the
+        entities of all the models are vectorized and only read the columns
+        they use. Appends take a file lock, so several processes can write
+        to the same store. The model and entity names are kept in memory
+        and only the lines added since the last read, by this or another
+        process, are read. Model names are unique.
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        meta = os.path.join(self.directory, 'table.json')
+        if not os.path.isfile(meta):
+            with open(meta, 'w') as output_file:
+                json.dump({'version': 1, 'dtype': DTYPE.descr}, output_file)
+
+        for name in ('entities.bin', 'models.txt', 'names.txt'):
+            path = os.path.join(self.directory, name)
+            if not os.path.isfile(path):
+                open(path, 'ab').close()
+
+        # Lines read so far of models.txt and names.txt, their positions and
+        # the byte offsets where the next read starts
+        self._lines = {'models.txt': [], 'names.txt': []}
+        self._index = {'models.txt': {}, 'names.txt': {}}
+        self._offsets = {'models.txt': 0, 'names.txt': 0}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_lines(self, name):
+        """ Reads the complete lines appended to a text file since the last read"""
+
+        with open(self._path(name), 'rb') as input_file:
+            input_file.seek(self._offsets[name])
+            text = input_file.read()
+
+        end = text.rfind(b'\n') + 1
+        if end:
+            lines, index = self._lines[name], self._index[name]
+            for line in text[:end].decode('utf-8').split(u'\n')[:-1]:
+                index.setdefault(line, len(lines))
+                lines.append(line)
+            self._offsets[name] += end
+
+        return self._lines[name]
+
+    def _write_lines(self, name, lines):
+        if lines:
+            with io.open(self._path(name), 'a', encoding='utf-8') as output_file:
+                output_file.write(u''.join(u'{0}\n'.format(line) for line in lines))
+            self._read_lines(name)
+
+    @property
+    def models(self):
+        return list(self._read_lines('models.txt'))
+
+    @property
+    def names(self):
+        return list(self._read_lines('names.txt'))
+
+    @property
+    def records(self):
+        """ Memory map of all the entity records"""
+
+        size = os.path.getsize(self._path('entities.bin')) // DTYPE.itemsize
+        if not size:
+            return np.zeros(0, dtype=DTYPE)
+
+        return np.memmap(self._path('entities.bin'), dtype=DTYPE, mode='r', shape=(size,))
+
+    def __len__(self):
+        return os.path.getsize(self._path('entities.bin')) // DTYPE.itemsize
+
+    def append(self, model, info):
+        """ Appends the CAD information dictionary of a model.
+
+            Raises a ValueError if the table already has a model of that
+            name, or if info is labelled as an approximation under
+            'properties' (see Geometry.Domain.save).
+
+        """
+
+        if info.get('properties', {}).get('approximation'):
+            raise ValueError('The CAD information of model {0} is an approximation ({1} method)'.format(
+                model, info['properties'].get('method')))
+
+        with open(self._path('table.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                model_index = len(self._read_lines('models.txt'))
+                if model in self._index['models.txt']:
+                    raise ValueError('Model {0} already in the table {1}'.format(model, self.directory))
+
+                self._read_lines('names.txt')
+                index = self._index['names.txt']
+
+                rows, new = [], set()
+                for entity_type in ENTITY_TYPES:
+                    for name in sorted(info.get(entity_type, {})):
+                        if name not in index:
+                            new.add(name)
+                        rows.append((entity_type, name, info[entity_type][name]))
+
+                self._write_lines('names.txt', sorted(new))
+
+                data = np.zeros(len(rows), dtype=DTYPE)
+                for prop in PROPERTIES:
+                    data[prop] = np.nan
+                data['CDG'] = np.nan
+
+                for i, (entity_type, name, entry) in enumerate(rows):
+                    data['model'][i] = model_index
+                    data['type'][i] = ENTITY_TYPES.index(entity_type)
+                    data['name'][i] = index[name]
+                    for prop in PROPERTIES + ('CDG',):
+                        if prop in entry:
+                            data[prop][i] = entry[prop]
+
+                # The model goes first, so an interrupted append leaves a model
+                # without entities rather than entities of the wrong model
+                self._write_lines('models.txt', [model])
+
+                with open(self._path('entities.bin'), 'ab') as output_file:
+                    output_file.write(data.tobytes())
+
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+        return model_index
+
+    def mask(self, entity_type=None, models=None, names=None, **bounds):
+        """ Returns the boolean mask of the records that match a query.
+
+            entity_type is one of ENTITY_TYPES, models and names are lists of
+            names, and each keyword of bounds is a property with a (min, max)
+            pair, where None leaves a side open. For example,
+            mask('shells', Volume=(1000., None)) selects all shells with
+            volume above 1000 in all models.
+
+        """
+
+        records = self.records
+        mask = np.ones(len(records), dtype=bool)
+
+        if entity_type is not None:
+            mask &= records['type'] == ENTITY_TYPES.index(entity_type)
+
+        if models is not None:
+            self._read_lines('models.txt')
+            lookup = self._index['models.txt']
+            mask &= np.isin(records['model'], [lookup[m] for m in models if m in lookup])
+
+        if names is not None:
+            self._read_lines('names.txt')
+            lookup = self._index['names.txt']
+            mask &= np.isin(records['name'], [lookup[n] for n in names if n in lookup])
+
+        for prop, (low, high) in bounds.items():
+            column = records[prop]
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+
+        return mask
+
+    def select(self, entity_type=None, models=None, names=None, **bounds):
+        """ Returns a copy of the records that match a query (see mask)"""
+
+        return np.array(self.records[self.mask(entity_type, models, names, **bounds)])
+
+    def info(self, model):
+        """ Returns the CAD information dictionary of a model, as in a .cad file"""
+
+        names = self.names
+        records = self.select(models=[model])
+
+        info = dict((entity_type, {}) for entity_type in ENTITY_TYPES)
+        for record in records:
+            entry = {}
+            for prop in PROPERTIES:
+                if not np.isnan(record[prop]):
+                    entry[prop] = float(record[prop])
+            if not np.isnan(record['CDG']).any():
+                entry['CDG'] = record['CDG'].tolist()
+            info[ENTITY_TYPES[record['type']]][names[record['name']]] = entry
+
+        return info
+
+
+def convert(files, directory):
+    """ Appends existing .cad files to a CadTable, named after their file names"""
+
+    table = CadTable(directory)
+
+    for file in files:
+        with open(file) as input_file:
+            info = json.load(input_file)
+        table.append(os.path.splitext(os.path.basename(file))[0], info)
+
+    return table
@@ -0,0 +1,180 @@
+# =============================================================================
+#
+# Centerline.py
+#
+# Array based section tables built from vessel centerlines
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import numpy as np
+
+
+def tangents(points):
+    """ Returns the unit tangents of a polyline (n, 3) by central differences"""
+
+    T = np.gradient(np.asarray(points, dtype=float), axis=0)
+    return T / np.linalg.norm(T, axis=-1)[:, None]
+
+
+def rotation_between(a, b):
+    """ Returns the rotations (n, 3, 3) taking the unit vectors a to b"""
+
+    v = np.cross(a, b)
+    c = np.clip(np.sum(a * b, axis=-1), -1. + 1.E-12, None)
+
+    K = np.zeros(v.shape + (3,))
+    K[:, 0, 1], K[:, 0, 2] = -v[:, 2], v[:, 1]
+    K[:, 1, 0], K[:, 1, 2] = v[:, 2], -v[:, 0]
+    K[:, 2, 0], K[:, 2, 1] = -v[:, 1], v[:, 0]
+
+    return np.eye(3) + K + np.matmul(K, K) / (1. + c)[:, None, None]
+
+
+def prefix_product(Q):
+    """ Returns P[i] = Q[i] Q[i-1] ... Q[0] for all i.
+
+        Uses a Hillis-Steele scan, so the n products are done in log2(n)
+        vectorized passes instead of a Python loop.
+
+    """
+
+    P = np.array(Q, dtype=float)
+    shift = 1
+    while shift < len(P):
+        P[shift:] = np.matmul(P[shift:], P[:-shift].copy())
+        shift *= 2
+
+    return P
+
+
+def parallel_transport(points, normal=None):
+    """ Returns rotation-minimizing frames along a centerline.
+
+        The result R (n, 3, 3) has the layout of Section.R: its rows are the
+        OX and OY directions of each section plane and the tangent. normal
+        gives the OX direction of the first section; by default the global
+        axis least aligned with the first tangent is used.
+
+    """
+
+    T = tangents(points)
+
+    if normal is None:
+        normal = np.eye(3)[np.argmin(np.abs(T[0]))]
+    U = np.asarray(normal, dtype=float)
+    U = U - U.dot(T[0]) * T[0]
+    U = U / np.linalg.norm(U)
+
+    # Rotation of each step, accumulated from the first section
+    Q = np.concatenate((np.eye(3)[None], rotation_between(T[:-1], T[1:])))
+    P = prefix_product(Q)
+
+    OX = np.matmul(P, U)
+    OX = OX - np.sum(OX * T, axis=-1)[:, None] * T
+    OX = OX / np.linalg.norm(OX, axis=-1)[:, None]
+    OY = np.cross(T, OX)
+
+    return np.stack((OX, OY, T), axis=1)
+
+
+def arc_length(points):
+    points = np.asarray(points, dtype=float)
+    return np.concatenate(([0.], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=-1))))
+
+
+def curvature(points):
+    """ Returns the curvature of a polyline at its points"""
+
+    s = arc_length(points)
+    T = tangents(points)
+    dT = np.gradient(T, s, axis=0)
+
+    return np.linalg.norm(dT, axis=-1)
+
+
+def decimation_indices(points, radii, count, weight=1.):
+    """ Selects count points of a centerline, concentrated where it bends.
+
+        Each segment gets an importance of its length times
+        1 + weight * L * (curvature + |dr/ds|), with L the length of the
+        centerline, and the points closest to equally spaced quantiles of the
+        accumulated importance are kept. The end points are always kept.
+
+    """
+
+    points = np.asarray(points, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    n = len(points)
+
+    if count >= n:
+        return np.arange(n)
+
+    s = arc_length(points)
+    length = s[-1]
+    density = 1. + weight * length * (curvature(points) + np.abs(np.gradient(radii, s)))
+
+    importance = np.concatenate(([0.], np.cumsum(0.5 * (density[1:] + density[:-1]) * np.diff(s))))
+    targets = np.linspace(0., importance[-1], count)
+
+    indices = np.searchsorted(importance, targets)
+    indices = np.clip(indices, 1, n - 1)
+    closer = np.abs(importance[indices - 1] - targets) < np.abs(importance[indices] - targets)
+    indices = np.unique(np.where(closer, indices - 1, indices))
+
+    # Fill the gaps left by coincident quantiles with the remaining points
+    # of highest density
+    if len(indices) < count:
+        rest = np.setdiff1d(np.arange(n), indices)
+        extra = rest[np.argsort(-density[rest])[:count - len(indices)]]
+        indices = np.union1d(indices, extra)
+
+    return indices
+
+
+class SectionTable(object):
+    """ Circular sections stored as arrays.
+
+        origins (n, 3), R (n, 3, 3) and radii (n) hold the same data as a list
+        of Section objects, with R in the layout of Section.R.
+
+    """
+
+    def __init__(self, names, origins, R, radii):
+        self.names = list(names)
+        self.origins = np.asarray(origins, dtype=float)
+        self.R = np.asarray(R, dtype=float)
+        self.radii = np.asarray(radii, dtype=float)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_centerline(cls, name, points, radii, count=None, normal=None, weight=1.):
+        """ Builds the table of a centerline with parallel transport frames.
+
+            With count, the centerline is first decimated to that number of
+            sections with decimation_indices.
+
+        """
+
+        points = np.asarray(points, dtype=float)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), points.shape[:1])
+
+        R = parallel_transport(points, normal)
+
+        if count is not None:
+            indices = decimation_indices(points, radii, count, weight)
+            points, radii, R = points[indices], radii[indices], R[indices]
+
+        names = ['{0}_{1:04d}'.format(name, i) for i in range(len(points))]
+
+        return cls(names, points, R, radii)
+
+    def rows(self):
+        """ Yields name, origin, OX_LCS, OY_LCS and radius of each section"""
+
+        for i, name in enumerate(self.names):
+            yield name, self.origins[i].tolist(), self.R[i, 0].tolist(), self.R[i, 1].tolist(), float(self.radii[i])
@@ -0,0 +1,259 @@
+# =============================================================================
+#
+# Export.py
+#
+# Streaming export of lofted shells and solids to binary STL and VTK files
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import math
+import struct
+
+import numpy as np
+
+try:
+    from aneupy import Loft, Properties
+except ImportError:
+    import Loft
+    import Properties
+
+
+def resolution(knots, net, tolerance):
+    """ Returns the grid size (nu, nt) that meets a chordal tolerance.
+
+        nt follows from the largest radius r, as a polygon of nt sides
+        deviates r * (1 - cos(pi / nt)) from its circle. nu follows from the
+        second differences along u of a pilot grid, as the chordal error
+        decreases with the square of the spacing.
+
+    """
+
+    pilot_nu = 4 * net.shape[0] + 1
+    pilot = Loft.evaluate(knots, net, np.linspace(0., 1., pilot_nu), np.linspace(0., 2. * math.pi, 16, endpoint=False))
+
+    radius = np.linalg.norm(net[:, 1:, :], axis=-1).max()
+    nt = int(math.ceil(math.pi / math.acos(max(1. - tolerance / radius, -1.))))
+
+    error = np.linalg.norm(pilot[2:] - 2. * pilot[1:-1] + pilot[:-2], axis=-1).max() / 8.
+    nu = int(math.ceil((pilot_nu - 1) * math.sqrt(error / tolerance))) + 1
+
+    return max(nu, 2), max(nt, 3)
+
+
+class ShellMesh(object):
+    """ Tessellation of a lofted shell generated by blocks of rows.
+
+        The vertices are the nu x nt grid followed, for closed shells, by the
+        centers of the end sections. flip reverses the orientation of the
+        triangles, which are outward oriented by default.
+
+    """
+
+    def __init__(self, knots, net, closed=True, nu=48, nt=48, flip=False):
+        self.knots, self.net = knots, net
+        self.closed = closed
+        self.nu, self.nt = nu, nt
+
+        self.u = np.linspace(0., 1., nu)
+        self.theta = np.linspace(0., 2. * math.pi, nt, endpoint=False)
+
+        # Orientation of the grid from a coarse closed tessellation
+        vertices, triangles, inward = Loft.tessellate(knots, net, 8, 8, closed=True)
+        self.flip = bool(inward) != bool(flip)
+
+        self.n_vertices = nu * nt + (2 if closed else 0)
+        self.n_triangles = 2 * (nu - 1) * nt + (2 * nt if closed else 0)
+
+    def _rows(self, i0, i1):
+        return Loft.evaluate(self.knots, self.net, self.u[i0:i1], self.theta)
+
+    def _centers(self):
+        rows = Loft.evaluate(self.knots, self.net, self.u[[0, -1]], self.theta)
+        return rows.mean(axis=1)
+
+    def vertex_chunks(self, chunk=256):
+        for i0 in range(0, self.nu, chunk):
+            yield self._rows(i0, min(i0 + chunk, self.nu)).reshape(-1, 3)
+
+        if self.closed:
+            yield self._centers()
+
+    def triangle_chunks(self, chunk=256, coordinates=False):
+        """ Yields the triangles by blocks.
+
+            Each block is an array (k, 3) of vertex indices or, with
+            coordinates, an array (k, 3, 3) of vertex coordinates.
+
+        """
+
+        nt = self.nt
+        j = np.arange(nt)
+        jn = (j + 1) % nt
+
+        for i0 in range(0, self.nu - 1, chunk):
+            i1 = min(i0 + chunk, self.nu - 1)
+
+            i = np.arange(i0, i1)[:, None]
+            a, b = i * nt + j, (i + 1) * nt + j
+            c, d = (i + 1) * nt + jn, i * nt + jn
+            triangles = np.concatenate((np.stack((a, b, c), axis=-1), np.stack((a, c, d), axis=-1)), axis=1)
+            triangles = triangles.reshape(-1, 3)
+
+            if self.flip:
+                triangles = triangles[:, ::-1]
+
+            if coordinates:
+                rows = self._rows(i0, i1 + 1).reshape(-1, 3)
+                yield rows[triangles - i0 * nt]
+            else:
+                yield triangles
+
+        if self.closed:
+            # Fans on the end sections, indexed on the end rows and centers
+            first = np.stack((np.full(nt, 2 * nt), j, jn), axis=-1)
+            last = np.stack((np.full(nt, 2 * nt + 1), nt + jn, nt + j), axis=-1)
+            triangles = np.concatenate((first, last))
+
+            if self.flip:
+                triangles = triangles[:, ::-1]
+
+            if coordinates:
+                ends = Loft.evaluate(self.knots, self.net, self.u[[0, -1]], self.theta)
+                yield np.concatenate((ends.reshape(-1, 3), ends.mean(axis=1)))[triangles]
+            else:
+                rows = np.concatenate((j, (self.nu - 1) * nt + j, [self.nu * nt, self.nu * nt + 1]))
+                yield rows[triangles]
+
+
+def meshes(shells, tolerance=None, nu=None, nt=None):
+    """ Returns the ShellMesh of each (shell, sign) pair.
+
+        Shells of any backend are lofted from their sections. The grid is
+        given by nu and nt or, if missing, by the chordal tolerance. Shells
+        with sign -1, the tools of a cut, are oriented inwards.
+
+    """
+
+    lofts = Properties.loft_shells([shell for shell, sign in shells])
+
+    result = []
+    for (shell, sign), (knots, net) in zip(shells, lofts):
+        size = resolution(knots, net, tolerance) if tolerance is not None else (48, 48)
+        result.append(ShellMesh(knots, net, shell.closed, nu or size[0], nt or size[1], flip=sign < 0))
+
+    return result
+
+
+def write_stl(file, meshes, chunk=256, header='aneupy'):
+    """ Writes binary STL, one block of triangles at a time"""
+
+    record = np.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+
+    with open(file, 'wb') as output_file:
+        output_file.write(header.encode('ascii')[:80].ljust(80, b' '))
+        output_file.write(struct.pack('<I', sum(mesh.n_triangles for mesh in meshes)))
+
+        for mesh in meshes:
+            for p in mesh.triangle_chunks(chunk, coordinates=True):
+                normal = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+                norm = np.linalg.norm(normal, axis=-1)[:, None]
+                normal = np.divide(normal, norm, out=np.zeros_like(normal), where=norm > 0.)
+
+                data = np.zeros(len(p), dtype=record)
+                data['normal'] = normal
+                data['vertices'] = p
+                output_file.write(data.tobytes())
+
+
+def write_vtk(file, meshes, chunk=256, title='aneupy'):
+    """ Writes a legacy binary VTK unstructured grid, one block at a time"""
+
+    n_vertices = sum(mesh.n_vertices for mesh in meshes)
+    n_triangles = sum(mesh.n_triangles for mesh in meshes)
+
+    with open(file, 'wb') as output_file:
+        output_file.write('# vtk DataFile Version 3.0\n{0}\nBINARY\nDATASET UNSTRUCTURED_GRID\n'.format(title).encode('ascii'))
+
+        output_file.write('POINTS {0} float\n'.format(n_vertices).encode('ascii'))
+        for mesh in meshes:
+            for vertices in mesh.vertex_chunks(chunk):
+                output_file.write(vertices.astype('>f4').tobytes())
+
+        output_file.write('\nCELLS {0} {1}\n'.format(n_triangles, 4 * n_triangles).encode('ascii'))
+        offset = 0
+        for mesh in meshes:
+            for triangles in mesh.triangle_chunks(chunk):
+                cells = np.empty((len(triangles), 4), dtype='>i4')
+                cells[:, 0] = 3
+                cells[:, 1:] = triangles + offset
+                output_file.write(cells.tobytes())
+            offset += mesh.n_vertices
+
+        output_file.write('\nCELL_TYPES {0}\n'.format(n_triangles).encode('ascii'))
+        for start in range(0, n_triangles, chunk * 1024):
+            stop = min(start + chunk * 1024, n_triangles)
+            output_file.write(np.full(stop - start, 5, dtype='>i4').tobytes())
+
+        output_file.write(b'\n')
+
+
+def write_vtu(file, meshes, chunk=256):
+    """ Writes a VTK XML unstructured grid with raw appended data.
+
+        The sizes of all the arrays are known beforehand, so the header is
+        written first and the data follows one block at a time.
+
+    """
+
+    n_vertices = sum(mesh.n_vertices for mesh in meshes)
+    n_triangles = sum(mesh.n_triangles for mesh in meshes)
+
+    sizes = [12 * n_vertices, 24 * n_triangles, 8 * n_triangles, n_triangles]
+    offsets = np.concatenate(([0], np.cumsum([8 + size for size in sizes])[:-1]))
+
+    header = ('<?xml version="1.0"?>\n'
+              '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+              '  <UnstructuredGrid>\n'
+              '    <Piece NumberOfPoints="{0}" NumberOfCells="{1}">\n'
+              '      <Points>\n'
+              '        <DataArray type="Float32" NumberOfComponents="3" format="appended" offset="{2}"/>\n'
+              '      </Points>\n'
+              '      <Cells>\n'
+              '        <DataArray type="Int64" Name="connectivity" format="appended" offset="{3}"/>\n'
+              '        <DataArray type="Int64" Name="offsets" format="appended" offset="{4}"/>\n'
+              '        <DataArray type="UInt8" Name="types" format="appended" offset="{5}"/>\n'
+              '      </Cells>\n'
+              '    </Piece>\n'
+              '  </UnstructuredGrid>\n'
+              '  <AppendedData encoding="raw">\n'
+              '   _').format(n_vertices, n_triangles, *offsets)
+
+    with open(file, 'wb') as output_file:
+        output_file.write(header.encode('ascii'))
+
+        output_file.write(struct.pack('<Q', sizes[0]))
+        for mesh in meshes:
+            for vertices in mesh.vertex_chunks(chunk):
+                output_file.write(vertices.astype('<f4').tobytes())
+
+        output_file.write(struct.pack('<Q', sizes[1]))
+        offset = 0
+        for mesh in meshes:
+            for triangles in mesh.triangle_chunks(chunk):
+                output_file.write((triangles + offset).astype('<i8').tobytes())
+            offset += mesh.n_vertices
+
+        output_file.write(struct.pack('<Q', sizes[2]))
+        for start in range(0, n_triangles, chunk * 1024):
+            stop = min(start + chunk * 1024, n_triangles)
+            output_file.write((3 * np.arange(start + 1, stop + 1)).astype('<i8').tobytes())
+
+        output_file.write(struct.pack('<Q', sizes[3]))
+        for start in range(0, n_triangles, chunk * 1024):
+            stop = min(start + chunk * 1024, n_triangles)
+            output_file.write(np.full(stop - start, 5, dtype='<u1').tobytes())
+
+        output_file.write(b'\n  </AppendedData>\n</VTKFile>\n')
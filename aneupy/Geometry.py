@@ -10,21 +10,209 @@
 # =============================================================================
 
 import os
-import math
 import json
+import pickle
+import shutil
+import tempfile
+
+try:
+    import salome
+    import GEOM
+    from salome.geom import geomBuilder
+except ImportError:
+    salome = GEOM = geomBuilder = None
+
+try:
+    from aneupy import Loft, Cache, Properties, Graph, Centerline, Export, CadTable, Trace, Wall, Ingest, Hemodynamics
+except ImportError:
+    import Loft
+    import Cache
+    import Properties
+    import Graph
+    import Centerline
+    import Export
+    import CadTable
+    import Trace
+    import Wall
+    import Ingest
+    import Hemodynamics
+
+
+class Context(object):
+    """ Geometry builder and study publication policy of the entities.
+
+        By default each entity resolves the open study, builds its own
+        geomBuilder and publishes its objects as soon as they are created,
+        refreshing the object browser every time.
+
+        A shared context reuses one geompy for all entities. With publish
+        'deferred' the objects and folders are queued and added to the study
+        in a single flush, with one browser refresh, and with publish None
+        they are never added to the study.
+
+        Folders are created once per name. While log is a list, the objects
+        added are appended to it, so that remove can take them out of the
+        study, or of the queue, when their entity is rebuilt.
 
-import salome
-import GEOM
-from salome.geom import geomBuilder
+    """
+
+    def __init__(self, geompy=None, publish='eager', study=None):
+
+        if geompy is None:
+            study = salome.myStudyManager.GetStudyByName(salome.myStudyManager.GetOpenStudies()[0])
+            geompy = geomBuilder.New(study)
+
+        self.geompy = geompy
+        self.publish = publish
+        self.study = study
+        self.queue = []
+        self.folders = {}
+        self.entries = {}
+        self.log = None
+
+    def new_folder(self, name):
+
+        if self.publish == 'eager':
+            if name not in self.folders:
+                self.folders[name] = self.geompy.NewFolder(name)
+            return self.folders[name]
+
+        if self.publish == 'deferred':
+            return Folder(name)
+
+        return None
+
+    def add(self, obj, name, folder=None):
+
+        if self.log is not None:
+            self.log.append(obj)
+
+        if self.publish == 'eager':
+            self.entries[id(obj)] = self.geompy.addToStudy(obj, name)
+            if folder:
+                self.geompy.PutToFolder(obj, self._folder(folder))
+
+        elif self.publish == 'deferred':
+            self.queue.append((obj, name, folder))
+
+    def remove(self, objects):
+        """ Removes objects added before from the queue or from the study"""
+
+        ids = set(id(obj) for obj in objects)
+        self.queue = [item for item in self.queue if id(item[0]) not in ids]
+
+        builder = None
+        for obj in objects:
+            entry = self.entries.pop(id(obj), None)
+            if entry and self.study is not None:
+                builder = builder or self.study.NewBuilder()
+                builder.RemoveObjectWithChildren(self.study.FindObjectID(entry))
+
+    def refresh(self):
+
+        if self.publish == 'eager':
+            salome.sg.updateObjBrowser(True)
+
+    def _folder(self, folder):
+        """ Returns the study folder of a deferred Folder, created on first use"""
+
+        if not isinstance(folder, Folder):
+            return folder
+
+        if folder.name not in self.folders:
+            self.folders[folder.name] = self.geompy.NewFolder(folder.name)
+
+        return self.folders[folder.name]
+
+    def flush(self):
+        """ Publishes the queued objects and folders in the study"""
+
+        if not self.queue:
+            return
+
+        for obj, name, folder in self.queue:
+            self.entries[id(obj)] = self.geompy.addToStudy(obj, name)
+
+            if folder is not None:
+                self.geompy.PutToFolder(obj, self._folder(folder))
+
+        self.queue = []
+
+        salome.sg.updateObjBrowser(True)
+
+
+class Folder(object):
+    """ Study folder whose creation is deferred to Context.flush"""
+
+    def __init__(self, name):
+        self.name = name
 
 
 class Domain(object):
+    """ Collection of sections, shells and solids.
+
+        backend selects the geometry kernel: 'salome' builds the CAD model in
+        a new SALOME study and 'numpy' lofts the sections with the arrays of
+        the Loft module, which is fast enough to build and measure previews
+        of many variants but can not export IGES files.
+
+        cache is a Cache.Cache, or the directory of one, where shells, solids,
+        IGES files and mass properties are stored by the hash of their inputs,
+        so that rebuilding an unchanged geometry reuses the stored results.
+
+        With lazy=True the add_* methods, export_iges and the add_circle and
+        rotate* methods of the sections only record operations in a
+        Graph.Graph, and the entities are Graph.Lazy proxies. Operations are
+        run when a result is requested, by evaluate, save or an attribute of
+        a proxy, and after editing a parameter only the operations
+        downstream of it are run again, their old objects being removed
+        from the study.
+
+        headless=True is meant for batch runs: all entities share the
+        geomBuilder of the Domain, the object browser is never refreshed and
+        objects are published to the study in one flush when the model is
+        saved, or never with publish=False.
+
+        With trace=True every call to the geometry kernel is recorded in
+        tracer, a Trace.Recorder, and save writes it as a Chrome trace next
+        to the .cad file. Without it the kernel is used directly.
 
-    def __init__(self, **kwargs):
+    """
+
+    def __init__(self, backend='salome', cache=None, lazy=False, headless=False, publish=True, trace=False,
+                 **kwargs):
 
         self.sections = {}
         self.shells = {}
         self.solids = {}
+        self.centerlines = {}
+        self.walls = {}
+        self.hemodynamics = {}
+
+        if backend not in ('salome', 'numpy'):
+            raise ValueError("Unknown backend {0}, use 'salome' or 'numpy'".format(backend))
+
+        self.backend = backend
+        self.graph = Graph.Graph() if lazy else None
+        self._published = {}
+
+        if cache is not None and not isinstance(cache, Cache.Cache):
+            cache = Cache.Cache(cache)
+        self.cache = cache
+
+        self.context = None
+        self.tracer = Trace.Recorder() if trace else None
+
+        if self.backend == 'numpy':
+            self.study = None
+            self.geompy = Trace.instrument(Loft.Kernel(), self.tracer, 'numpy')
+            self._Section, self._Shell, self._Solid = Loft.Section, Loft.Shell, Loft.Solid
+            return
+
+        if salome is None:
+            raise ImportError("SALOME is not available, use backend='numpy'")
+
+        self._Section, self._Shell, self._Solid = Section, Shell, Solid
 
         if salome.myStudyManager.GetOpenStudies():
             study = salome.myStudyManager.GetStudyByName(salome.myStudyManager.GetOpenStudies()[0])
@@ -32,9 +220,16 @@ class Domain(object):
 
         self.study = salome.myStudyManager.NewStudy('study')
 
-        self.geompy = geomBuilder.New(self.study)
+        self.geompy = Trace.instrument(geomBuilder.New(self.study), self.tracer, 'salome')
         self.geompy.addToStudyAuto(0)
 
+        if headless:
+            self.context = Context(self.geompy, 'deferred' if publish else None, self.study)
+        elif trace or lazy:
+            # The entities must share the instrumented builder, and those of
+            # a lazy domain the context that removes them when rebuilt
+            self.context = Context(self.geompy, study=self.study)
+
         O = self.geompy.MakeVertex(0, 0, 0)
         OX = self.geompy.MakeVectorDXDYDZ(1, 0, 0)
         OY = self.geompy.MakeVectorDXDYDZ(0, 1, 0)
@@ -42,84 +237,553 @@ class Domain(object):
 
     def add_section(self, name, **kwargs):
 
-        self.sections[name] = Section(name, **kwargs)
+        if self.graph is not None:
+            self.graph.add('section:' + name, [], self._rebuild(self._build_section),
+                           {'name': name, 'kwargs': kwargs, 'ops': []})
+            self.sections[name] = Graph.LazySection(self.graph, 'section:' + name)
+            return
+
+        self.sections[name] = self._Section(name, context=self.context, **kwargs)
+
+    def add_sections_from_centerline(self, name, points, radii, count=None, normal=None, weight=1., **kwargs):
+        """ Adds circular sections along a centerline.
+
+            points (n, 3) and radii (n) are the centerline and the radius at
+            each point. The sections get parallel transport frames computed
+            for all the points at once and, with count, the centerline is
+            first decimated to count sections, concentrated where it bends or
+            its radius changes (see Centerline.decimation_indices).
+
+            The array table is stored in centerlines[name], and the sections
+            are named name_0000, name_0001... Returns the list of names, ready
+            for add_shell.
+
+        """
+
+        table = Centerline.SectionTable.from_centerline(name, points, radii, count, normal, weight)
+        self.centerlines[name] = table
+
+        return self._add_table(table, kwargs)
+
+    def add_sections_from_points(self, name, source, bins=32, axis=None, centerline=None, model='circle',
+                                 min_points=16, read=None, **kwargs):
+        """ Adds circular sections fitted to a point cloud of a vessel.
+
+            source is a .ply or delimited text file, or a function that
+            yields arrays of points, and read the options of the reader, as
+            {'label_column': 3, 'label': 1}. The cloud is binned along its
+            axis, or along centerline, and a section is fitted to each bin
+            (see Ingest.fit_sections), an ellipse of the same area with
+            model='ellipse'.
+
+            The table, with the residual of each section, is stored in
+            centerlines[name]. Returns the list of names, ready for
+            add_shell.
+
+        """
+
+        table = Ingest.fit_sections(source, name, bins, axis, centerline, model, min_points, **(read or {}))
+        self.centerlines[name] = table
+
+        return self._add_table(table, kwargs)
+
+    def _add_table(self, table, kwargs):
+        """ Adds the sections of a table.
+
+            Without a context of the domain, the salome sections share the
+            geomBuilder of the domain and a deferred context, flushed once
+            with a single browser refresh, which then publishes what they
+            create later, as their bases, directly.
+
+        """
+
+        if self.graph is not None or self.context is not None or self.backend != 'salome':
+            for section, origin, OX_LCS, OY_LCS, radius in table.rows():
+                self.add_section(section, origin=origin, OX_LCS=OX_LCS, OY_LCS=OY_LCS, **kwargs)
+                self.sections[section].add_circle(radius=radius)
+
+            return list(table.names)
+
+        context = Context(self.geompy, 'deferred', self.study)
+        for section, origin, OX_LCS, OY_LCS, radius in table.rows():
+            self.sections[section] = self._Section(section, origin=origin, OX_LCS=OX_LCS, OY_LCS=OY_LCS,
+                                                   context=context, **kwargs)
+            self.sections[section].add_circle(radius=radius)
+
+        context.flush()
+        context.publish = 'eager'
+
+        return list(table.names)
 
     def add_shell(self, name, sections, **kwargs):
 
+        if self.graph is not None:
+            self.graph.add('shell:' + name, ['section:' + section for section in sections],
+                           self._rebuild(self._build_shell), {'name': name, 'kwargs': kwargs})
+            self.shells[name] = Graph.Lazy(self.graph, 'shell:' + name)
+            return
+
         sections_list = []
         for section in sections:
             sections_list.append(self.sections[section])
 
-        self.shells[name] = Shell(name, sections_list, **kwargs)
+        self.shells[name] = self._make_shell(name, sections_list, kwargs)
 
     def add_solid_from_shell(self, name, shell, **kwargs):
 
-        solid = self.geompy.MakeSolid([self.shells[shell].geom])
-        self.solids[name] = Solid(name, solid, **kwargs)
+        if self.graph is not None:
+            self.graph.add('solid:' + name, ['shell:' + shell], self._rebuild(self._build_solid_from_shell),
+                           {'name': name, 'kwargs': kwargs})
+            self.solids[name] = Graph.Lazy(self.graph, 'solid:' + name)
+            return
 
-    def add_solid_from_cut(self, name, solids, **kwargs):
+        self.solids[name] = self._make_solid_from_shell(name, self.shells[shell], kwargs)
 
-        solid = self.geompy.MakeCut(self.solids[solids[0]].geom, self.solids[solids[1]].geom, checkSelfInte=True)
-        self.solids[name] = Solid(name, solid, **kwargs)
+    def add_solid_from_cut(self, name, solids, check=True, min_thickness=0., **kwargs):
+        """ Cuts the second solid from the first one.
+
+            With check, when both solids are bounded by a single shell, the
+            wall between them is first measured with Wall.check, and a
+            Wall.WallError is raised without running the boolean if the
+            shells intersect or the wall is thinner than min_thickness. The
+            thickness statistics are kept in walls and saved in the .cad
+            file.
+
+        """
+
+        if self.graph is not None:
+            self.graph.add('solid:' + name, ['solid:' + solid for solid in solids],
+                           self._rebuild(self._build_solid_from_cut),
+                           {'name': name, 'kwargs': kwargs, 'check': check, 'min_thickness': min_thickness})
+            self.solids[name] = Graph.Lazy(self.graph, 'solid:' + name)
+            return
+
+        self.solids[name] = self._make_solid_from_cut(name, self.solids[solids[0]], self.solids[solids[1]], kwargs,
+                                                      check, min_thickness)
+
+    def screen_hemodynamics(self, shell, **kwargs):
+        """ Estimates the flow through the sections of a shell with Hemodynamics.screen.
+
+            kwargs are those of screen, as flow, harmonics and pressure. The
+            results are kept in hemodynamics and saved in the .cad file.
+
+        """
+
+        sections = self._entities({shell: self.shells[shell]})[shell].sections
+        origins = [section.origin for section in sections]
+        radii = [section.radius for section in sections]
+
+        result = Hemodynamics.screen(origins, radii, **kwargs)
+        self.hemodynamics[shell] = Hemodynamics.variant(result, names=[section.name for section in sections])
+
+        return self.hemodynamics[shell]
 
     def export_iges(self, solid, file):
 
-        self.geompy.ExportIGES(self.solids[solid].geom, file, theVersion='5.3')
+        if self.graph is not None:
+            self.graph.add('iges:' + file, ['solid:' + solid], self._build_iges, {'file': file})
+            return
+
+        self._export_iges(self.solids[solid], file)
+
+    def export_stl(self, entity, file, tolerance=1.E-2, nu=None, nt=None):
+        """ Exports a shell or a solid as a binary STL file.
+
+            The surfaces are lofted from the sections and written in blocks,
+            with a grid that meets the chordal tolerance unless nu and nt
+            are given.
+
+        """
+
+        Export.write_stl(file, self._meshes(entity, tolerance, nu, nt))
+
+    def export_vtk(self, entity, file, tolerance=1.E-2, nu=None, nt=None):
+        """ Exports a shell or a solid as a VTK file, XML (.vtu) or legacy (.vtk)"""
+
+        meshes = self._meshes(entity, tolerance, nu, nt)
+
+        if file.endswith('.vtk'):
+            Export.write_vtk(file, meshes)
+        else:
+            Export.write_vtu(file, meshes)
+
+    def _meshes(self, entity, tolerance, nu, nt):
+
+        if entity in self.solids:
+            shells = self._entities({entity: self.solids[entity]})[entity].composition
+        else:
+            shells = [(self._entities({entity: self.shells[entity]})[entity], 1.)]
+
+        return Export.meshes(shells, tolerance, nu, nt)
+
+    def flush(self):
+        """ Publishes the objects queued by a headless domain in the study"""
+
+        if self.context is not None:
+            self.context.flush()
+
+    def evaluate(self, targets=None):
+        """ Runs the pending operations of a lazy domain.
+
+            Returns the build time of each rebuilt node of the graph.
+
+        """
+
+        if self.graph is None:
+            return {}
+
+        return self.graph.evaluate(targets)
+
+    def _rebuild(self, build):
+        """ Wraps the build of a node so that the objects its previous value
+            added to the study are removed before it is built again
+        """
+
+        def wrapper(node, inputs):
+            if self.context is None:
+                return build(node, inputs)
+
+            try:
+                # Sections create their bases when first used, which are
+                # kept with the objects of the section
+                for name, value in zip(node.inputs, inputs):
+                    if isinstance(value, Section):
+                        self.context.log = self._published.setdefault(name, [])
+                        value.materialize()
+
+                self.context.remove(self._published.pop(node.name, []))
+                self.context.log = self._published[node.name] = []
+                return build(node, inputs)
+            finally:
+                self.context.log = None
+
+        return wrapper
+
+    def _build_section(self, node, inputs):
+
+        section = self._Section(node.params['name'], context=self.context, **node.params['kwargs'])
+        for operation, value in node.params['ops']:
+            getattr(section, operation)(value)
+
+        return section
+
+    def _build_shell(self, node, sections):
 
-    def save(self, file):
+        return self._make_shell(node.params['name'], sections, node.params['kwargs'])
+
+    def _build_solid_from_shell(self, node, shells):
+
+        return self._make_solid_from_shell(node.params['name'], shells[0], node.params['kwargs'])
+
+    def _build_solid_from_cut(self, node, solids):
+
+        return self._make_solid_from_cut(node.params['name'], solids[0], solids[1], node.params['kwargs'],
+                                         node.params['check'], node.params['min_thickness'])
+
+    def _build_iges(self, node, solids):
+
+        self._export_iges(solids[0], node.params['file'])
+        return node.params['file']
+
+    def _make_shell(self, name, sections_list, kwargs):
+
+        options = dict((k, v) for k, v in kwargs.items() if k != 'folder')
+        key = self._key('shell', [self._section_key(section) for section in sections_list],
+                        options, self._Shell.tolerances)
+        geom = self._load_shape(key)
+
+        shell = self._Shell(name, sections_list, geom=geom, context=self.context, **kwargs)
+        shell.key = key
+
+        # The fit errors of salome are measured on the face, which a restored
+        # shell does not keep, so they are cached next to it
+        errors_key = self._key('fit_errors', key) if self.backend == 'salome' and shell.tolerance is not None else None
+
+        if geom is None:
+            self._store_shape(key, shell.geom)
+            if errors_key is not None:
+                self.cache.put_json(errors_key, shell.fit_errors)
+        elif errors_key is not None:
+            shell.fit_errors = self.cache.get_json(errors_key)
+
+        return shell
+
+    def _make_solid_from_shell(self, name, shell, kwargs):
+
+        key = self._key('solid_from_shell', shell.key)
+        geom = self._load_shape(key)
+
+        if geom is None:
+            geom = self.geompy.MakeSolid([shell.geom])
+            self._store_shape(key, geom)
+
+        solid = self._Solid(name, geom, context=self.context, **kwargs)
+        solid.key = key
+        solid.composition = [(shell, 1.)]
+
+        return solid
+
+    def _make_solid_from_cut(self, name, main, tool, kwargs, check=True, min_thickness=0.):
+
+        if check and len(main.composition) == 1 and len(tool.composition) == 1:
+            try:
+                self.walls[name] = Wall.check(main.composition[0][0], tool.composition[0][0], min_thickness)
+            except Wall.WallError as error:
+                self.walls[name] = error.stats
+                raise
+
+        key = self._key('solid_from_cut', main.key, tool.key)
+        geom = self._load_shape(key)
+
+        if geom is None:
+            geom = self.geompy.MakeCut(main.geom, tool.geom, checkSelfInte=True)
+            self._store_shape(key, geom)
+
+        solid = self._Solid(name, geom, context=self.context, **kwargs)
+        solid.key = key
+        solid.composition = main.composition + [(shell, -sign) for shell, sign in tool.composition]
+
+        return solid
+
+    def _export_iges(self, solid, file):
+
+        key = self._key('iges', solid.key, '5.3')
+
+        if key is not None:
+            path = self.cache.get(key, '.iges')
+            if path is not None:
+                shutil.copyfile(path, file)
+                return
+
+        self.geompy.ExportIGES(solid.geom, file, theVersion='5.3')
+
+        if key is not None:
+            self.cache.put(key, '.iges', file)
+
+    def _entities(self, entities):
+        """ Returns the entities of a dictionary, evaluating lazy ones"""
+
+        return dict((name, entity.value if isinstance(entity, Graph.Lazy) else entity)
+                    for name, entity in entities.items())
+
+    def _key(self, *args):
+        """ Returns the cache key of an operation or None without cache.
+
+            Any None argument means that an input has no key either.
+
+        """
+
+        if self.cache is None or any(arg is None for arg in args):
+            return None
+
+        return self.cache.key(self.backend, *args)
+
+    def _section_key(self, section):
+
+        return self._key('section', section.origin, section.R, section.radius)
+
+    def _load_shape(self, key):
+
+        if key is None:
+            return None
+
+        if self.backend == 'numpy':
+            path = self.cache.get(key, '.pkl')
+            if path is not None:
+                with open(path, 'rb') as input_file:
+                    return pickle.load(input_file)
+        else:
+            path = self.cache.get(key, '.brep')
+            if path is not None:
+                return self.geompy.ImportBREP(path)
+
+        return None
+
+    def _store_shape(self, key, shape):
+
+        if key is None:
+            return
+
+        handle, temp = tempfile.mkstemp()
+        os.close(handle)
+
+        try:
+            if self.backend == 'numpy':
+                with open(temp, 'wb') as output_file:
+                    pickle.dump(shape, output_file, pickle.HIGHEST_PROTOCOL)
+                self.cache.put(key, '.pkl', temp)
+            else:
+                self.geompy.ExportBREP(shape, temp)
+                self.cache.put(key, '.brep', temp)
+        finally:
+            os.remove(temp)
+
+    def save(self, file, properties=None, method=None, table=None, profile=False):
+        """ Saves the study (.hdf) and the CAD information (.cad) of the model.
+
+            method is that of _get_cad_info, 'kernel' by default for the
+            salome backend and 'batch' for numpy. The batch values of a
+            salome model come from lofts of the sections, not from the
+            shapes of the kernel, so the .cad file labels them as an
+            approximation under 'properties', with the method;
+            check_cad_info compares them with the kernel ones.
+
+            table is a CadTable.CadTable, or the directory of one, where the
+            CAD information is also appended under the name of the file. It
+            only takes exact values, so a salome model saved with
+            method='batch' raises a ValueError.
+
+            When tracing, the kernel calls are written to a .trace.json file
+            and, with profile=True, their summary is added to the .cad file
+            under 'profile'.
+
+        """
 
         file_path = os.path.dirname(file)
 
+        if method is None:
+            method = 'kernel' if self.backend == 'salome' else 'batch'
+        approximation = method == 'batch' and self.backend == 'salome'
+        if table is not None and approximation:
+            raise ValueError('The batch properties of a salome model are approximations, use method=\'kernel\' '
+                             'to append them to a table')
+
+        self.evaluate()
+
         # Save SALOME study
-        file_extension = '.hdf'
-        file_name = os.path.basename(file.rsplit(file_extension, 1)[0])
+        if self.study is not None:
+            for section in self._entities(self.sections).values():
+                section.materialize()
+
+            self.flush()
+
+            file_extension = '.hdf'
+            file_name = os.path.basename(file.rsplit(file_extension, 1)[0])
 
-        salome.myStudyManager.SaveAs(os.path.join(file_path, file_name + file_extension), self.study, False)
+            with Trace.span(self.tracer, 'SaveAs', 'salome'):
+                salome.myStudyManager.SaveAs(os.path.join(file_path, file_name + file_extension), self.study, False)
 
         # Save Python dictionary with CAD information
         file_extension = '.cad'
         file_name = os.path.basename(file.rsplit(file_extension, 1)[0])
 
-        self._get_cad_info()
+        with Trace.span(self.tracer, 'cad_info'):
+            self._get_cad_info(properties, method)
+
+        info = dict(self.info, properties={'method': method, 'approximation': approximation})
+        if self.walls:
+            info = dict(info, walls=self.walls)
+        if self.hemodynamics:
+            info = dict(info, hemodynamics=self.hemodynamics)
+        if self.tracer is not None:
+            self.tracer.export(os.path.join(file_path, file_name + '.trace.json'))
+            if profile:
+                info = dict(info, profile=self.tracer.summary())
 
         with open(os.path.join(file_path, file_name + file_extension), 'w') as output_file:
-            json.dump(self.info, output_file, indent=2, sort_keys=True)
+            json.dump(info, output_file, indent=2, sort_keys=True)
+
+        if table is not None:
+            if not isinstance(table, CadTable.CadTable):
+                table = CadTable.CadTable(table)
+            table.append(file_name, info)
+
+    def check_cad_info(self, tolerance=1.E-2, properties=None):
+        """ Cross-checks the batched mass properties against the kernel ones.
+
+            Returns the list of mismatches of Properties.compare.
+
+        """
+
+        batch = self._get_cad_info(properties, method='batch')
+        kernel = self._get_cad_info(properties, method='kernel')
+
+        return Properties.compare(batch, kernel, tolerance)
 
-    def _get_cad_info(self):
+    def _get_cad_info(self, properties=None, method=None):
+        """ Computes length, area, volume, inertia and centroid of all entities.
+
+            method 'batch' measures all entities at once with Properties, from
+            the section data, while 'kernel' queries the geometry kernel for
+            each entity, the default for the salome backend. properties
+            restricts the computation to a subset of Properties.PROPERTIES.
+
+        """
+
+        if method is None:
+            method = 'kernel' if self.backend == 'salome' else 'batch'
+        properties = Properties.PROPERTIES if properties is None else tuple(properties)
 
         self.info = {}
         self.info['sections'] = {}
         self.info['shells'] = {}
         self.info['solids'] = {}
 
-        entities = {}
-        for d in (self.sections, self.shells, self.solids):
-            entities.update(d)
+        missing = {'sections': {}, 'shells': {}, 'solids': {}}
+        keys = {}
+
+        for entity_type, entities in (('sections', self.sections), ('shells', self.shells), ('solids', self.solids)):
+            for name, entity in self._entities(entities).items():
+                if entity_type == 'sections':
+                    key = self._key('properties', method, properties, self._section_key(entity))
+                else:
+                    key = self._key('properties', method, properties, entity.key)
+
+                if key is not None:
+                    cached = self.cache.get_json(key)
+                    if cached is not None:
+                        self.info[entity_type][name] = cached
+                        continue
+
+                keys[(entity_type, name)] = key
+                missing[entity_type][name] = entity
 
-        for name, entity in entities.items():
-            entity_type = type(entity).__name__.lower() + 's'
+        if method == 'batch':
+            solids = dict((name, solid.composition) for name, solid in missing['solids'].items())
+            computed = Properties.cad_info(missing['sections'], missing['shells'], solids, properties)
+        else:
+            computed = {}
+            for entity_type, entities in missing.items():
+                computed[entity_type] = {}
+                for name, entity in entities.items():
+                    computed[entity_type][name] = self._get_kernel_info(entity, properties)
+
+        for (entity_type, name), key in keys.items():
+            self.info[entity_type][name] = computed[entity_type][name]
+            if key is not None:
+                self.cache.put_json(key, computed[entity_type][name])
+
+        return self.info
+
+    def _get_kernel_info(self, entity, properties):
 
+        info = {}
+
+        if set(properties) & set(('Length', 'Area', 'Volume')):
             BasicProperties = self.geompy.BasicProperties(entity.geom)
+            info['Length'] = BasicProperties[0]
+            info['Area'] = BasicProperties[1]
+            info['Volume'] = BasicProperties[2]
+
+        if 'Inertia' in properties:
             Inertia = self.geompy.Inertia(entity.geom)
-            CDG = self.geompy.PointCoordinates(self.geompy.MakeCDG(entity.geom))
-
-            self.info[entity_type][name] = {}
-            self.info[entity_type][name]['Length'] = BasicProperties[0]
-            self.info[entity_type][name]['Area'] = BasicProperties[1]
-            self.info[entity_type][name]['Volume'] = BasicProperties[2]
-            self.info[entity_type][name]['I11'] = Inertia[0]
-            self.info[entity_type][name]['I12'] = Inertia[1]
-            self.info[entity_type][name]['I13'] = Inertia[2]
-            self.info[entity_type][name]['I21'] = Inertia[3]
-            self.info[entity_type][name]['I22'] = Inertia[4]
-            self.info[entity_type][name]['I23'] = Inertia[5]
-            self.info[entity_type][name]['I31'] = Inertia[6]
-            self.info[entity_type][name]['I32'] = Inertia[7]
-            self.info[entity_type][name]['I33'] = Inertia[8]
-            self.info[entity_type][name]['Ix'] = Inertia[9]
-            self.info[entity_type][name]['Iy'] = Inertia[10]
-            self.info[entity_type][name]['Iz'] = Inertia[11]
-            self.info[entity_type][name]['CDG'] = CDG
+            info['I11'] = Inertia[0]
+            info['I12'] = Inertia[1]
+            info['I13'] = Inertia[2]
+            info['I21'] = Inertia[3]
+            info['I22'] = Inertia[4]
+            info['I23'] = Inertia[5]
+            info['I31'] = Inertia[6]
+            info['I32'] = Inertia[7]
+            info['I33'] = Inertia[8]
+            info['Ix'] = Inertia[9]
+            info['Iy'] = Inertia[10]
+            info['Iz'] = Inertia[11]
+
+        if 'CDG' in properties:
+            info['CDG'] = list(self.geompy.PointCoordinates(self.geompy.MakeCDG(entity.geom)))
+
+        return dict((key, value) for key, value in info.items() if key in properties or key in Properties.INERTIA)
 
 
 class Section(object):
@@ -133,211 +797,232 @@ class Section(object):
         OX_LCS is a sequence with the three components of LCS OX direction in GCS
         OY_LCS is a sequence with the three components of LCS OY direction in GCS
 
+        The pose of the LCS is kept in the rotation matrix R, whose rows are the
+        LCS directions in GCS. Rotations are composed in R and the LCS and the
+        bases are only created in their final position when they are first
+        used, with a single MakePosition per section.
+
     """
 
-    def __init__(self, name, origin, OX_LCS=None, OY_LCS=None, folder=True):
+    def __init__(self, name, origin, OX_LCS=None, OY_LCS=None, folder=True, context=None):
         self.name = name
         self.origin = list(origin)
-        self.bases = {}
+        self.radius = None
+
+        self._LCS = None
+        self._bases = {}
 
-        self.study = salome.myStudyManager.GetStudyByName(salome.myStudyManager.GetOpenStudies()[0])
-        self.geompy = geomBuilder.New(self.study)
+        self.context = context or Context()
+        self.geompy = self.context.geompy
 
         if folder:
-            self.folder = self.geompy.NewFolder('section_' + name)
+            self.folder = self.context.new_folder('section_' + name)
         else:
             self.folder = None
 
-        try:
-            self.OX_LCS = list(OX_LCS)
-        except:
-            self.OX_LCS = [1., 0., 0.]
+        if OX_LCS is None:
+            OX_LCS = [1., 0., 0.]
 
-        try:
-            self.OY_LCS = list(OY_LCS)
-        except:
-            self.OY_LCS = [0., 1., 0.]
+        if OY_LCS is None:
+            OY_LCS = [0., 1., 0.]
+
+        self.R = Loft.rotation_matrix(OX_LCS, OY_LCS)
 
         # Create a vertex in the origin of the LCS
         self.location = self.geompy.MakeVertex(*tuple(self.origin))
-        self.geompy.addToStudy(self.location, self.name + '_origin')
-        if self.folder:
-            self.geompy.PutToFolder(self.location, self.folder)
+        self.context.add(self.location, self.name + '_origin', self.folder)
 
-        # Create LCS for the section
-        self.LCS = self.geompy.MakeMarker(*tuple(self.origin + self.OX_LCS + self.OY_LCS))
-        self._obtain_rotation_matrix_LCS()
-        self.geompy.addToStudy(self.LCS, self.name + '_LCS')
-        if self.folder:
-            self.geompy.PutToFolder(self.LCS, self.folder)
-
-        salome.sg.updateObjBrowser(True)
+        self.context.refresh()
 
-    def _obtain_rotation_matrix_LCS(self):
-        """ Obtains the rotation matrix R of the LCS and the
-            Euler's angle and axis of the transformation"""
-
-        _temp = self.geompy.GetPosition(self.LCS)
-        rx = _temp[6:9]
-        rz = _temp[3:6]
-        vx = self.geompy.MakeVectorDXDYDZ(*rx)
-        vz = self.geompy.MakeVectorDXDYDZ(*rz)
-        vy = self.geompy.CrossProduct(vz, vx)
-        ry = self.geompy.VectorCoordinates(vy)
-        R = [list(rx), list(ry), list(rz)]
-
-        eangle = math.acos(0.5*(R[0][0]+R[1][1]+R[2][2]-1.))
-        if abs(eangle) > 1.E-2:
-            eaxis = [(R[2][1]-R[1][2])/(2.*math.sin(eangle)),
-                     (R[0][2]-R[2][0])/(2.*math.sin(eangle)),
-                     (R[1][0]-R[0][1])/(2.*math.sin(eangle)),
-                     ]
-            eaxisv = self.geompy.MakeVectorDXDYDZ(*eaxis)
-        else:
-            eaxis = [0, 0, 0]
-            eaxisv = None
+    @property
+    def OX_LCS(self):
+        return self.R[0].tolist()
 
-        self.R = R
-        self.EulerAngle = eangle
-        self.EulerAngleDeg = eangle*180./math.pi
-        self.EulerAxis = eaxis
-        self.EulerAxisVector = eaxisv
+    @property
+    def OY_LCS(self):
+        return self.R[1].tolist()
 
-    def _transform_bases_to_LCS(self):
-        """ Transforms all bases to the LCS"""
+    @property
+    def LCS(self):
+        self.materialize()
+        return self._LCS
 
-        for base in self.bases.values():
-            if self.EulerAxisVector:
-                self.geompy.Rotate(base, self.EulerAxisVector, -self.EulerAngle)
+    @property
+    def bases(self):
+        self.materialize()
+        return self._bases
 
-            self.geompy.TranslateDXDYDZ(base, *tuple(self.origin))
+    @property
+    def geom(self):
+        return self.bases['face']
 
-    def _transform_bases_to_GCS(self):
-        """ Transforms all bases to the GCS"""
-
-        for base in self.bases.values():
-            self.geompy.TranslateDXDYDZ(base, *tuple([-i for i in self.origin]))
-
-            if self.EulerAxisVector:
-                self.geompy.Rotate(base, self.EulerAxisVector, self.EulerAngle)
+    def _rotate(self, axis, angle):
+        self.R = self.R.dot(Loft.axis_rotation(axis, angle).T)
+        self._LCS = None
 
     def rotateX(self, angle):
         """Rotate the section around an axis parallel to global X
         through the origin of the LCS"""
 
-        axis = self.geompy.MakeVectorDXDYDZ(1., 0, 0)
-        axis = self.geompy.TranslateDXDYDZ(axis, *tuple(self.origin))
-        self.geompy.Rotate(self.LCS, axis, angle*math.pi/180.)
-        self._transform_bases_to_GCS()
-        self._obtain_rotation_matrix_LCS()
-        self._transform_bases_to_LCS()
+        self._rotate([1., 0., 0.], angle)
 
     def rotateY(self, angle):
         """Rotate the section around an axis parallel to global Y
         through the origin of the LCS"""
 
-        axis = self.geompy.MakeVectorDXDYDZ(0., 1., 0)
-        axis = self.geompy.TranslateDXDYDZ(axis, *tuple(self.origin))
-        self.geompy.Rotate(self.LCS, axis, angle*math.pi/180.)
-        self._transform_bases_to_GCS()
-        self._obtain_rotation_matrix_LCS()
-        self._transform_bases_to_LCS()
+        self._rotate([0., 1., 0.], angle)
 
     def rotateZ(self, angle):
         """Rotate the section around an axis parallel to global Z
         through the origin of the LCS"""
 
-        axis = self.geompy.MakeVectorDXDYDZ(0., 0., 1.)
-        axis = self.geompy.TranslateDXDYDZ(axis, *tuple(self.origin))
-        self.geompy.Rotate(self.LCS, axis, angle*math.pi/180.)
-        self._transform_bases_to_GCS()
-        self._obtain_rotation_matrix_LCS()
-        self._transform_bases_to_LCS()
+        self._rotate([0., 0., 1.], angle)
 
     def add_circle(self, radius):
-        self.bases['edge'] = self.geompy.MakeCircleR(radius)
-        self.bases['face'] = self.geompy.MakeFaceWires([self.bases['edge']], isPlanarWanted=True)
-        self.bases['shell'] = self.geompy.MakeShell([self.bases['face']])
-        self.geom = self.bases['face']
+        self.radius = radius
+        self._LCS = None
 
-        self._transform_bases_to_LCS()
+    def materialize(self):
+        """ Creates the LCS and the bases of the section in the study.
 
-        for key, base in self.bases.items():
-            self.geompy.addToStudy(base, self.name + '_base_' + key)
-            if self.folder:
-                self.geompy.PutToFolder(base, self.folder)
+            It does nothing if they are up to date. After a rotation or a new
+            circle they are created again.
 
-        salome.sg.updateObjBrowser(True)
+        """
+
+        if self._LCS is not None:
+            return
+
+        # Create LCS for the section
+        self._LCS = self.geompy.MakeMarker(*tuple(self.origin + self.OX_LCS + self.OY_LCS))
+        self.context.add(self._LCS, self.name + '_LCS', self.folder)
+
+        self._bases = {}
+
+        if self.radius is not None:
+            circle = self.geompy.MakeCircleR(self.radius)
+            self._bases['edge'] = self.geompy.MakePosition(circle, None, self._LCS)
+            self._bases['face'] = self.geompy.MakeFaceWires([self._bases['edge']], isPlanarWanted=True)
+            self._bases['shell'] = self.geompy.MakeShell([self._bases['face']])
+
+            for key, base in self._bases.items():
+                self.context.add(base, self.name + '_base_' + key, self.folder)
+
+        self.context.refresh()
 
 
 class Shell(object):
+    """ Surface through a list of sections, built with MakeFilling.
+
+        With a tolerance, the sections are first fitted by least squares with
+        Loft.fit, which finds the lowest degree and smallest control net that
+        pass within tolerance of all of them. MakeFilling then gets that
+        degree, no iterations and the circles of the fitted surface at its
+        control points instead of the sections. The surface MakeFilling builds
+        from those circles is not the fitted one, so fit_errors gives the
+        largest distance from samples points of each section to the face it
+        built, as Loft.ring_errors does for the fitted surface.
+
+    """
 
-    def __init__(self, name, sections, folder=False, closed=True, minBSplineDegree=2, maxBSplineDegree=5, approximation=True):
+    tolerances = {'theTol2D': 1.E-5, 'theTol3D': 1.E-5, 'theNbIter': 100, 'sewing_precision': 1.E-4}
+    samples = 32
+
+    def __init__(self, name, sections, folder=False, closed=True, minBSplineDegree=2, maxBSplineDegree=5, approximation=True,
+                 geom=None, context=None, tolerance=None):
         self.name, self.sections = name, sections
+        self.closed = closed
+        self.minBSplineDegree, self.maxBSplineDegree = minBSplineDegree, maxBSplineDegree
+        self.tolerance = tolerance
+        self.fit_errors = None
 
         self.edges = []
         self.shells = []
         self.locations = []
 
-        self.study = salome.myStudyManager.GetStudyByName(salome.myStudyManager.GetOpenStudies()[0])
-        self.geompy = geomBuilder.New(self.study)
+        self.context = context or Context()
+        self.geompy = self.context.geompy
 
         if folder:
-            self.folder = self.geompy.NewFolder('shell_' + name)
+            self.folder = self.context.new_folder('shell_' + name)
         else:
             self.folder = None
 
         theMinDeg = minBSplineDegree
         theMaxDeg = maxBSplineDegree
-        theTol2D = 1.E-5
-        theTol3D = 1.E-5
-        theNbIter = 100
+        theTol2D = self.tolerances['theTol2D']
+        theTol3D = self.tolerances['theTol3D']
+        theNbIter = self.tolerances['theNbIter']
         theMethod = GEOM.FOM_Default
         isApprox = approximation
 
-        sewing_precision = 1.E-4
+        sewing_precision = self.tolerances['sewing_precision']
 
         for section in self.sections:
             self.edges.append(section.bases['edge'])
             self.shells.append(section.bases['shell'])
             self.locations.append(section.location)
 
-        self.compound = self.geompy.MakeCompound(self.edges)
-        self.face = self.geompy.MakeFilling(self.compound, theMinDeg, theMaxDeg, theTol2D, theTol3D, theNbIter, theMethod, isApprox)
+        if tolerance is not None:
+            knots, net, degree, _ = Loft.fit([section.origin for section in self.sections],
+                                             [section.OX_LCS for section in self.sections],
+                                             [section.OY_LCS for section in self.sections],
+                                             [section.radius for section in self.sections],
+                                             tolerance, minBSplineDegree, maxBSplineDegree)
+
+            theMinDeg = theMaxDeg = degree
+            theTol3D = tolerance
+            theNbIter = 0
+
+            self.rings = []
+            for origin, OX, OY, radius in zip(*Loft.rings(knots, net, degree)):
+                LCS = self.geompy.MakeMarker(*tuple(origin.tolist() + OX.tolist() + OY.tolist()))
+                self.rings.append(self.geompy.MakePosition(self.geompy.MakeCircleR(float(radius)), None, LCS))
 
-        if closed:
-            sewing = self.geompy.MakeSewing([self.face, self.sections[0].bases['shell'], self.sections[-1].bases['shell']], sewing_precision)
-            self.geom = self.geompy.MakeShell([sewing])
+            self.compound = self.geompy.MakeCompound(self.rings)
         else:
-            self.geom = self.geompy.MakeShell([self.face])
+            self.compound = self.geompy.MakeCompound(self.edges)
 
-        self.geompy.addToStudy(self.geom, self.name)
-        self.geompy.addToStudy(self.compound, self.name + '_sections')
+        if geom is not None:
+            # Shell restored from the cache of the Domain
+            self.geom = geom
+        else:
+            self.face = self.geompy.MakeFilling(self.compound, theMinDeg, theMaxDeg, theTol2D, theTol3D, theNbIter, theMethod, isApprox)
 
-        if self.folder:
-            self.geompy.PutToFolder(self.geom, self.folder)
-            self.geompy.PutToFolder(self.compound, self.folder)
+            if tolerance is not None:
+                self.fit_errors = {}
+                for section in self.sections:
+                    vertices = [self.geompy.MakeVertexOnCurve(section.bases['edge'], i / float(self.samples))
+                                for i in range(self.samples)]
+                    self.fit_errors[section.name] = max(self.geompy.MinDistance(vertex, self.face)
+                                                        for vertex in vertices)
 
-        salome.sg.updateObjBrowser(True)
+            if closed:
+                sewing = self.geompy.MakeSewing([self.face, self.sections[0].bases['shell'], self.sections[-1].bases['shell']], sewing_precision)
+                self.geom = self.geompy.MakeShell([sewing])
+            else:
+                self.geom = self.geompy.MakeShell([self.face])
+
+        self.context.add(self.geom, self.name, self.folder)
+        self.context.add(self.compound, self.name + '_sections', self.folder)
+
+        self.context.refresh()
 
 
 class Solid(object):
 
-    def __init__(self, name, solid, folder=False):
+    def __init__(self, name, solid, folder=False, context=None):
         self.name = name
         self.geom = solid
 
-        self.study = salome.myStudyManager.GetStudyByName(salome.myStudyManager.GetOpenStudies()[0])
-        self.geompy = geomBuilder.New(self.study)
+        self.context = context or Context()
+        self.geompy = self.context.geompy
 
         if folder:
-            self.folder = self.geompy.NewFolder('solid_' + name)
+            self.folder = self.context.new_folder('solid_' + name)
         else:
             self.folder = None
 
-        self.geompy.addToStudy(self.geom, self.name)
-
-        if self.folder:
-            self.geompy.PutToFolder(self.geom, self.folder)
+        self.context.add(self.geom, self.name, self.folder)
 
-        salome.sg.updateObjBrowser(True)
+        self.context.refresh()
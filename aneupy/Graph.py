@@ -0,0 +1,192 @@
+# =============================================================================
+#
+# Graph.py
+#
+# Lazy operation graph with incremental re-evaluation of Domain entities
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import time
+from collections import OrderedDict
+
+try:
+    from aneupy import Cache
+except ImportError:
+    import Cache
+
+
+class Node(object):
+    """ Operation of the graph.
+
+        build(node, values) returns the value of the node from the values of
+        its inputs. params describes the operation; together with the
+        signatures of the inputs it gives the signature of the node, which
+        tells whether the stored value is still valid.
+
+    """
+
+    def __init__(self, name, inputs, build, params):
+        self.name = name
+        self.inputs = list(inputs)
+        self.build = build
+        self.params = params
+
+        self.value = None
+        self.signature = None
+        self.time = None
+
+
+class Graph(object):
+    """ Dependency graph evaluated on demand.
+
+        Nodes are only built when their value is requested, and a node is
+        rebuilt only when its parameters or those of any upstream node changed
+        since it was last built. timings keeps the build time of each node and
+        history the nodes rebuilt and the time spent by each evaluation.
+
+    """
+
+    def __init__(self):
+        self.nodes = OrderedDict()
+        self.timings = {}
+        self.history = []
+
+    def add(self, name, inputs, build, params):
+        """ Adds a node, or redefines it keeping its value until it is rebuilt"""
+
+        for i in inputs:
+            if i not in self.nodes:
+                raise KeyError('Unknown input {0} of {1}'.format(i, name))
+
+        if name in self.nodes:
+            node = self.nodes[name]
+            node.inputs, node.build, node.params = list(inputs), build, params
+        else:
+            node = self.nodes[name] = Node(name, inputs, build, params)
+
+        return node
+
+    def upstream(self, targets=None):
+        """ Returns the targets and all their inputs in topological order"""
+
+        if targets is None:
+            targets = list(self.nodes.keys())
+
+        order, visited = [], set()
+
+        def visit(name):
+            if name in visited:
+                return
+            visited.add(name)
+            for i in self.nodes[name].inputs:
+                visit(i)
+            order.append(name)
+
+        for name in targets:
+            visit(name)
+
+        return order
+
+    def signatures(self, targets=None):
+        signatures = OrderedDict()
+        for name in self.upstream(targets):
+            node = self.nodes[name]
+            signatures[name] = Cache.hash_key(name, node.params, [signatures[i] for i in node.inputs])
+
+        return signatures
+
+    def dirty(self, targets=None):
+        """ Returns the nodes that would be rebuilt to evaluate targets"""
+
+        return [name for name, signature in self.signatures(targets).items()
+                if self.nodes[name].signature != signature]
+
+    def evaluate(self, targets=None):
+        """ Rebuilds the dirty nodes upstream of targets (all by default).
+
+            Returns an ordered dictionary with the build time of each
+            rebuilt node.
+
+        """
+
+        rebuilt = OrderedDict()
+
+        for name, signature in self.signatures(targets).items():
+            node = self.nodes[name]
+            if node.signature == signature:
+                continue
+
+            start = time.time()
+            node.value = node.build(node, [self.nodes[i].value for i in node.inputs])
+            node.time = time.time() - start
+            node.signature = signature
+
+            rebuilt[name] = self.timings[name] = node.time
+
+        if rebuilt:
+            self.history.append({'rebuilt': list(rebuilt.keys()), 'time': sum(rebuilt.values())})
+
+        return rebuilt
+
+    def value(self, name):
+        self.evaluate([name])
+        return self.nodes[name].value
+
+
+class Lazy(object):
+    """ Proxy of the value of a node.
+
+        Attribute lookups evaluate the node and are forwarded to its value.
+        set edits the keyword arguments of the operation.
+
+    """
+
+    def __init__(self, graph, name):
+        self._graph = graph
+        self._name = name
+
+    @property
+    def node(self):
+        return self._graph.nodes[self._name]
+
+    @property
+    def value(self):
+        return self._graph.value(self._name)
+
+    def set(self, **kwargs):
+        self.node.params['kwargs'].update(kwargs)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.value, attr)
+
+
+class LazySection(Lazy):
+    """ Proxy of a section that records add_circle and rotations.
+
+        A new add_circle replaces the previous circle, so it can be used to
+        edit the radius of the section.
+
+    """
+
+    def _record(self, operation, value):
+        ops = self.node.params['ops']
+        if operation == 'add_circle':
+            ops[:] = [op for op in ops if op[0] != 'add_circle']
+        ops.append((operation, value))
+
+    def add_circle(self, radius):
+        self._record('add_circle', radius)
+
+    def rotateX(self, angle):
+        self._record('rotateX', angle)
+
+    def rotateY(self, angle):
+        self._record('rotateY', angle)
+
+    def rotateZ(self, angle):
+        self._record('rotateZ', angle)
@@ -0,0 +1,258 @@
+# =============================================================================
+#
+# Hemodynamics.py
+#
+# Reduced-order flow along the sections of a shell for the screening of variants
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import json
+import math
+
+import numpy as np
+
+# Blood viscosity (Pa s) and density (kg/m3)
+MU = 3.5E-3
+RHO = 1060.
+
+MMHG = 133.322
+
+# Womersley numbers above which the asymptotic expansion of F10 is used, and
+# points of the table of F10 below
+ALPHA_SERIES = 30.
+TABLE = 1 << 14
+
+# Times of the period evaluated at once for the peak values
+BLOCK = 8
+
+_table = [None]
+
+# Per variant quantities of summary, from the per section results
+SUMMARY = {'pressure_drop': ('pressure_drop', 'sum'), 'max_wss': ('wss', 'max'), 'min_wss': ('wss', 'min'),
+           'max_peak_wss': ('peak_wss', 'max'), 'max_osi': ('osi', 'max'), 'max_tension': ('tension', 'max'),
+           'max_peak_tension': ('peak_tension', 'max'), 'max_reynolds': ('reynolds', 'max')}
+
+
+def _bessel(n, z, terms=80):
+    """ Bessel function of the first kind J_n of a complex array, from its power series"""
+
+    h = 0.5 * z
+    term = np.ones_like(z)
+    for k in range(1, n + 1):
+        term = term * h / k
+
+    total = term
+    for k in range(1, terms):
+        term = term * (-h * h) / (k * (k + n))
+        total = total + term
+
+    return total
+
+
+def _womersley_series(alpha):
+    z = np.maximum(alpha, 1.E-12) * np.exp(0.75j * math.pi)
+    return 2. * _bessel(1, z) / (z * _bessel(0, z))
+
+
+def womersley(alpha):
+    """ Returns F10 = 2 J1(z) / (z J0(z)), z = alpha i^(3/2), of Womersley numbers alpha.
+
+        1 - F10 scales the steady flow of a pressure gradient to the
+        oscillating one and F10 the wall shear stress. Up to ALPHA_SERIES,
+        F10 is interpolated in a table of its power series, as a batch needs
+        it for every section and harmonic, and above it an asymptotic
+        expansion is used.
+
+    """
+
+    if _table[0] is None:
+        grid = np.linspace(0., ALPHA_SERIES, TABLE)
+        _table[0] = grid, _womersley_series(grid)
+
+    grid, values = _table[0]
+    alpha = np.asarray(alpha, dtype=float)
+
+    # Linear interpolation in the uniform grid
+    x = np.clip(alpha, 0., ALPHA_SERIES) * ((TABLE - 1) / ALPHA_SERIES)
+    i = np.minimum(x.astype(np.intp), TABLE - 2)
+    F = values[i] + (x - i) * (values[i + 1] - values[i])
+
+    large = alpha > ALPHA_SERIES
+    if np.any(large):
+        z = alpha[large] * np.exp(0.75j * math.pi)
+        F[large] = 2.j / z * (1. - 0.5j / z + 0.125 / (z * z))
+
+    return F
+
+
+def resistance(r1, r2, length, mu=MU):
+    """ Poiseuille resistance (Pa s/m3) of conical segments between radii r1 and r2"""
+
+    return 8. * mu * length * (r1 * r1 + r1 * r2 + r2 * r2) / (3. * math.pi * r1**3 * r2**3)
+
+
+def fourier(flow, harmonics=10):
+    """ Returns the mean and the first complex harmonics of a flow waveform
+        sampled at equal times over one period, as used by screen
+    """
+
+    flow = np.asarray(flow, dtype=float)
+    coefficients = np.fft.rfft(flow, axis=-1) / flow.shape[-1]
+
+    return coefficients[..., 0].real, 2. * coefficients[..., 1:harmonics + 1]
+
+
+def screen(origins, radii, flow=4.E-6, harmonics=None, period=0.8, mu=MU, rho=RHO, pressure=100. * MMHG,
+           scale=1.E-3, samples=64):
+    """ Reduced-order flow through the sections of shells.
+
+        origins (..., n, 3) and radii (..., n) are the ordered sections of
+        one or a batch of shells, in model units times scale meters. The
+        flow (m3/s) is flow + Re(sum harmonics[k] exp(i (k+1) w t)), with
+        w = 2 pi / period, the same for every section; harmonics (..., h)
+        are the complex amplitudes given by fourier, and None is a steady
+        flow. The outlet (last section) is held at pressure (Pa).
+
+        Each segment between two sections has the Poiseuille resistance of
+        a cone for the mean flow and the Womersley impedance of a rigid
+        tube of their mean radius for each harmonic. The wall shear stress
+        of a section is that of a Womersley flow of its radius, and the
+        wall tension that of Laplace's law for a cylinder, pressure times
+        radius. Peak values, and the oscillatory shear index, are taken on
+        samples times of the period.
+
+        Returns a dictionary of arrays (..., n) per section, or (..., n - 1)
+        per segment: length, resistance, pressure_drop (mean, per segment),
+        pressure and peak_pressure, wss and peak_wss, osi, tension and
+        peak_tension, womersley (number of the first harmonic) and reynolds
+        (mean), all in SI units.
+
+    """
+
+    origins = np.asarray(origins, dtype=float) * scale
+    r = np.asarray(radii, dtype=float) * scale
+    if np.any(~(r > 0.)):
+        raise ValueError('All sections must have a positive radius')
+
+    flow = np.asarray(flow, dtype=float)[..., None]
+    length = np.sqrt(((origins[..., 1:, :] - origins[..., :-1, :])**2).sum(axis=-1))
+    r1, r2 = r[..., :-1], r[..., 1:]
+    R = resistance(r1, r2, length, mu)
+
+    drop = R * flow
+    downstream = np.concatenate((np.cumsum(drop[..., ::-1], axis=-1)[..., ::-1], np.zeros_like(r[..., :1])), axis=-1)
+    mean_pressure = pressure + downstream
+    wss = 4. * mu * flow / (math.pi * r**3)
+
+    omega = 2. * math.pi / period
+    alpha = r * math.sqrt(omega * rho / mu)
+
+    peak_pressure, peak_wss, osi = mean_pressure, np.abs(wss), np.zeros_like(r)
+
+    if harmonics is not None:
+        Q = np.asarray(harmonics, dtype=complex)
+        k = np.arange(1, Q.shape[-1] + 1)
+        Q = Q[..., None, :]
+
+        # Impedance of the segments and shear of the sections per harmonic (..., n, h)
+        rs = 0.5 * (r1 + r2)[..., None]
+        F = womersley(rs * np.sqrt(k * omega * rho / mu))
+        Z = 1.j * k * omega * rho * length[..., None] / (math.pi * rs * rs * (1. - F))
+        dP = Z * Q
+        P = np.concatenate((np.cumsum(dP[..., ::-1, :], axis=-2)[..., ::-1, :], np.zeros_like(dP[..., :1, :])),
+                           axis=-2)
+
+        F = womersley(r[..., None] * np.sqrt(k * omega * rho / mu))
+        T = 1.j * k * omega * rho * Q * F / (2. * math.pi * r[..., None] * (1. - F))
+
+        # Re(X exp(i k w t)) of all the harmonics is a product with the
+        # cosines and sines of a block of times
+        shape = np.broadcast(P[..., 0], T[..., 0]).shape
+        P = np.concatenate((P.real, -P.imag), axis=-1).reshape(-1, 2 * len(k))
+        T = np.concatenate((T.real, -T.imag), axis=-1).reshape(-1, 2 * len(k))
+
+        peak_pressure = mean_pressure.copy()
+        peak_wss = np.abs(wss)
+        signed, absolute = np.zeros_like(r), np.zeros_like(r)
+        times = np.arange(samples) * (period / samples)
+        for start in range(0, samples, BLOCK):
+            angle = k[:, None] * omega * times[None, start:start + BLOCK]
+            basis = np.concatenate((np.cos(angle), np.sin(angle)))
+
+            pressure_t = mean_pressure[..., None] + P.dot(basis).reshape(shape + (-1,))
+            wss_t = wss[..., None] + T.dot(basis).reshape(shape + (-1,))
+
+            np.maximum(peak_pressure, pressure_t.max(axis=-1), out=peak_pressure)
+            np.maximum(peak_wss, np.abs(wss_t).max(axis=-1), out=peak_wss)
+            signed += wss_t.sum(axis=-1)
+            absolute += np.abs(wss_t).sum(axis=-1)
+
+        osi = 0.5 * (1. - np.abs(signed) / np.maximum(absolute, 1.E-300))
+
+    return {'length': length, 'resistance': R, 'pressure_drop': drop,
+            'pressure': mean_pressure, 'peak_pressure': peak_pressure,
+            'wss': wss, 'peak_wss': peak_wss, 'osi': osi,
+            'tension': mean_pressure * r, 'peak_tension': peak_pressure * r,
+            'womersley': alpha, 'reynolds': 2. * rho * flow / (math.pi * r * mu)}
+
+
+def summary(result):
+    """ Returns the per variant quantities of SUMMARY of a result of screen"""
+
+    reduce = {'sum': np.sum, 'max': np.max, 'min': np.min}
+
+    return dict((name, reduce[how](result[key], axis=-1)) for name, (key, how) in SUMMARY.items())
+
+
+def select(result, **limits):
+    """ Returns the indices of the variants whose summary is within limits.
+
+        Each limit is a pair (low, high) of a quantity of SUMMARY, with None
+        for no bound, as select(result, max_peak_wss=(None, 10.), min_wss=(0.4, None)).
+
+    """
+
+    values = summary(result)
+    keep = np.ones(np.shape(values['pressure_drop']), dtype=bool)
+
+    for name, (low, high) in limits.items():
+        if name not in values:
+            raise ValueError('Unknown quantity {0}, not in {1}'.format(name, sorted(values)))
+        if low is not None:
+            keep &= values[name] >= low
+        if high is not None:
+            keep &= values[name] <= high
+
+    return np.flatnonzero(keep)
+
+
+def variant(result, index=None, names=None):
+    """ Returns the results of a variant of a batch, or of a single shell if
+        index is None, as lists with its summary, to be saved in the CAD
+        information. names are the names of the sections
+    """
+
+    values = dict((key, value if index is None else value[index]) for key, value in result.items())
+    info = dict((key, np.asarray(value).tolist()) for key, value in values.items())
+    info['summary'] = dict((key, float(value)) for key, value in summary(values).items())
+    if names is not None:
+        info['sections'] = list(names)
+
+    return info
+
+
+def attach(file, shell, info):
+    """ Adds the results of variant for a shell to the CAD information of a .cad file"""
+
+    with open(file) as input_file:
+        cad_info = json.load(input_file)
+
+    cad_info.setdefault('hemodynamics', {})[shell] = info
+
+    with open(file, 'w') as output_file:
+        json.dump(cad_info, output_file, indent=2, sort_keys=True)
+
+    return cad_info
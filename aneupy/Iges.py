@@ -0,0 +1,201 @@
+# =============================================================================
+#
+# Iges.py
+#
+# Pre-scan of IGES files: entity counts, bounding box and consistency checks
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import hashlib
+
+# Sections of an IGES file, in order, by the letter of column 73
+SECTIONS = 'SGDPT'
+
+# Entity types read for the bounding box
+POINT, LINE, ARC, MATRIX, BSPLINE_CURVE, BSPLINE_SURFACE = 116, 110, 100, 124, 126, 128
+
+
+class IgesError(ValueError):
+    """ An IGES file is broken or holds no geometry"""
+    pass
+
+
+def digest(file, chunk=1 << 20):
+    """ Returns the SHA-1 of the content of a file"""
+
+    sha = hashlib.sha1()
+    with open(file, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(chunk), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def _delimiters(global_data):
+    """ Returns the parameter and record delimiters given in the global section"""
+
+    delimiters = [',', ';']
+    text = global_data
+
+    for i in range(2):
+        if text.startswith('1H'):
+            delimiters[i] = text[2]
+            text = text[4:]
+        elif text.startswith(delimiters[0]):
+            text = text[1:]
+        else:
+            break
+
+    return delimiters
+
+
+def _real(text):
+    return float(text.strip().replace('D', 'E').replace('d', 'e'))
+
+
+def _points(entity_type, p):
+    """ Returns the points (x, y, z) that bound an entity from its parameters"""
+
+    if entity_type == POINT:
+        return [p[0:3]]
+
+    if entity_type == LINE:
+        return [p[0:3], p[3:6]]
+
+    if entity_type == ARC:
+        z, xc, yc = p[0], p[1], p[2]
+        r = ((p[3] - xc)**2 + (p[4] - yc)**2)**0.5
+        return [(xc - r, yc - r, z), (xc + r, yc + r, z)]
+
+    if entity_type == BSPLINE_CURVE:
+        k, m = int(p[0]), int(p[1])
+        first = 6 + (k + m + 2) + (k + 1)
+        return [p[first + 3 * i:first + 3 * i + 3] for i in range(k + 1)]
+
+    if entity_type == BSPLINE_SURFACE:
+        k1, k2, m1, m2 = int(p[0]), int(p[1]), int(p[2]), int(p[3])
+        n = (k1 + 1) * (k2 + 1)
+        first = 9 + (k1 + m1 + 2) + (k2 + m2 + 2) + n
+        return [p[first + 3 * i:first + 3 * i + 3] for i in range(n)]
+
+    return []
+
+
+def scan(file):
+    """ Reads the structure of an IGES file without converting its geometry.
+
+        Checks the sections, the terminate counts and the pointers between
+        the directory and the parameter data, and raises IgesError if any is
+        wrong or if there are no geometric entities (types 100 to 199 and
+        500 to 599). Returns a dictionary with the number of entities, the
+        count of each type and the bounding box (low, high) of the points,
+        lines, arcs and B-spline control points, with their transformation
+        matrices applied.
+
+    """
+
+    lines = dict((section, []) for section in SECTIONS)
+    order = []
+
+    try:
+        with open(file) as input_file:
+            for number, line in enumerate(input_file):
+                if not line.strip():
+                    continue
+                line = line.rstrip('\r\n').ljust(80)
+                section = line[72]
+                if section not in lines:
+                    raise IgesError('{0}: line {1} has no section letter in column 73'.format(file, number + 1))
+                if not order or order[-1] != section:
+                    order.append(section)
+                lines[section].append(line)
+    except (IOError, OSError) as error:
+        raise IgesError('{0}: {1}'.format(file, error))
+
+    if ''.join(order) not in (SECTIONS, SECTIONS[1:]):
+        raise IgesError('{0}: sections {1} are not in the order {2}'.format(file, ''.join(order) or 'none', SECTIONS))
+
+    terminate = lines['T'][0]
+    for i, section in enumerate(SECTIONS[:4]):
+        field = terminate[8 * i:8 * i + 8]
+        if field[0] != section or not field[1:].strip().isdigit() or int(field[1:]) != len(lines[section]):
+            raise IgesError('{0}: the terminate section does not match the {1} lines of section {2}'.format(
+                file, len(lines[section]), section))
+
+    directory = lines['D']
+    if not directory or len(directory) % 2:
+        raise IgesError('{0}: the directory has {1} lines, not pairs of lines'.format(file, len(directory)))
+
+    parameter_delimiter, record_delimiter = _delimiters(''.join(line[:72] for line in lines['G']))
+    parameters = lines['P']
+
+    counts = {}
+    entities = {}
+    for i in range(0, len(directory), 2):
+        try:
+            entity_type = int(directory[i][0:8])
+            pointer = int(directory[i][8:16])
+            matrix = int(directory[i][48:56].strip() or 0)
+            count = int(directory[i + 1][24:32])
+        except ValueError:
+            raise IgesError('{0}: the directory entry of entity {1} cannot be read'.format(file, i + 1))
+
+        if pointer < 1 or pointer + count - 1 > len(parameters) or count < 1:
+            raise IgesError('{0}: entity {1} points to parameter lines {2} to {3} of {4}'.format(
+                file, i + 1, pointer, pointer + count - 1, len(parameters)))
+        if parameters[pointer - 1][64:72].strip() != str(i + 1):
+            raise IgesError('{0}: parameter line {1} does not point back to entity {2}'.format(file, pointer, i + 1))
+
+        counts[entity_type] = counts.get(entity_type, 0) + 1
+        entities[i + 1] = (entity_type, pointer, count, matrix)
+
+    geometric = sum(n for entity_type, n in counts.items() if 100 <= entity_type < 200 or 500 <= entity_type < 600)
+    if not geometric:
+        raise IgesError('{0}: no geometric entities among {1}'.format(file, sorted(counts)))
+
+    def read(entity):
+        entity_type, pointer, count, _ = entities[entity]
+        data = ''.join(line[:64] for line in parameters[pointer - 1:pointer - 1 + count])
+        fields = data.split(record_delimiter)[0].split(parameter_delimiter)
+        return [_real(field) for field in fields[1:] if field.strip()]
+
+    def transform(point, matrix):
+        for _ in range(len(entities)):
+            if not matrix:
+                return point
+            if matrix not in entities or entities[matrix][0] != MATRIX:
+                raise IgesError('{0}: entity {1} is not a transformation matrix'.format(file, matrix))
+            t = read(matrix)
+            point = [t[4 * j] * point[0] + t[4 * j + 1] * point[1] + t[4 * j + 2] * point[2] + t[4 * j + 3]
+                     for j in range(3)]
+            matrix = entities[matrix][3]
+        raise IgesError('{0}: the transformation matrices of the file form a cycle'.format(file))
+
+    low, high = [float('inf')] * 3, [-float('inf')] * 3
+    for entity in sorted(entities):
+        entity_type, _, _, matrix = entities[entity]
+        if entity_type not in (POINT, LINE, ARC, BSPLINE_CURVE, BSPLINE_SURFACE):
+            continue
+
+        try:
+            points = _points(entity_type, read(entity))
+            if any(len(point) != 3 for point in points):
+                raise IndexError(entity)
+        except (ValueError, IndexError):
+            raise IgesError('{0}: the parameters of entity {1} of type {2} cannot be read'.format(
+                file, entity, entity_type))
+
+        for point in points:
+            point = transform(list(point), matrix)
+            low = [min(a, b) for a, b in zip(low, point)]
+            high = [max(a, b) for a, b in zip(high, point)]
+
+    if low[0] > high[0]:
+        low = high = None
+    elif any(value != value or abs(value) == float('inf') for value in low + high):
+        raise IgesError('{0}: the bounding box {1} {2} is not finite'.format(file, low, high))
+
+    return {'entities': len(entities), 'counts': counts, 'low': low, 'high': high}
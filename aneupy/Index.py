@@ -0,0 +1,187 @@
+# =============================================================================
+#
+# Index.py
+#
+# Bounding volume hierarchy of geometric entities for bulk spatial queries
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+# Abaqus 6.14 ships NumPy 1.6, so only functions available there are used
+
+import numpy as np
+
+
+def mask(indices):
+    """ Returns the Abaqus mask string of a set of 0-based entity indices, as '[#5 #1 ]'"""
+
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    if not len(indices):
+        return '[ ]'
+
+    words = np.zeros(indices.max() // 32 + 1, dtype=np.int64)
+    bits = np.unique(indices)
+    for word, bit in zip((bits // 32).tolist(), (bits % 32).tolist()):
+        words[word] |= 1 << bit
+
+    return '[' + ''.join('#{0:x} '.format(word) for word in words.tolist()) + ']'
+
+
+class BoxTree(object):
+    """ Bounding volume hierarchy of axis aligned boxes.
+
+        low and high are the (n, 3) corners of the boxes of the entities,
+        equal for points. The tree is split at the median of the centers
+        along the longest side until leaf boxes or less remain, and stored
+        in flat arrays. The queries walk the tree for all the query points
+        at once, one level at a time.
+
+    """
+
+    def __init__(self, low, high=None, leaf=8):
+        self.low = np.asarray(low, dtype=float).reshape(-1, 3)
+        self.high = self.low if high is None else np.asarray(high, dtype=float).reshape(-1, 3)
+        self.leaf = leaf
+
+        n = len(self.low)
+        self.order = np.arange(n)
+        centers = 0.5 * (self.low + self.high)
+
+        node_low, node_high, start, count, left, right = [], [], [], [], [], []
+        stack = [(0, n, -1, 0)]
+
+        while stack:
+            i0, i1, parent, side = stack.pop()
+            node = len(start)
+            if parent >= 0:
+                (left if side == 0 else right)[parent] = node
+
+            entities = self.order[i0:i1]
+            node_low.append(self.low[entities].min(axis=0) if i1 > i0 else np.zeros(3))
+            node_high.append(self.high[entities].max(axis=0) if i1 > i0 else np.zeros(3))
+            start.append(i0)
+            count.append(i1 - i0)
+            left.append(-1)
+            right.append(-1)
+
+            if i1 - i0 <= leaf:
+                continue
+
+            extent = centers[entities].max(axis=0) - centers[entities].min(axis=0)
+            axis = int(np.argmax(extent))
+            self.order[i0:i1] = entities[np.argsort(centers[entities, axis], kind='mergesort')]
+
+            middle = (i0 + i1) // 2
+            stack.append((middle, i1, node, 1))
+            stack.append((i0, middle, node, 0))
+
+        self.node_low = np.array(node_low).reshape(-1, 3)
+        self.node_high = np.array(node_high).reshape(-1, 3)
+        self.start = np.array(start, dtype=np.int64)
+        self.count = np.array(count, dtype=np.int64)
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.low)
+
+    def query(self, overlap, accept=None, queries=1):
+        """ Returns the pairs of query and entity indices accepted by a test.
+
+            overlap(q, low, high) returns whether the boxes may hold entities
+            of the queries q, and accept the same for the boxes of the
+            entities themselves (overlap if None).
+
+        """
+
+        accept = overlap if accept is None else accept
+
+        q = np.arange(queries)
+        nodes = np.zeros(queries, dtype=np.int64)
+        found_q, found_e = [], []
+
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        while len(q):
+            keep = overlap(q, self.node_low[nodes], self.node_high[nodes])
+            q, nodes = q[keep], nodes[keep]
+
+            leaf = self.left[nodes] < 0
+            if np.any(leaf):
+                count = self.count[nodes[leaf]]
+                segments = np.cumsum(count) - count
+                position = np.arange(count.sum()) - np.repeat(segments, count)
+                entities = self.order[np.repeat(self.start[nodes[leaf]], count) + position]
+                owners = np.repeat(q[leaf], count)
+
+                ok = accept(owners, self.low[entities], self.high[entities])
+                found_q.append(owners[ok])
+                found_e.append(entities[ok])
+
+            inner = ~leaf
+            q = np.concatenate((q[inner], q[inner]))
+            nodes = np.concatenate((self.left[nodes[inner]], self.right[nodes[inner]]))
+
+        if not found_q:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        return np.concatenate(found_q), np.concatenate(found_e)
+
+    def pairs(self, points, radius=0.):
+        """ Returns the pairs of point and entity indices whose boxes are within radius"""
+
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        radius2 = float(radius)**2
+
+        def overlap(q, low, high):
+            p = points[q]
+            d = np.maximum(np.maximum(low - p, p - high), 0.)
+            return (d * d).sum(axis=1) <= radius2
+
+        return self.query(overlap, queries=len(points))
+
+    def within(self, points, radius=0.):
+        """ Returns the sorted indices of the entities whose boxes are within
+            radius of any of the points, exact for points
+        """
+
+        return np.unique(self.pairs(points, radius)[1])
+
+    def in_box(self, low, high):
+        """ Returns the sorted indices of the entities inside the box low-high"""
+
+        low = np.asarray(low, dtype=float).reshape(1, 3)
+        high = np.asarray(high, dtype=float).reshape(1, 3)
+
+        def overlap(q, a, b):
+            return np.all((a <= high) & (b >= low), axis=1)
+
+        def accept(q, a, b):
+            return np.all((a >= low) & (b <= high), axis=1)
+
+        return np.unique(self.query(overlap, accept)[1])
+
+    def on_plane(self, origin, normal, tolerance=1.E-6):
+        """ Returns the sorted indices of the entities within tolerance of a plane"""
+
+        origin = np.asarray(origin, dtype=float).reshape(1, 3)
+        normal = np.asarray(normal, dtype=float).reshape(1, 3)
+        normal = normal / np.sqrt((normal * normal).sum())
+
+        def distances(a, b):
+            center = np.dot(0.5 * (a + b) - origin, normal[0])
+            half = np.dot(0.5 * (b - a), np.abs(normal[0]))
+            return center - half, center + half
+
+        def overlap(q, a, b):
+            near, far = distances(a, b)
+            return (near <= tolerance) & (far >= -tolerance)
+
+        def accept(q, a, b):
+            near, far = distances(a, b)
+            return (near >= -tolerance) & (far <= tolerance)
+
+        return np.unique(self.query(overlap, accept)[1])
@@ -0,0 +1,413 @@
+# =============================================================================
+#
+# Ingest.py
+#
+# Sections fitted to segmented point clouds read in chunks
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import os
+import itertools
+
+import numpy as np
+
+try:
+    from aneupy import Centerline
+except ImportError:
+    import Centerline
+
+# PLY property types and their NumPy types
+PLY_TYPES = {'char': 'i1', 'uchar': 'u1', 'short': 'i2', 'ushort': 'u2', 'int': 'i4', 'uint': 'u4',
+             'float': 'f4', 'double': 'f8', 'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+             'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8'}
+
+# Exponents of u and v of the terms of a conic, a u^2 + b uv + c v^2 + d u + e v + f
+CONIC = ((2, 0), (1, 1), (0, 2), (1, 0), (0, 1), (0, 0))
+
+# Moments u^i v^j accumulated per bin, up to the fourth order needed by CONIC
+MOMENTS = tuple((i, j) for i in range(5) for j in range(5 - i))
+
+# Sub-bins per bin of the first pass along a straight axis
+REFINE = 16
+
+
+def read_csv(file, chunk=1 << 20, columns=(0, 1, 2), label_column=None, label=None, delimiter=','):
+    """ Yields the points (n, 3) of a delimited text file, chunk lines at a time.
+
+        columns are the indices of x, y and z, and delimiter None splits on
+        whitespace. With label_column, only the rows whose value there is
+        label are kept. A first line that is not numeric is a header.
+
+    """
+
+    with open(file) as input_file:
+        first = input_file.readline()
+        try:
+            [float(value) for value in first.split(delimiter) if value.strip()]
+            lines = itertools.chain([first], input_file)
+        except ValueError:
+            lines = input_file
+
+        while True:
+            block = [line.strip() for line in itertools.islice(lines, chunk)]
+            if not block:
+                break
+
+            block = [line for line in block if line]
+            text = (delimiter or ' ').join(block)
+            data = np.array(text.split(delimiter), dtype=float).reshape(len(block), -1)
+
+            if label_column is not None:
+                data = data[data[:, label_column] == label]
+
+            yield data[:, list(columns)]
+
+
+def _ply_header(input_file):
+    """ Returns the format, vertex count and vertex properties of a PLY header"""
+
+    if input_file.readline().strip() != b'ply':
+        raise ValueError('{0} is not a PLY file'.format(input_file.name))
+
+    fmt, count, properties, element = None, 0, [], None
+    for line in iter(input_file.readline, b''):
+        words = line.decode('ascii').split()
+        if not words or words[0] == 'comment':
+            continue
+        if words[0] == 'format':
+            fmt = words[1]
+        elif words[0] == 'element':
+            element = words[1]
+            if element == 'vertex':
+                count = int(words[2])
+        elif words[0] == 'property' and element == 'vertex':
+            if words[1] == 'list':
+                raise ValueError('List properties of vertices are not supported')
+            properties.append((words[2], PLY_TYPES[words[1]]))
+        elif words[0] == 'end_header':
+            return fmt, count, properties
+
+    raise ValueError('{0} has no end_header'.format(input_file.name))
+
+
+def read_ply(file, chunk=1 << 20, label_property=None, label=None):
+    """ Yields the vertices (n, 3) of a PLY file, chunk vertices at a time.
+
+        ASCII and binary files are read. The vertices must be the first
+        element. With label_property, only the vertices whose property is
+        label are kept.
+
+    """
+
+    with open(file, 'rb') as input_file:
+        fmt, count, properties = _ply_header(input_file)
+        names = [name for name, _ in properties]
+
+        if fmt == 'ascii':
+            dtype = None
+        else:
+            order = '<' if fmt == 'binary_little_endian' else '>'
+            dtype = np.dtype([(name, order + kind) for name, kind in properties])
+
+        for i0 in range(0, count, chunk):
+            n = min(chunk, count - i0)
+
+            if dtype is None:
+                text = b' '.join(input_file.readline().strip() for _ in range(n)).decode('ascii')
+                rows = np.array(text.split(), dtype=float).reshape(n, len(names))
+                data = dict((name, rows[:, k]) for k, name in enumerate(names))
+            else:
+                records = np.frombuffer(input_file.read(n * dtype.itemsize), dtype=dtype, count=n)
+                data = dict((name, records[name]) for name in names)
+
+            points = np.column_stack((data['x'], data['y'], data['z'])).astype(float)
+            if label_property is not None:
+                points = points[data[label_property] == label]
+
+            yield points
+
+
+def read(file, **kwargs):
+    """ Yields the points of a .ply or a delimited text file (see read_ply and read_csv)"""
+
+    if os.path.splitext(file)[1].lower() == '.ply':
+        return read_ply(file, **kwargs)
+    return read_csv(file, **kwargs)
+
+
+def conic_matrix(M):
+    """ Returns the scatter matrices (..., 6, 6) of the CONIC terms from the moments M[..., i, j]"""
+
+    S = np.empty(M.shape[:-2] + (6, 6))
+    for a, (i1, j1) in enumerate(CONIC):
+        for b, (i2, j2) in enumerate(CONIC):
+            S[..., a, b] = M[..., i1 + i2, j1 + j2]
+    return S
+
+
+def residuals(S, k):
+    """ Returns the RMS distances of the points to the conics k (..., 6), from their scatter matrices S.
+
+        The distance of each point is approximated by the value of the conic
+        over the norm of its gradient, with both summed over the points.
+
+    """
+
+    f2 = np.einsum('...i,...ij,...j->...', k, S, k)
+
+    # Gradient (2a u + b v + d, b u + 2c v + e) on the terms u, v, 1
+    gx = np.stack((2. * k[..., 0], k[..., 1], k[..., 3]), axis=-1)
+    gy = np.stack((k[..., 1], 2. * k[..., 2], k[..., 4]), axis=-1)
+    L = S[..., 3:, 3:]
+    g2 = np.einsum('...i,...ij,...j->...', gx, L, gx) + np.einsum('...i,...ij,...j->...', gy, L, gy)
+
+    return np.sqrt(np.maximum(f2, 0.) / np.maximum(g2, 1.E-300))
+
+
+def fit_circles(S):
+    """ Fits circles to the points of each scatter matrix S, with the algebraic (Kasa) fit.
+
+        Returns the centers (..., 2), the radii and the conics.
+
+    """
+
+    # Normal equations of u^2 + v^2 + D u + E v + F = 0
+    A = S[..., 3:, 3:]
+    rhs = -(S[..., 3:, 0] + S[..., 3:, 2])
+    D, E, F = np.moveaxis(np.linalg.solve(A, rhs[..., None])[..., 0], -1, 0)
+
+    centers = np.stack((-0.5 * D, -0.5 * E), axis=-1)
+    radii = np.sqrt(np.maximum((centers**2).sum(axis=-1) - F, 0.))
+    ones, zeros = np.ones_like(D), np.zeros_like(D)
+
+    return centers, radii, np.stack((ones, zeros, ones, D, E, F), axis=-1)
+
+
+def fit_ellipses(S):
+    """ Fits ellipses to the points of each scatter matrix S, with the direct least squares
+        fit of Fitzgibbon in the stable form of Halir and Flusser.
+
+        Returns the centers (..., 2), the semi-axes (..., 2), major first,
+        the angles of the major axes and the conics.
+
+    """
+
+    S1, S2, S3 = S[..., :3, :3], S[..., :3, 3:], S[..., 3:, 3:]
+    T = -np.linalg.solve(S3, np.swapaxes(S2, -1, -2))
+    M = S1 + np.matmul(S2, T)
+    M = np.stack((0.5 * M[..., 2, :], -M[..., 1, :], 0.5 * M[..., 0, :]), axis=-2)
+
+    values, vectors = np.linalg.eig(M)
+    vectors = vectors.real
+    condition = 4. * vectors[..., 0, :] * vectors[..., 2, :] - vectors[..., 1, :]**2
+    best = np.argmax(np.where(condition > 0., 1., 0.) - 1.E-3 * np.arange(3), axis=-1)
+
+    a1 = np.take_along_axis(vectors, best[..., None, None], axis=-1)
+    k = np.concatenate((a1, np.matmul(T, a1)), axis=-2)[..., 0]
+    a, b, c, d, e, f = np.moveaxis(k, -1, 0)
+
+    det = 4. * a * c - b * b
+    u0 = (b * e - 2. * c * d) / det
+    v0 = (b * d - 2. * a * e) / det
+    f0 = f + 0.5 * (d * u0 + e * v0)
+
+    Q = np.stack((np.stack((a, 0.5 * b), axis=-1), np.stack((0.5 * b, c), axis=-1)), axis=-2)
+    eigenvalues, eigenvectors = np.linalg.eigh(Q)
+    axes = np.sqrt(np.maximum(-f0[..., None] / eigenvalues, 0.))
+
+    # The major axis has the smaller eigenvalue when -f0 / lambda > 0
+    major = np.argmax(axes, axis=-1)
+    direction = np.take_along_axis(eigenvectors, major[..., None, None], axis=-1)[..., 0]
+    angles = np.arctan2(direction[..., 1], direction[..., 0])
+
+    return np.stack((u0, v0), axis=-1), np.sort(axes, axis=-1)[..., ::-1], angles, k
+
+
+class FittedSections(Centerline.SectionTable):
+    """ SectionTable of sections fitted to a point cloud.
+
+        counts are the points of each section, residuals the RMS distance of
+        its points to the fitted curve and, for ellipses, axes (n, 2) the
+        semi-axes and major the unit vector of the major axis. radii are
+        the radii of the circles, or sqrt(a b) for ellipses, the circle of
+        the same area.
+
+    """
+
+    def __init__(self, names, origins, R, radii, counts, residuals, axes=None, major=None):
+        Centerline.SectionTable.__init__(self, names, origins, R, radii)
+        self.counts = np.asarray(counts)
+        self.residuals = np.asarray(residuals, dtype=float)
+        self.axes = axes
+        self.major = major
+
+
+def _nearest(points, centerline, chunk=65536):
+    """ Returns the index of the nearest centerline point of each point"""
+
+    c2 = (centerline * centerline).sum(axis=1)
+    index = np.empty(len(points), dtype=np.int64)
+    for i0 in range(0, len(points), chunk):
+        p = points[i0:i0 + chunk]
+        index[i0:i0 + chunk] = np.argmin(c2[None] - 2. * np.dot(p, centerline.T), axis=1)
+    return index
+
+
+def _frames(normals, reference):
+    """ Returns the frames (n, 3, 3), rows OX, OY and normal, transporting OX along the sections"""
+
+    R = np.empty((len(normals), 3, 3))
+    OX = reference
+    for i, normal in enumerate(normals):
+        OX = OX - np.dot(OX, normal) * normal
+        if np.linalg.norm(OX) < 1.E-8:
+            OX = np.eye(3)[np.argmin(np.abs(normal))]
+            OX = OX - np.dot(OX, normal) * normal
+        OX = OX / np.linalg.norm(OX)
+        R[i] = (OX, np.cross(normal, OX), normal)
+
+    return R
+
+
+def fit_sections(source, name, bins=32, axis=None, centerline=None, model='circle', min_points=16, **kwargs):
+    """ Fits sections to a point cloud of a vessel, reading it in chunks.
+
+        source is a file (see read, which gets kwargs) or a function that
+        returns an iterator over arrays of points (n, 3). The points are
+        binned along a straight axis, the principal direction of the cloud
+        unless axis is given, in bins slices of equal length, or by their
+        nearest point of centerline (m, 3), one bin per point.
+
+        The file is read three times: for the axis and the extent of the
+        cloud, for the plane of each bin (the plane of least variance of its
+        points) and for the moments of the points in their planes, from
+        which circles or ellipses (model) are fitted by linear least
+        squares. Only the sums of each bin are kept, so memory does not
+        depend on the size of the file. Bins with less than min_points
+        points are dropped.
+
+        Returns a FittedSections table named name_0000, name_0001...
+
+    """
+
+    if callable(source):
+        chunks = source
+    else:
+        chunks = lambda: read(source, **kwargs)
+
+    # Pass 1: the axis of the cloud and the range of the bins
+    if centerline is None:
+        n, s1, s2 = 0, np.zeros(3), np.zeros((3, 3))
+        low, high = np.full(3, np.inf), np.full(3, -np.inf)
+        for points in chunks():
+            n += len(points)
+            s1 += points.sum(axis=0)
+            s2 += np.dot(points.T, points)
+            if len(points):
+                low, high = np.minimum(low, points.min(axis=0)), np.maximum(high, points.max(axis=0))
+
+        if not n:
+            raise ValueError('No points to fit sections to')
+
+        mean = s1 / n
+        if axis is None:
+            axis = np.linalg.eigh(s2 / n - np.outer(mean, mean))[1][:, -1]
+            axis *= np.sign(axis[np.argmax(np.abs(axis))])
+        axis = np.asarray(axis, dtype=float) / np.linalg.norm(axis)
+
+        corners = np.array(list(itertools.product(*zip(low, high))))
+        t = np.dot(corners - mean, axis)
+        edges = np.linspace(t.min(), t.max(), REFINE * bins + 1)
+
+        def fine_binning(points):
+            return np.clip(np.searchsorted(edges, np.dot(points - mean, axis)) - 1, 0, REFINE * bins - 1)
+
+        binning = fine_binning
+
+        nbins = REFINE * bins
+    else:
+        centerline = np.asarray(centerline, dtype=float)
+        tangents = Centerline.tangents(centerline)
+
+        def binning(points):
+            return _nearest(points, centerline)
+
+        nbins = len(centerline)
+
+    # Pass 2: the sums of the points of each bin for their planes
+    count, s1, s2 = np.zeros(nbins), np.zeros((nbins, 3)), np.zeros((nbins, 3, 3))
+    for points in chunks():
+        b = binning(points)
+        count += np.bincount(b, minlength=nbins)
+        for i in range(3):
+            s1[:, i] += np.bincount(b, points[:, i], minlength=nbins)
+            for j in range(i, 3):
+                s2[:, i, j] += np.bincount(b, points[:, i] * points[:, j], minlength=nbins)
+    s2 = s2 + np.triu(s2, 1).swapaxes(1, 2)
+
+    if centerline is None:
+        # Merge the occupied sub-bins into bins of equal length
+        occupied = np.nonzero(count)[0]
+        first, last = occupied[0], occupied[-1] + 1
+        group = np.minimum((np.arange(nbins) - first) * bins // (last - first), bins - 1)
+        group[:first], group[last:] = -1, -1
+
+        count = np.bincount(group[first:last], count[first:last], minlength=bins)
+        s1 = np.array([np.bincount(group[first:last], s1[first:last, i], minlength=bins) for i in range(3)]).T
+        s2 = np.array([[np.bincount(group[first:last], s2[first:last, i, j], minlength=bins) for j in range(3)]
+                       for i in range(3)]).transpose(2, 0, 1)
+
+        def binning(points):
+            return group[fine_binning(points)]
+
+        directions = np.tile(axis, (bins, 1))
+        nbins = bins
+    else:
+        directions = tangents
+
+    keep = count >= max(min_points, 3)
+    centers = s1 / np.maximum(count, 1.)[:, None]
+    covariance = s2 / np.maximum(count, 1.)[:, None, None] - centers[:, :, None] * centers[:, None, :]
+
+    normals = np.linalg.eigh(covariance)[1][:, :, 0]
+    normals *= np.where(np.sum(normals * directions, axis=1) < 0., -1., 1.)[:, None]
+    normals[~keep] = directions[~keep]
+
+    reference = np.eye(3)[np.argmin(np.abs(directions[0]))]
+    R = _frames(normals, reference)
+
+    # Pass 3: the moments of the points of each bin in the plane of the bin
+    M = np.zeros((nbins, 5, 5))
+    for points in chunks():
+        b = binning(points)
+        valid = b >= 0
+        b, points = b[valid], points[valid]
+        local = points - centers[b]
+        u = np.einsum('ij,ij->i', local, R[b, 0])
+        v = np.einsum('ij,ij->i', local, R[b, 1])
+        powers_u = [np.ones_like(u), u, u * u, u * u * u, u * u * u * u]
+        powers_v = [np.ones_like(v), v, v * v, v * v * v, v * v * v * v]
+        for i, j in MOMENTS:
+            M[:, i, j] += np.bincount(b, powers_u[i] * powers_v[j], minlength=nbins)
+
+    index = np.nonzero(keep)[0]
+    S = conic_matrix(M[index])
+    R = R[index]
+
+    if model == 'circle':
+        plane, radii, k = fit_circles(S)
+        axes = major = None
+    elif model == 'ellipse':
+        plane, axes, angles, k = fit_ellipses(S)
+        radii = np.sqrt(axes[:, 0] * axes[:, 1])
+        major = np.cos(angles)[:, None] * R[:, 0] + np.sin(angles)[:, None] * R[:, 1]
+    else:
+        raise ValueError('Unknown section model {0}'.format(model))
+
+    origins = centers[index] + plane[:, :1] * R[:, 0] + plane[:, 1:] * R[:, 1]
+    names = ['{0}_{1:04d}'.format(name, i) for i in range(len(index))]
+
+    return FittedSections(names, origins, R, radii, count[index].astype(np.int64), residuals(S, k), axes, major)
@@ -0,0 +1,291 @@
+# =============================================================================
+#
+# Inp.py
+#
+# Abaqus input decks written directly from NumPy meshes, without Abaqus/CAE
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import numpy as np
+
+# Hyperelastic models and their keyword option
+HYPERELASTIC = {'neo_hooke': 'neo hooke', 'mooney_rivlin': 'mooney-rivlin', 'yeoh': 'yeoh',
+                'arruda_boyce': 'arruda-boyce', 'ogden': 'ogden', 'polynomial': 'polynomial',
+                'reduced_polynomial': 'reduced polynomial', 'van_der_waals': 'van der waals'}
+
+# Labels per data line, the maximum allowed by Abaqus
+LINE = 16
+
+
+def _float(value):
+    return '{0:.9g}'.format(value)
+
+
+def _rows(fh, fmt, data, chunk):
+    """ Writes the rows of data with fmt, formatting chunk rows at a time"""
+
+    for i0 in range(0, len(data), chunk):
+        block = data[i0:i0 + chunk]
+        fh.write((fmt * len(block)) % tuple(block.ravel().tolist()))
+
+
+def _labels(fh, labels, chunk=65536):
+    """ Writes labels, LINE per line"""
+
+    labels = np.asarray(labels, dtype=np.int64).ravel()
+    full = len(labels) // LINE * LINE
+
+    if full:
+        _rows(fh, ', '.join(['%d'] * LINE) + '\n', labels[:full].reshape(-1, LINE), chunk // LINE)
+    if full < len(labels):
+        fh.write(', '.join(str(label) for label in labels[full:].tolist()) + '\n')
+
+
+def _set(fh, keyword, name, labels):
+    """ Writes a node or element set, as a generated range when it is one"""
+
+    labels = np.asarray(labels, dtype=np.int64).ravel()
+
+    if len(labels) > 2 and np.all(np.diff(labels) == 1):
+        fh.write('*{0}, {1}={2}, generate\n{3}, {4}, 1\n'.format(keyword, keyword.lower(), name, labels[0], labels[-1]))
+    else:
+        fh.write('*{0}, {1}={2}\n'.format(keyword, keyword.lower(), name))
+        _labels(fh, labels)
+
+
+class Step(object):
+    """ Analysis step of a Deck.
+
+        procedure is the keyword of the analysis, as 'Static', 'Dynamic' or
+        'CFD', with its options in parameters and its data line in data.
+
+    """
+
+    def __init__(self, name, procedure='Static', parameters=None, data=None, nlgeom=True, increments=None):
+        self.name = name
+        self.procedure = procedure
+        self.parameters = parameters
+        self.data = data
+        self.nlgeom = nlgeom
+        self.increments = increments
+
+        self.boundaries = []
+        self.pressures = []
+        self.cosimulation = None
+        self.field = ['PRESELECT']
+        self.history = ['PRESELECT']
+
+    def add_boundary(self, nset, first, last=None, value=None):
+        """ Fixes the degrees of freedom first to last of nset, or prescribes value"""
+
+        self.boundaries.append((nset, first, first if last is None else last, value))
+
+    def add_pressure(self, surface, magnitude):
+        self.pressures.append((surface, magnitude))
+
+    def add_cosimulation(self, name, controls, export, import_, program='MULTIPHYSICS'):
+        """ Couples the step with another analysis.
+
+            export and import_ map surface names to the exchanged variables,
+            as {'wall': 'U'} and {'wall': 'CF'} in the solid model.
+
+        """
+
+        self.cosimulation = (name, controls, program, export, import_)
+
+    def write(self, fh, controls=()):
+        """ Writes the step. controls are the co-simulation controls of the
+            deck, of which the one of the co-simulation is written in it
+        """
+
+        fh.write('*Step, name={0}, nlgeom={1}{2}\n'.format(
+            self.name, 'YES' if self.nlgeom else 'NO',
+            ', inc={0}'.format(self.increments) if self.increments else ''))
+
+        fh.write('*{0}{1}\n'.format(self.procedure, ', ' + self.parameters if self.parameters else ''))
+        if self.data is not None:
+            fh.write(', '.join(_float(value) for value in self.data) + '\n')
+
+        if self.boundaries:
+            fh.write('*Boundary\n')
+            for nset, first, last, value in self.boundaries:
+                fh.write('{0}, {1}, {2}{3}\n'.format(nset, first, last, '' if value is None else ', ' + _float(value)))
+
+        if self.pressures:
+            fh.write('*Dsload\n')
+            for surface, magnitude in self.pressures:
+                fh.write('{0}, P, {1}\n'.format(surface, _float(magnitude)))
+
+        if self.cosimulation is not None:
+            name, controls_name, program, export, import_ = self.cosimulation
+            fh.write('*Co-simulation, name={0}, program={1}, controls={2}\n'.format(name, program, controls_name))
+            for option, regions in (('export', export), ('import', import_)):
+                for surface in sorted(regions):
+                    fh.write('*Co-simulation Region, type=SURFACE, {0}\n{1}, {2}\n'.format(option, surface,
+                                                                                         regions[surface]))
+            for name, step_size, scheme, modifier, incrementation in controls:
+                if name == controls_name:
+                    fh.write('*Co-simulation Controls, name={0}, coupling scheme={1}, scheme modifier={2}, '
+                             'step size={3}, time incrementation={4}\n'.format(name, scheme, modifier,
+                                                                              _float(step_size), incrementation))
+
+        fh.write('*Output, field, variable={0}\n'.format(', '.join(self.field)))
+        fh.write('*Output, history, variable={0}\n'.format(', '.join(self.history)))
+        fh.write('*End Step\n')
+
+
+class Deck(object):
+    """ Abaqus input deck of a model meshed with NumPy.
+
+        Meshes are added as arrays of node coordinates and element
+        connectivities, with 0-based indices local to each mesh, and get
+        consecutive 1-based labels in the deck. Sets are given with those
+        labels, as returned by add_mesh. Nothing is formatted until write,
+        which streams the arrays in blocks.
+
+        The deck is flat, without parts or assemblies, which Abaqus reads as
+        a single part instance.
+
+    """
+
+    def __init__(self, name, heading=None):
+        self.name = name
+        self.heading = heading or name
+
+        self.meshes = []
+        self.n_nodes = 0
+        self.n_elements = 0
+
+        self.nsets = []
+        self.elsets = []
+        self.surfaces = []
+        self.materials = []
+        self.sections = []
+        self.controls = []
+        self.steps = []
+
+    def add_mesh(self, nodes, elements, element_type, elset=None):
+        """ Adds a mesh and returns the labels of its nodes and elements.
+
+            nodes is (n, 3) and elements (m, k) with node indices of this mesh.
+            The elements are also put in elset if given.
+
+        """
+
+        nodes = np.asarray(nodes, dtype=float).reshape(-1, 3)
+        elements = np.asarray(elements, dtype=np.int64)
+        if elements.shape[1] >= LINE:
+            raise ValueError('Elements of {0} nodes need continuation lines'.format(elements.shape[1]))
+
+        node_labels = np.arange(self.n_nodes + 1, self.n_nodes + len(nodes) + 1)
+        element_labels = np.arange(self.n_elements + 1, self.n_elements + len(elements) + 1)
+
+        self.meshes.append((node_labels, nodes, element_labels, elements + self.n_nodes + 1, element_type, elset))
+        self.n_nodes += len(nodes)
+        self.n_elements += len(elements)
+
+        return node_labels, element_labels
+
+    def add_nset(self, name, labels):
+        self.nsets.append((name, labels))
+
+    def add_elset(self, name, labels):
+        self.elsets.append((name, labels))
+
+    def add_surface(self, name, elements, faces):
+        """ Adds an element based surface.
+
+            elements are element labels and faces the face number (1 to 6) of
+            each one, as in the S1 ... S6 face identifiers.
+
+        """
+
+        self.surfaces.append((name, np.asarray(elements, dtype=np.int64).ravel(),
+                              np.broadcast_to(np.asarray(faces, dtype=np.int64), np.shape(elements)).ravel()))
+
+    def add_material(self, name, density=None, elastic=None, hyperelastic=None, viscosity=None):
+        """ Adds a material.
+
+            elastic is (E, nu). hyperelastic is a pair (model, table), with
+            model a key of HYPERELASTIC and table the rows of coefficients,
+            as ('mooney_rivlin', [(C10, C01, D1)]), or a triple with the
+            order n of polynomial models.
+
+        """
+
+        self.materials.append((name, density, elastic, hyperelastic, viscosity))
+
+    def add_section(self, elset, material, fluid=False):
+        self.sections.append((elset, material, fluid))
+
+    def add_cosimulation_controls(self, name, step_size, coupling_scheme='GAUSS-SEIDEL', scheme_modifier='LAG',
+                                  time_incrementation='SUBCYCLE'):
+        """ Adds co-simulation controls, which are step data in Abaqus and are
+            written in the steps whose co-simulation uses them
+        """
+
+        self.controls.append((name, step_size, coupling_scheme, scheme_modifier, time_incrementation))
+
+    def add_step(self, name, procedure='Static', parameters=None, data=(0.1, 1., 1.E-5, 0.1), **kwargs):
+        step = Step(name, procedure, parameters, data, **kwargs)
+        self.steps.append(step)
+        return step
+
+    def write(self, file, chunk=65536):
+        """ Writes the deck, formatting the arrays chunk rows at a time"""
+
+        with open(file, 'w') as fh:
+            fh.write('*Heading\n{0}\n'.format(self.heading))
+            fh.write('*Preprint, echo=NO, model=NO, history=NO, contact=NO\n')
+
+            fh.write('*Node\n')
+            for node_labels, nodes, _, _, _, _ in self.meshes:
+                _rows(fh, '%d, %.9g, %.9g, %.9g\n', np.column_stack((node_labels, nodes)), chunk)
+
+            for _, _, element_labels, elements, element_type, elset in self.meshes:
+                fh.write('*Element, type={0}{1}\n'.format(element_type, ', elset=' + elset if elset else ''))
+                fmt = ', '.join(['%d'] * (elements.shape[1] + 1)) + '\n'
+                _rows(fh, fmt, np.column_stack((element_labels, elements)), chunk)
+
+            for name, labels in self.nsets:
+                _set(fh, 'Nset', name, labels)
+
+            for name, labels in self.elsets:
+                _set(fh, 'Elset', name, labels)
+
+            for name, elements, faces in self.surfaces:
+                sides = []
+                for face in np.unique(faces).tolist():
+                    side = '_{0}_S{1}'.format(name, face)
+                    _set(fh, 'Elset', side, elements[faces == face])
+                    sides.append((side, face))
+                fh.write('*Surface, type=ELEMENT, name={0}\n'.format(name))
+                for side, face in sides:
+                    fh.write('{0}, S{1}\n'.format(side, face))
+
+            for elset, material, fluid in self.sections:
+                if fluid:
+                    fh.write('*Fluid Section, elset={0}, material={1}, type=INCOMPRESSIBLE\n'.format(elset, material))
+                else:
+                    fh.write('*Solid Section, elset={0}, material={1}\n,\n'.format(elset, material))
+
+            for name, density, elastic, hyperelastic, viscosity in self.materials:
+                fh.write('*Material, name={0}\n'.format(name))
+                if density is not None:
+                    fh.write('*Density\n{0},\n'.format(_float(density)))
+                if viscosity is not None:
+                    fh.write('*Viscosity\n{0},\n'.format(_float(viscosity)))
+                if elastic is not None:
+                    fh.write('*Elastic\n{0}, {1}\n'.format(*[_float(value) for value in elastic]))
+                if hyperelastic is not None:
+                    model, table = hyperelastic[0], hyperelastic[1]
+                    order = ', n={0}'.format(hyperelastic[2]) if len(hyperelastic) > 2 else ''
+                    fh.write('*Hyperelastic, {0}{1}\n'.format(HYPERELASTIC[model], order))
+                    for row in table:
+                        fh.write(', '.join(_float(value) for value in row) + '\n')
+
+            for step in self.steps:
+                step.write(fh, self.controls)
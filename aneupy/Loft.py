@@ -0,0 +1,736 @@
+# =============================================================================
+#
+# Loft.py
+#
+# Pure NumPy kernel to loft circular cross sections without a CAD session
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import math
+
+import numpy as np
+
+
+def rotation_matrix(OX_LCS, OY_LCS):
+    """ Returns the rotation matrix R of a LCS.
+
+        The rows of R are the OX, OY and OZ directions of the LCS in GCS, as
+        in Geometry.Section.R. OY_LCS is orthogonalized against OX_LCS.
+
+    """
+
+    rx = np.asarray(OX_LCS, dtype=float)
+    ry = np.asarray(OY_LCS, dtype=float)
+
+    rx = rx / np.linalg.norm(rx, axis=-1)[..., None]
+    ry = ry - np.sum(ry * rx, axis=-1)[..., None] * rx
+    ry = ry / np.linalg.norm(ry, axis=-1)[..., None]
+    rz = np.cross(rx, ry)
+
+    return np.stack((rx, ry, rz), axis=-2)
+
+
+def axis_rotation(axis, angle):
+    """ Returns the matrix of a rotation of angle (degrees) around a global axis"""
+
+    axis = np.asarray(axis, dtype=float)
+    axis = axis / np.linalg.norm(axis)
+    angle = angle * math.pi / 180.
+
+    K = np.array([[0., -axis[2], axis[1]],
+                  [axis[2], 0., -axis[0]],
+                  [-axis[1], axis[0], 0.]])
+
+    return np.eye(3) + math.sin(angle) * K + (1. - math.cos(angle)) * K.dot(K)
+
+
+def bspline_basis(knots, degree, u, lower=0):
+    """ Evaluates all B-spline basis functions at the parameters u.
+
+        knots has shape (..., m) and u has shape (..., n), with the same
+        leading dimensions. Returns an array of shape (..., n, m - degree - 1)
+        computed with the Cox-de Boor recursion for all parameters at once.
+        With lower, returns the list of the bases of degree - lower to
+        degree on the same knots, the steps of the recursion.
+
+    """
+
+    k = np.asarray(knots, dtype=float)[..., None, :]
+    x = np.asarray(u, dtype=float)[..., :, None]
+
+    N = ((x >= k[..., :-1]) & (x < k[..., 1:])).astype(float)
+
+    # The last parameter belongs to the last non-degenerate span
+    last = (x >= k[..., -1:]) & (k[..., 1:] >= k[..., -1:]) & (k[..., :-1] < k[..., 1:])
+    N = np.where(last, 1., N)
+
+    levels = [N] if degree <= lower else []
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p in range(1, degree + 1):
+            left_den = k[..., p:-1] - k[..., :-p - 1]
+            right_den = k[..., p + 1:] - k[..., 1:-p]
+            left = np.where(left_den > 0., (x - k[..., :-p - 1]) / left_den, 0.)
+            right = np.where(right_den > 0., (k[..., p + 1:] - x) / right_den, 0.)
+            N = left * N[..., :-1] + right * N[..., 1:]
+            if p >= degree - lower:
+                levels.append(N)
+
+    return levels if lower else N
+
+
+def chord_parameters(points):
+    """ Returns chord length parameters in [0, 1] for ordered points (..., n, 3)"""
+
+    points = np.asarray(points, dtype=float)
+    chords = np.linalg.norm(np.diff(points, axis=-2), axis=-1)
+    total = chords.sum(axis=-1)[..., None]
+
+    n = points.shape[-2]
+    uniform = np.broadcast_to(np.linspace(0., 1., n), points.shape[:-1])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        params = np.concatenate((np.zeros(chords.shape[:-1] + (1,)), np.cumsum(chords, axis=-1) / total), axis=-1)
+
+    return np.where(total > 0., params, uniform)
+
+
+def averaged_knots(params, degree):
+    """ Returns the clamped knot vector obtained by averaging the parameters"""
+
+    params = np.asarray(params, dtype=float)
+    n = params.shape[-1]
+    lead = params.shape[:-1]
+
+    interior = [params[..., j:j + degree].mean(axis=-1) for j in range(1, n - degree)]
+    if interior:
+        interior = np.stack(interior, axis=-1)
+    else:
+        interior = np.zeros(lead + (0,))
+
+    return np.concatenate((np.zeros(lead + (degree + 1,)), interior, np.ones(lead + (degree + 1,))), axis=-1)
+
+
+def loft_degree(n, minBSplineDegree, maxBSplineDegree):
+    """ Returns the lowest degree allowed by the options for n sections"""
+
+    return max(1, min(minBSplineDegree, maxBSplineDegree, n - 1))
+
+
+def loft(origins, OX, OY, radii, degree):
+    """ Interpolates circular sections with a B-spline surface.
+
+        Each section is the circle origin + r*cos(t)*OX + r*sin(t)*OY, so the
+        lofted surface is C(u) + cos(t)*A(u) + sin(t)*B(u) where C, A and B are
+        B-spline curves interpolating the origins and the scaled section axes.
+
+        All arguments may have leading batch dimensions. Returns the knot
+        vectors (..., m) and the control net (..., n, 3, 3), whose last but one
+        axis holds the C, A and B control points.
+
+    """
+
+    origins = np.asarray(origins, dtype=float)
+    OX = np.broadcast_to(np.asarray(OX, dtype=float), origins.shape)
+    OY = np.broadcast_to(np.asarray(OY, dtype=float), origins.shape)
+    radii = np.asarray(radii, dtype=float)[..., None]
+
+    n = origins.shape[-2]
+    degree = max(1, min(degree, n - 1))
+
+    params = chord_parameters(origins)
+    knots = averaged_knots(params, degree)
+    N = bspline_basis(knots, degree, params)
+
+    Q = np.stack((origins, radii * OX, radii * OY), axis=-2)
+    net = np.linalg.solve(N, Q.reshape(Q.shape[:-2] + (9,))).reshape(Q.shape)
+
+    return knots, net
+
+
+def fitting_knots(params, degree, size):
+    """ Returns the clamped knot vector of a least-squares fit with size control points.
+
+        The interior knots are spread so that every knot span holds some
+        parameters (Piegl and Tiller, eq. 9.68), which keeps the normal
+        equations well conditioned. With as many control points as
+        parameters it is averaged_knots.
+
+    """
+
+    params = np.asarray(params, dtype=float)
+    n = params.shape[-1]
+    lead = params.shape[:-1]
+
+    if size >= n:
+        return averaged_knots(params, degree)
+
+    d = float(n) / (size - degree)
+    interior = []
+    for j in range(1, size - degree):
+        i = int(j * d)
+        alpha = j * d - i
+        interior.append((1. - alpha) * params[..., i - 1] + alpha * params[..., i])
+
+    if interior:
+        interior = np.stack(interior, axis=-1)
+    else:
+        interior = np.zeros(lead + (0,))
+
+    return np.concatenate((np.zeros(lead + (degree + 1,)), interior, np.ones(lead + (degree + 1,))), axis=-1)
+
+
+def ring_errors(Q, F, nt=32):
+    """ Returns the largest distance between the section circles Q and F (..., n, 3, 3)"""
+
+    theta = np.linspace(0., 2. * math.pi, nt, endpoint=False)
+    D = np.asarray(F) - np.asarray(Q)
+    ring = D[..., 0, None, :] + np.cos(theta)[:, None] * D[..., 1, None, :] + np.sin(theta)[:, None] * D[..., 2, None, :]
+
+    return np.linalg.norm(ring, axis=-1).max(axis=-1)
+
+
+def fit(origins, OX, OY, radii, tolerance, minBSplineDegree=2, maxBSplineDegree=5, samples=3):
+    """ Least-squares loft of circular sections with the smallest control net.
+
+        Control nets are tried from the smallest size, and for each size from
+        the lowest degree allowed by minBSplineDegree and maxBSplineDegree,
+        until the surface passes within tolerance of every section circle and
+        of the interpolating loft (see loft) at samples parameters of each
+        span between sections, so that it cannot swing away between them.
+        The end sections are always matched exactly, so the surface can be
+        closed with their faces.
+
+        The arguments are as in loft and may have leading batch dimensions,
+        in which case the same degree and size are chosen for the whole
+        batch. Returns the knots, the control net, the degree and the error
+        of each section (..., n), the largest of its own and of the spans
+        next to it.
+
+    """
+
+    origins = np.asarray(origins, dtype=float)
+    OX = np.broadcast_to(np.asarray(OX, dtype=float), origins.shape)
+    OY = np.broadcast_to(np.asarray(OY, dtype=float), origins.shape)
+    radii = np.asarray(radii, dtype=float)[..., None]
+
+    n = origins.shape[-2]
+    if n < 2:
+        raise ValueError('A loft needs at least two sections, got {0}'.format(n))
+
+    params = chord_parameters(origins)
+
+    Q = np.stack((origins, radii * OX, radii * OY), axis=-2)
+    Q9 = Q.reshape(Q.shape[:-2] + (9,))
+
+    low = loft_degree(n, minBSplineDegree, maxBSplineDegree)
+    high = max(low, min(maxBSplineDegree, n - 1))
+
+    # Reference circles of the interpolating loft inside the spans
+    fractions = (np.arange(samples) + 1.) / (samples + 1.)
+    spans = params[..., :-1, None] + fractions * np.diff(params, axis=-1)[..., None]
+    spans = spans.reshape(params.shape[:-1] + (-1,))
+    knots, net = loft(origins, OX, OY, radii[..., 0], low)
+    S = np.matmul(bspline_basis(knots, knots.shape[-1] - net.shape[-3] - 1, spans), net.reshape(net.shape[:-2] + (9,))).reshape(spans.shape + (3, 3))
+    u = np.concatenate((params, spans), axis=-1)
+
+    for size in range(low + 1, n + 1):
+        for degree in range(low, min(high, size - 1) + 1):
+            if size == n:
+                knots, net = loft(origins, OX, OY, radii[..., 0], degree)
+                return knots, net, degree, np.zeros(Q.shape[:-2])
+
+            knots = fitting_knots(params, degree, size)
+            N = bspline_basis(knots, degree, u)
+
+            # The end control points are the end sections, the rest are the
+            # least-squares solution for the interior sections
+            M = N[..., :n, :]
+            R = Q9[..., 1:-1, :] - M[..., 1:-1, :1] * Q9[..., :1, :] - M[..., 1:-1, -1:] * Q9[..., -1:, :]
+            interior = np.matmul(np.linalg.pinv(M[..., 1:-1, 1:-1]), R)
+            net = np.concatenate((Q9[..., :1, :], interior, Q9[..., -1:, :]), axis=-2)
+
+            F = np.matmul(N, net).reshape(u.shape + (3, 3))
+            errors = ring_errors(Q, F[..., :n, :, :])
+            between = ring_errors(S, F[..., n:, :, :]).reshape(params.shape[:-1] + (n - 1, samples))
+            between = between.max(axis=-1)
+            errors[..., :-1] = np.maximum(errors[..., :-1], between)
+            errors[..., 1:] = np.maximum(errors[..., 1:], between)
+            if errors.max() <= tolerance:
+                return knots, net.reshape(net.shape[:-1] + (3, 3)), degree, errors
+
+
+def boundary_length(net, nt=64):
+    """ Returns the length of the boundary edges of lofted surfaces, the rings
+        at both ends of their control nets (..., n, 3, 3), which the clamped
+        knots make the ends of the surfaces. The caps of closed surfaces
+        share these edges, so they are counted once either way.
+    """
+
+    theta = np.linspace(0., 2. * math.pi, nt, endpoint=False)[:, None]
+    ends = np.asarray(net, dtype=float)[..., [0, -1], None, :, :]
+
+    # The trapezoidal rule is exact to round-off for the periodic speed
+    speed = np.linalg.norm(np.cos(theta) * ends[..., 2, :] - np.sin(theta) * ends[..., 1, :], axis=-1)
+
+    return 2. * math.pi * speed.mean(axis=-1).sum(axis=-1)
+
+
+def greville(knots, degree):
+    """ Returns the Greville abscissae, the parameters of the control points"""
+
+    knots = np.asarray(knots, dtype=float)
+    size = knots.shape[-1] - degree - 1
+
+    return np.stack([knots[..., i + 1:i + degree + 1].mean(axis=-1) for i in range(size)], axis=-1)
+
+
+def rings(knots, net, degree):
+    """ Returns the circles of a lofted surface at the Greville abscissae.
+
+        A surface of size control points is well defined by the circles
+        through it at the parameters of its control points. Each one is given
+        as origin, OX, OY and radius, the mean length of the A and B axes.
+
+    """
+
+    u = greville(knots, degree)
+    F = np.matmul(bspline_basis(knots, degree, u), net.reshape(net.shape[:-2] + (9,))).reshape(u.shape + (3, 3))
+
+    origins, A, B = F[..., 0, :], F[..., 1, :], F[..., 2, :]
+    a, b = np.linalg.norm(A, axis=-1), np.linalg.norm(B, axis=-1)
+
+    OX = A / a[..., None]
+    OY = B - np.sum(B * OX, axis=-1)[..., None] * OX
+    OY = OY / np.linalg.norm(OY, axis=-1)[..., None]
+
+    return origins, OX, OY, 0.5 * (a + b)
+
+
+def evaluate(knots, net, u, theta):
+    """ Evaluates lofted surfaces on the grid u x theta.
+
+        Returns the points with shape (..., len(u), len(theta), 3).
+
+    """
+
+    knots = np.asarray(knots, dtype=float)
+    net = np.asarray(net, dtype=float)
+    degree = knots.shape[-1] - net.shape[-3] - 1
+
+    u = np.broadcast_to(np.asarray(u, dtype=float), knots.shape[:-1] + (len(u),))
+    N = bspline_basis(knots, degree, u)
+
+    curves = np.einsum('...ij,...jkl->...ikl', N, net)
+    c, a, b = curves[..., 0, :], curves[..., 1, :], curves[..., 2, :]
+
+    cos = np.cos(theta)[:, None]
+    sin = np.sin(theta)[:, None]
+
+    return c[..., :, None, :] + cos * a[..., :, None, :] + sin * b[..., :, None, :]
+
+
+def grid_triangles(nu, nt):
+    """ Returns the triangles of a structured grid periodic in its second index"""
+
+    i, j = np.meshgrid(np.arange(nu - 1), np.arange(nt), indexing='ij')
+    i, j = i.ravel(), j.ravel()
+    jn = (j + 1) % nt
+
+    a = i * nt + j
+    b = (i + 1) * nt + j
+    c = (i + 1) * nt + jn
+    d = i * nt + jn
+
+    return np.concatenate((np.stack((a, b, c), axis=-1), np.stack((a, c, d), axis=-1)))
+
+
+def tessellate(knots, net, nu=48, nt=48, closed=True):
+    """ Triangulates lofted surfaces.
+
+        Returns the vertices (..., nv, 3), the triangles (nf, 3) shared by all
+        the surfaces of a batch and whether each triangulation is inward
+        oriented. Closed surfaces get a fan on each end section.
+
+    """
+
+    u = np.linspace(0., 1., nu)
+    theta = np.linspace(0., 2. * math.pi, nt, endpoint=False)
+
+    points = evaluate(knots, net, u, theta)
+    vertices = points.reshape(points.shape[:-3] + (nu * nt, 3))
+    triangles = grid_triangles(nu, nt)
+
+    if closed:
+        # Section centers are appended after the grid vertices
+        centers = np.stack((points[..., 0, :, :].mean(axis=-2), points[..., -1, :, :].mean(axis=-2)), axis=-2)
+        vertices = np.concatenate((vertices, centers), axis=-2)
+
+        j = np.arange(nt)
+        jn = (j + 1) % nt
+        first = np.stack((np.full(nt, nu * nt), j, jn), axis=-1)
+        last = np.stack((np.full(nt, nu * nt + 1), (nu - 1) * nt + jn, (nu - 1) * nt + j), axis=-1)
+        triangles = np.concatenate((triangles, first, last))
+
+    # Lateral triangles follow the +u x +theta orientation, which depends on
+    # the handedness of the section axes along the loft
+    inward = signed_volume(vertices, triangles) < 0.
+
+    return vertices, triangles, inward
+
+
+def signed_volume(vertices, triangles):
+    """ Returns the signed volume enclosed by triangulated surfaces"""
+
+    p = vertices[..., triangles, :]
+    return (p[..., 0, :] * _cross(p[..., 1, :], p[..., 2, :])).sum(axis=(-2, -1)) / 6.
+
+
+def surface_moments(vertices, triangles, second=True):
+    """ Returns area, first and second moments of triangulated surfaces about the GCS origin"""
+
+    p = vertices[..., triangles, :]
+    dA = 0.5 * np.linalg.norm(_cross(p[..., 1, :] - p[..., 0, :], p[..., 2, :] - p[..., 0, :]), axis=-1)
+    s = p.sum(axis=-2)
+
+    area = dA.sum(axis=-1)
+    first = np.einsum('...f,...fi->...i', dA, s) / 3.
+    if second:
+        second = _second_moment(dA, p, s) / 12.
+    else:
+        second = None
+
+    return area, first, second
+
+
+def volume_moments(vertices, triangles, sign=None, second=True):
+    """ Returns volume, first and second moments of closed triangulated surfaces.
+
+        The surfaces are decomposed in tetrahedra with the GCS origin. sign
+        flips the orientation of the inward oriented surfaces of a batch.
+
+    """
+
+    p = vertices[..., triangles, :]
+    dV = (p[..., 0, :] * _cross(p[..., 1, :], p[..., 2, :])).sum(axis=-1) / 6.
+    if sign is not None:
+        dV = dV * np.asarray(sign, dtype=float)[..., None]
+    s = p.sum(axis=-2)
+
+    volume = dV.sum(axis=-1)
+    first = np.einsum('...f,...fi->...i', dV, s) / 4.
+    if second:
+        second = _second_moment(dV, p, s) / 20.
+    else:
+        second = None
+
+    return volume, first, second
+
+
+def surface_properties(vertices, triangles):
+    """ Returns area, centroid and inertia tensor of triangulated surfaces"""
+
+    area, first, second = surface_moments(vertices, triangles)
+    return area, central_inertia(area, first, second)
+
+
+def volume_properties(vertices, triangles, sign=None):
+    """ Returns volume, centroid and inertia tensor of closed triangulated surfaces"""
+
+    volume, first, second = volume_moments(vertices, triangles, sign)
+    return volume, central_inertia(volume, first, second)
+
+
+def _second_moment(w, p, s):
+    """ Returns sum(w * (p_k p_k^T + s s^T)) over the triangles as matrix products"""
+
+    wp = (w[..., None, None] * p).reshape(p.shape[:-3] + (-1, 3))
+    q = p.reshape(p.shape[:-3] + (-1, 3))
+
+    return np.matmul(np.swapaxes(wp, -1, -2), q) + np.matmul(np.swapaxes(w[..., None] * s, -1, -2), s)
+
+
+def central_inertia(mass, first, second):
+    """ Returns the centroid and the inertia tensor about the centroid"""
+
+    mass = np.asarray(mass, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centroid = np.where(mass[..., None] != 0., first / mass[..., None], 0.)
+
+    C = second - mass[..., None, None] * centroid[..., :, None] * centroid[..., None, :]
+    I = np.trace(C, axis1=-2, axis2=-1)[..., None, None] * np.eye(3) - C
+
+    return centroid, I
+
+
+def batch_properties(origins, radii, OX=(1., 0., 0.), OY=(0., 1., 0.), degree=2, nu=48, nt=48):
+    """ Lofts and measures a batch of shape variants at once.
+
+        origins has shape (variants, sections, 3) and radii (variants, sections).
+        Returns a dictionary of arrays with the lateral area, the enclosed
+        volume and the centroid of each variant. The grid is measured in place,
+        without gathering the triangles, to keep the batch memory bound.
+
+    """
+
+    knots, net = loft(origins, OX, OY, radii, degree)
+
+    u = np.linspace(0., 1., nu)
+    theta = np.linspace(0., 2. * math.pi, nt, endpoint=False)
+    P = evaluate(knots, net, u, theta)
+
+    a, b = P[..., :-1, :, :], P[..., 1:, :, :]
+    c, d = np.roll(b, -1, axis=-2), np.roll(a, -1, axis=-2)
+
+    # Caps as fans around the section centers, oriented as the lateral grid
+    first, last = P[..., 0, :, :], P[..., -1, :, :]
+    c0 = np.broadcast_to(first.mean(axis=-2)[..., None, :], first.shape)
+    c1 = np.broadcast_to(last.mean(axis=-2)[..., None, :], last.shape)
+
+    area = volume = 0.
+    first_moment = 0.
+    for p0, p1, p2, lateral in ((a, b, c, True), (a, c, d, True),
+                                (c0, first, np.roll(first, -1, axis=-2), False),
+                                (c1, np.roll(last, -1, axis=-2), last, False)):
+        axes = (-2, -1) if lateral else (-1,)
+
+        if lateral:
+            n = _cross(p1 - p0, p2 - p0)
+            area = area + 0.5 * np.sqrt((n * n).sum(axis=-1)).sum(axis=axes)
+
+        dV = (p0 * _cross(p1, p2)).sum(axis=-1) / 6.
+        volume = volume + dV.sum(axis=axes)
+        first_moment = first_moment + (dV[..., None] * (p0 + p1 + p2)).sum(axis=tuple(i - 1 for i in axes)) / 4.
+
+    sign = np.where(volume < 0., -1., 1.)
+    volume = sign * volume
+    centroid = sign[..., None] * first_moment / volume[..., None]
+
+    return {'Area': area, 'Volume': volume, 'CDG': centroid}
+
+
+def _cross(x, y):
+    """ Cross product of arrays of vectors, faster than np.cross for large batches"""
+
+    return np.stack((x[..., 1] * y[..., 2] - x[..., 2] * y[..., 1],
+                     x[..., 2] * y[..., 0] - x[..., 0] * y[..., 2],
+                     x[..., 0] * y[..., 1] - x[..., 1] * y[..., 0]), axis=-1)
+
+
+class Kernel(object):
+    """ Minimal geomBuilder replacement used by Domain with the numpy backend.
+
+        It implements the calls made by Domain on shells and solids. IGES
+        export is left to the SALOME backend.
+
+    """
+
+    def MakeSolid(self, shells):
+        return Solid.from_shells([(shell, 1.) for shell in shells])
+
+    def MakeCut(self, main, tool, checkSelfInte=False):
+        return Solid.from_shells(main.shells + [(shell, -sign) for shell, sign in tool.shells])
+
+    def ExportIGES(self, shape, file, theVersion='5.3'):
+        raise RuntimeError("The numpy backend can not export IGES files, use backend='salome' or export_stl")
+
+    def BasicProperties(self, shape):
+        return shape.basic_properties()
+
+    def Inertia(self, shape):
+        I = shape.inertia()
+        principal = np.linalg.eigvalsh(I)
+        return tuple(I.ravel().tolist() + principal.tolist())
+
+    def MakeCDG(self, shape):
+        return shape.centroid()
+
+    def PointCoordinates(self, point):
+        return list(point)
+
+
+class Section(object):
+    """ Defines a circular cross section as arrays.
+
+        Mirrors the interface of Geometry.Section: the circle is defined in the
+        XY plane of the LCS given by origin, OX_LCS and OY_LCS.
+
+    """
+
+    def __init__(self, name, origin, OX_LCS=None, OY_LCS=None, folder=True, context=None):
+        self.name = name
+        self.origin = list(origin)
+        self.radius = None
+        self.geom = self
+
+        if OX_LCS is None:
+            OX_LCS = [1., 0., 0.]
+        if OY_LCS is None:
+            OY_LCS = [0., 1., 0.]
+
+        self.R = rotation_matrix(OX_LCS, OY_LCS)
+
+    @property
+    def OX_LCS(self):
+        return self.R[0].tolist()
+
+    @property
+    def OY_LCS(self):
+        return self.R[1].tolist()
+
+    def rotate(self, axis, angle):
+        """Rotate the section around a global axis through the origin of the LCS"""
+
+        self.R = self.R.dot(axis_rotation(axis, angle).T)
+
+    def rotateX(self, angle):
+        self.rotate([1., 0., 0.], angle)
+
+    def rotateY(self, angle):
+        self.rotate([0., 1., 0.], angle)
+
+    def rotateZ(self, angle):
+        self.rotate([0., 0., 1.], angle)
+
+    def add_circle(self, radius):
+        self.radius = float(radius)
+
+    def materialize(self):
+        pass
+
+    def basic_properties(self):
+        return (2. * math.pi * self.radius, math.pi * self.radius**2, 0.)
+
+    def inertia(self):
+        J = 0.25 * math.pi * self.radius**4
+        return self.R.T.dot(np.diag([J, J, 2. * J])).dot(self.R)
+
+    def centroid(self):
+        return np.array(self.origin, dtype=float)
+
+
+class Shell(object):
+    """ Lofts a list of circular sections with an interpolating B-spline surface.
+
+        The degree is the lowest allowed by minBSplineDegree and the number
+        of sections. nu and nt set the tessellation used to measure the shell.
+
+        With a tolerance, the surface is the least-squares fit of the sections
+        with the smallest control net that meets it (see fit), and
+        fit_errors gives the distance of each section, and of the interpolating
+        loft between sections, to the surface.
+
+    """
+
+    tolerances = {}
+
+    def __init__(self, name, sections, folder=False, closed=True, minBSplineDegree=2, maxBSplineDegree=5,
+                 approximation=True, nu=48, nt=48, geom=None, context=None, tolerance=None):
+        self.name, self.sections = name, sections
+        self.closed = closed
+        self.minBSplineDegree, self.maxBSplineDegree = minBSplineDegree, maxBSplineDegree
+        self.tolerance = tolerance
+        self.nu, self.nt = nu, nt
+        self.geom = self
+
+        self._mesh = None
+        self.fit_errors = None
+
+        if geom is not None:
+            self.degree, self.knots, self.net = geom.degree, geom.knots, geom.net
+            self.fit_errors = getattr(geom, 'fit_errors', None)
+            return
+
+        origins = [section.origin for section in self.sections]
+        OX = [section.R[0] for section in self.sections]
+        OY = [section.R[1] for section in self.sections]
+        radii = [section.radius for section in self.sections]
+
+        if tolerance is not None:
+            self.knots, self.net, self.degree, errors = fit(origins, OX, OY, radii, tolerance,
+                                                            minBSplineDegree, maxBSplineDegree)
+            self.fit_errors = dict(zip([section.name for section in self.sections], errors.tolist()))
+            return
+
+        self.degree = loft_degree(len(self.sections), minBSplineDegree, maxBSplineDegree)
+        self.knots, self.net = loft(origins, OX, OY, radii, self.degree)
+
+    def evaluate(self, u, theta):
+        return evaluate(self.knots, self.net, u, theta)
+
+    def tessellate(self):
+        if self._mesh is None:
+            vertices, triangles, inward = tessellate(self.knots, self.net, self.nu, self.nt, self.closed)
+            if inward:
+                triangles = triangles[:, ::-1]
+            self._mesh = (vertices, triangles)
+
+        return self._mesh
+
+    def basic_properties(self):
+        vertices, triangles = self.tessellate()
+        area, _ = surface_properties(vertices, triangles)
+
+        return (float(boundary_length(self.net)), float(area), 0.)
+
+    def inertia(self):
+        vertices, triangles = self.tessellate()
+        _, (_, I) = surface_properties(vertices, triangles)
+        return I
+
+    def centroid(self):
+        vertices, triangles = self.tessellate()
+        _, (centroid, _) = surface_properties(vertices, triangles)
+        return centroid
+
+
+class Solid(object):
+    """ Solid bounded by closed shells.
+
+        shells is a list of (shell, sign) pairs: the solid is the union of the
+        volumes enclosed by the shells with sign 1 minus those with sign -1, so
+        a cut is exact as long as the tool shells lie inside the main ones.
+
+    """
+
+    def __init__(self, name, solid, folder=False, context=None):
+        self.name = name
+        self.geom = solid
+
+    @classmethod
+    def from_shells(cls, shells):
+        solid = cls(None, None)
+        solid.geom = solid
+        solid.shells = list(shells)
+        return solid
+
+    def _properties(self):
+        volume, first, second = 0., np.zeros(3), np.zeros((3, 3))
+
+        for shell, sign in self.shells:
+            vertices, triangles = shell.tessellate()
+            v, f, s = volume_moments(vertices, triangles)
+
+            volume += sign * v
+            first += sign * f
+            second += sign * s
+
+        return volume, central_inertia(volume, first, second)
+
+    def basic_properties(self):
+        length = area = 0.
+        for shell, sign in self.shells:
+            l, a, _ = shell.basic_properties()
+            length += l
+            area += a
+
+        return (length, area, float(self._properties()[0]))
+
+    def inertia(self):
+        return self._properties()[1][1]
+
+    def centroid(self):
+        return self._properties()[1][0]
@@ -0,0 +1,338 @@
+# =============================================================================
+#
+# Materials.py
+#
+# Batch fitting of hyperelastic constants and library of named materials
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+# Runs in the Python of Abaqus, whose NumPy 1.6 has no stacked linear algebra:
+# the normal equations of the fits are solved in closed form.
+
+import os
+import json
+import copy
+
+import numpy as np
+
+try:
+    from aneupy import Cache
+except ImportError:
+    import Cache
+
+# Coefficients of the series of the Arruda-Boyce strain energy in Abaqus
+ARRUDA_BOYCE = (1. / 2., 1. / 20., 11. / 1050., 19. / 7000., 519. / 673750.)
+
+# Fitted constants of each model, in the order of the Abaqus table (which
+# ends with the compressibility D, 0 for incompressible materials)
+PARAMETERS = {'neo_hooke': ('C10', ), 'mooney_rivlin': ('C10', 'C01'), 'arruda_boyce': ('mu', 'lambda_m')}
+
+# Abaqus hyperelastic type of each model
+TYPES = {'neo_hooke': 'NEO_HOOKE', 'mooney_rivlin': 'MOONEY_RIVLIN', 'arruda_boyce': 'ARRUDA_BOYCE'}
+
+# Materials of every library, with density (kg/m3) and viscosity (Pa s)
+DEFAULTS = {'water': {'density': 1000., 'viscosity': 1.E-3},
+            'blood': {'density': 1060., 'viscosity': 3.5E-3}}
+
+
+def pad(curves):
+    """ Returns the stretches and stresses (specimens, points) of a list of
+        curves (stretch, stress) of different lengths, padded with NaN
+    """
+
+    n = max(len(stretch) for stretch, _ in curves)
+    stretch = np.empty((len(curves), n))
+    stress = np.empty((len(curves), n))
+    stretch.fill(np.nan)
+    stress.fill(np.nan)
+
+    for i, (x, y) in enumerate(curves):
+        stretch[i, :len(x)] = x
+        stress[i, :len(y)] = y
+
+    return stretch, stress
+
+
+def read_csv(file, columns=(0, 1, 2), strain=False, delimiter=','):
+    """ Reads uniaxial tests from a delimited text file.
+
+        columns are the indices of the specimen name, the stretch (or the
+        engineering strain, with strain) and the nominal stress. Lines that
+        are not numeric, as a header, are skipped. Returns the names of the
+        specimens, in order of appearance, and their padded stretches and
+        stresses (see pad).
+
+    """
+
+    curves = {}
+    names = []
+
+    with open(file) as input_file:
+        for line in input_file:
+            values = line.strip().split(delimiter)
+            if len(values) <= max(columns):
+                continue
+            try:
+                x, y = float(values[columns[1]]), float(values[columns[2]])
+            except ValueError:
+                continue
+
+            name = values[columns[0]].strip()
+            if name not in curves:
+                curves[name] = ([], [])
+                names.append(name)
+            curves[name][0].append(1. + x if strain else x)
+            curves[name][1].append(y)
+
+    stretch, stress = pad([curves[name] for name in names])
+
+    return names, stretch, stress
+
+
+def _arruda_boyce_slope(I1, lambda_m):
+    """ dW/dI1 of the Arruda-Boyce energy per unit mu"""
+
+    total = 0.
+    for i, c in enumerate(ARRUDA_BOYCE):
+        total = total + (i + 1) * c * I1**i / lambda_m**(2 * i)
+
+    return total
+
+
+def _basis(model, stretch, lambda_m=None):
+    """ Returns the functions of the stretch whose combination with the linear
+        constants of model is the uniaxial nominal stress of an incompressible
+        material
+    """
+
+    g = 2. * (stretch - stretch**-2)
+
+    if model == 'neo_hooke':
+        return [g]
+
+    if model == 'mooney_rivlin':
+        return [g, g / stretch]
+
+    if model == 'arruda_boyce':
+        I1 = stretch**2 + 2. / stretch
+        return [g * _arruda_boyce_slope(I1, lambda_m[..., None])]
+
+    raise ValueError('Unknown model {0}, not in {1}'.format(model, sorted(PARAMETERS)))
+
+
+def _solve(basis, stress, valid):
+    """ Least squares of the linear constants of each specimen, in closed form.
+
+        Returns the constants (k, specimens) and the sum of squared residuals.
+
+    """
+
+    G = [np.where(valid, g, 0.) for g in basis]
+    P = np.where(valid, stress, 0.)
+
+    if len(G) == 1:
+        a = (G[0] * G[0]).sum(axis=-1)
+        b = (G[0] * P).sum(axis=-1)
+        constants = [b / np.where(a > 0., a, 1.)]
+    else:
+        a11, a12, a22 = (G[0] * G[0]).sum(axis=-1), (G[0] * G[1]).sum(axis=-1), (G[1] * G[1]).sum(axis=-1)
+        b1, b2 = (G[0] * P).sum(axis=-1), (G[1] * P).sum(axis=-1)
+        det = a11 * a22 - a12 * a12
+        det = np.where(det != 0., det, 1.)
+        constants = [(a22 * b1 - a12 * b2) / det, (a11 * b2 - a12 * b1) / det]
+
+    residual = P - sum(c[..., None] * g for c, g in zip(constants, G))
+
+    return constants, (residual * residual).sum(axis=-1)
+
+
+def uniaxial(model, stretch, parameters):
+    """ Uniaxial nominal stress of an incompressible material at stretch.
+
+        parameters (specimens, k) are the constants of PARAMETERS[model] and
+        stretch (specimens, points).
+
+    """
+
+    parameters = np.asarray(parameters, dtype=float)
+    stretch = np.asarray(stretch, dtype=float)
+
+    if model == 'arruda_boyce':
+        basis = _basis(model, stretch, parameters[..., 1])
+        return parameters[..., 0][..., None] * basis[0]
+
+    basis = _basis(model, stretch)
+    return sum(parameters[..., i][..., None] * g for i, g in enumerate(basis))
+
+
+def fit(stretch, stress, model='arruda_boyce', lambda_m=(1.01, 100.), grid=64, iterations=40):
+    """ Fits the hyperelastic constants of a batch of uniaxial tests at once.
+
+        stretch and stress (specimens, points) are the stretches and the
+        nominal stresses of incompressible specimens, padded with NaN (see
+        pad). The Neo-Hookean and Mooney-Rivlin constants are linear least
+        squares. The Arruda-Boyce mu is linear for a given locking stretch
+        lambda_m, which is searched in the interval lambda_m, first on grid
+        values (log spaced) and then by golden section around the best of
+        them, for all the specimens together.
+
+        Returns a dictionary with the model, the constants (specimens, k) of
+        PARAMETERS[model] as parameters, the RMS of the residuals, the
+        coefficient of determination r2, and stable, whether the initial
+        shear modulus is positive.
+
+    """
+
+    stretch = np.asarray(stretch, dtype=float)
+    stress = np.asarray(stress, dtype=float)
+    if stretch.ndim == 1:
+        stretch, stress = stretch[None, :], stress[None, :]
+
+    valid = ~(np.isnan(stretch) | np.isnan(stress))
+    stretch = np.where(valid, stretch, 1.)
+    count = np.maximum(valid.sum(axis=-1), 1)
+
+    if model == 'arruda_boyce':
+        def sse(values):
+            return _solve(_basis(model, stretch, values), stress, valid)[1]
+
+        candidates = np.exp(np.linspace(np.log(lambda_m[0]), np.log(lambda_m[1]), grid))
+        errors = np.array([sse(np.zeros(len(stretch)) + value) for value in candidates])
+        best = errors.argmin(axis=0)
+
+        # Golden section in the bracket of the best grid value
+        low = candidates[np.maximum(best - 1, 0)]
+        high = candidates[np.minimum(best + 1, grid - 1)]
+        ratio = 0.5 * (np.sqrt(5.) - 1.)
+        x1, x2 = high - ratio * (high - low), low + ratio * (high - low)
+        f1, f2 = sse(x1), sse(x2)
+        for _ in range(iterations):
+            left = f1 < f2
+            low, high = np.where(left, low, x1), np.where(left, x2, high)
+            x1, x2 = (np.where(left, high - ratio * (high - low), x2),
+                      np.where(left, x1, low + ratio * (high - low)))
+            fresh = sse(np.where(left, x1, x2))
+            f1, f2 = np.where(left, fresh, f2), np.where(left, f1, fresh)
+
+        locking = 0.5 * (low + high)
+        (mu, ), error = _solve(_basis(model, stretch, locking), stress, valid)
+        parameters = np.array([mu, locking]).T
+        shear = mu
+    else:
+        constants, error = _solve(_basis(model, stretch), stress, valid)
+        parameters = np.array(constants).T
+        shear = 2. * parameters.sum(axis=-1)
+
+    P = np.where(valid, stress, 0.)
+    mean = P.sum(axis=-1) / count
+    total = (np.where(valid, stress - mean[:, None], 0.)**2).sum(axis=-1)
+
+    return {'model': model, 'parameters': parameters, 'rms': np.sqrt(error / count),
+            'r2': 1. - error / np.where(total > 0., total, 1.), 'stable': shear > 0.}
+
+
+def deck(material):
+    """ Returns the arguments of Inp.Deck.add_material of a material of a Library"""
+
+    arguments = {'density': material.get('density'), 'viscosity': material.get('viscosity'),
+                 'elastic': material.get('elastic'), 'hyperelastic': None}
+
+    if 'hyperelastic' in material:
+        hyperelastic = material['hyperelastic']
+        arguments['hyperelastic'] = (hyperelastic['model'], [tuple(hyperelastic['parameters']) + (hyperelastic['D'], )])
+
+    return arguments
+
+
+class Library(object):
+    """ Named materials, kept in a JSON file.
+
+        Each material is a dictionary with some of density, viscosity,
+        elastic [E, nu] and hyperelastic {'model', 'parameters', 'D'}. The
+        DEFAULTS are always there. add_fit adds the fitted materials of a
+        batch of specimens, and key gives the hash of a material, so that
+        Abaqus.Database creates each material once and copies it to the
+        other models.
+
+    """
+
+    def __init__(self, file=None):
+        self.file = file
+        self.materials = copy.deepcopy(DEFAULTS)
+
+        if file is not None and os.path.isfile(file):
+            with open(file) as input_file:
+                self.materials.update(json.load(input_file))
+
+    def __contains__(self, name):
+        return name in self.materials
+
+    def __getitem__(self, name):
+        try:
+            return self.materials[name]
+        except KeyError:
+            raise KeyError('No material {0} in the library {1}'.format(name, self.file))
+
+    def names(self):
+        return sorted(self.materials)
+
+    def add(self, name, density=None, viscosity=None, E=None, nu=None, hyperelastic=None):
+        """ Adds or replaces a material. hyperelastic is a dictionary {'model', 'parameters', 'D'}"""
+
+        material = {}
+        if density is not None:
+            material['density'] = float(density)
+        if viscosity is not None:
+            material['viscosity'] = float(viscosity)
+        if E is not None:
+            material['elastic'] = [float(E), float(nu if nu is not None else 0.)]
+        if hyperelastic is not None:
+            if hyperelastic['model'] not in PARAMETERS:
+                raise ValueError('Unknown model {0}, not in {1}'.format(hyperelastic['model'], sorted(PARAMETERS)))
+            material['hyperelastic'] = {'model': hyperelastic['model'],
+                                        'parameters': [float(value) for value in hyperelastic['parameters']],
+                                        'D': float(hyperelastic.get('D', 0.))}
+
+        self.materials[name] = material
+        return material
+
+    def add_fit(self, names, fitted, density=None, D=0., stable=True):
+        """ Adds the materials of a fit, one per specimen name.
+
+            With stable, specimens whose fit is not stable are left out.
+            Returns the names added.
+
+        """
+
+        added = []
+        for name, parameters, ok in zip(names, fitted['parameters'], fitted['stable']):
+            if stable and not ok:
+                continue
+            self.add(name, density=density,
+                     hyperelastic={'model': fitted['model'], 'parameters': parameters.tolist(), 'D': D})
+            added.append(name)
+
+        return added
+
+    def get(self, name, **kwargs):
+        """ Returns a copy of a material with the properties of kwargs (as for add) replaced"""
+
+        if not kwargs:
+            return copy.deepcopy(self[name])
+
+        material = copy.deepcopy(self.materials.get(name, {}))
+        material.update(Library().add(name, **kwargs))
+
+        return material
+
+    @staticmethod
+    def key(material):
+        return Cache.hash_key('material', material)
+
+    def save(self, file=None):
+        file = file or self.file
+        with open(file, 'w') as output_file:
+            json.dump(self.materials, output_file, indent=2, sort_keys=True)
@@ -0,0 +1,226 @@
+# =============================================================================
+#
+# Mesh.py
+#
+# Structured hexahedral meshes of the lumen and the wall of lofted vessels
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import math
+
+import numpy as np
+
+try:
+    from aneupy import Loft, Properties
+except ImportError:
+    import Loft
+    import Properties
+
+# Corners of the hexahedron and the three edges leaving each one, in a right
+# handed order, for the scaled Jacobian
+CORNERS = np.array([[0, 1, 3, 4], [1, 2, 0, 5], [2, 3, 1, 6], [3, 0, 2, 7],
+                    [4, 7, 5, 0], [5, 4, 6, 1], [6, 5, 7, 2], [7, 6, 4, 3]])
+
+# Face numbers (S1 ... S6 of Abaqus) of the sides of the swept hexahedra
+BOTTOM, TOP, INSIDE, OUTSIDE = 1, 2, 6, 4
+
+
+def quality(nodes, elements):
+    """ Returns the scaled Jacobian and the edge aspect ratio of hexahedra.
+
+        The scaled Jacobian is the minimum over the corners of the
+        determinant of the unit edge vectors, 1 for a cube and negative for
+        inverted elements. The aspect ratio is the longest over the shortest
+        edge.
+
+    """
+
+    p = nodes[elements]
+    e = p[:, CORNERS[:, 1:]] - p[:, CORNERS[:, :1]]
+    length = np.linalg.norm(e, axis=-1)
+    u = e / np.maximum(length, 1.E-300)[..., None]
+
+    jacobian = np.einsum('...i,...i->...', u[..., 0, :], np.cross(u[..., 1, :], u[..., 2, :])).min(axis=-1)
+    aspect = length.reshape(len(elements), -1).max(axis=-1) / np.maximum(length.reshape(len(elements), -1).min(axis=-1),
+                                                                        1.E-300)
+
+    return jacobian, aspect
+
+
+class Mesh(object):
+    """ Hexahedral mesh with named node sets and element based surfaces.
+
+        nodes is (n, 3) and elements (m, 8) with 0-based node indices in the
+        C3D8 order. nsets maps names to node indices, and surfaces to pairs
+        of element indices and face numbers. jacobian and aspect hold the
+        quality of each element (see quality).
+
+    """
+
+    def __init__(self, nodes, elements, nsets=None, surfaces=None):
+        self.nodes = nodes
+        self.elements = elements
+        self.nsets = nsets or {}
+        self.surfaces = surfaces or {}
+
+        self.jacobian, self.aspect = quality(nodes, elements)
+
+    def summary(self):
+        return {'nodes': len(self.nodes), 'elements': len(self.elements),
+                'min_jacobian': float(self.jacobian.min()), 'mean_jacobian': float(self.jacobian.mean()),
+                'max_aspect': float(self.aspect.max()), 'inverted': int(np.sum(self.jacobian <= 0.))}
+
+    def to_deck(self, deck, element_type='C3D8R', elset=None, prefix=''):
+        """ Adds the mesh, its sets and its surfaces to an Inp.Deck"""
+
+        node_labels, element_labels = deck.add_mesh(self.nodes, self.elements, element_type, elset)
+
+        for name, indices in sorted(self.nsets.items()):
+            deck.add_nset(prefix + name, node_labels[indices])
+        for name, (indices, face) in sorted(self.surfaces.items()):
+            deck.add_surface(prefix + name, element_labels[indices], face)
+
+        return node_labels, element_labels
+
+
+def _sweep(quads, rings, nodes_per_ring):
+    """ Stacks the quads of a cross section (q, 4) into hexahedra between rings"""
+
+    offset = np.arange(rings - 1)[:, None, None] * nodes_per_ring
+    bottom = quads[None] + offset
+
+    return np.concatenate((bottom, bottom + nodes_per_ring), axis=-1).reshape(-1, 8)
+
+
+def ogrid(nt, nr, core=0.5):
+    """ Returns the O-grid of the unit disk.
+
+        The disk is split in a square of half side core / sqrt(2) with
+        (nt / 4)**2 cells and nr layers of nt cells between the square and
+        the circle. Returns the points (p, 2), the quads (q, 4) counter
+        clockwise, the indices of the nt boundary points, at the angles
+        -pi/4 + 2*pi*k/nt, and the indices of the quads next to the circle.
+
+    """
+
+    if nt % 4:
+        raise ValueError('The O-grid needs a multiple of 4 points around, not {0}'.format(nt))
+
+    m = nt // 4
+    a = core / math.sqrt(2.)
+
+    # Square block
+    x = np.linspace(-a, a, m + 1)
+    X, Y = np.meshgrid(x, x, indexing='ij')
+    square = np.stack((X, Y), axis=-1).reshape(-1, 2)
+    grid = np.arange((m + 1)**2).reshape(m + 1, m + 1)
+
+    # Perimeter of the square, counter clockwise from the corner (a, -a)
+    perimeter = np.concatenate((grid[-1, :-1], grid[::-1, -1][:-1], grid[0, ::-1][:-1], grid[:, 0][:-1]))
+
+    theta = -0.25 * math.pi + 2. * math.pi * np.arange(nt) / nt
+    circle = np.stack((np.cos(theta), np.sin(theta)), axis=-1)
+
+    # Layers between the square and the circle
+    s = np.linspace(0., 1., nr + 1)[1:, None, None]
+    layers = (1. - s) * square[perimeter][None] + s * circle[None]
+
+    points = np.concatenate((square, layers.reshape(-1, 2)))
+    rings = np.concatenate((perimeter[None], len(square) + np.arange(nr * nt).reshape(nr, nt)))
+
+    i, j = np.meshgrid(np.arange(m), np.arange(m), indexing='ij')
+    square_quads = np.stack((grid[i, j], grid[i + 1, j], grid[i + 1, j + 1], grid[i, j + 1]), axis=-1).reshape(-1, 4)
+
+    l, k = np.meshgrid(np.arange(nr), np.arange(nt), indexing='ij')
+    kn = (k + 1) % nt
+    ring_quads = np.stack((rings[l, k], rings[l + 1, k], rings[l + 1, kn], rings[l, kn]), axis=-1).reshape(-1, 4)
+
+    quads = np.concatenate((square_quads, ring_quads))
+    outer = len(square_quads) + np.arange((nr - 1) * nt, nr * nt)
+
+    return points, quads, rings[-1], outer
+
+
+def vessel(inner, outer=None, nu=33, nt=32, nr=4, nw=2, core=0.5):
+    """ Meshes the lumen of a shell and, optionally, the wall around it.
+
+        inner and outer are shells of any backend, lofted with the Loft
+        module and evaluated at nu rings along them and nt points around.
+        The lumen gets an O-grid (see ogrid) with nr layers, mapped to each
+        ring, and the wall nw layers of hexahedra between the two shells.
+
+        Both meshes use the same array of points on the inner shell, so
+        their interface nodes are identical. Returns the lumen and wall
+        meshes (None without outer). Their sets are inlet and outlet, and
+        their surfaces inlet, outlet and wall for the lumen and inlet,
+        outlet, inner and outer for the wall.
+
+    """
+
+    shells = [inner] if outer is None else [inner, outer]
+    lofts = Properties.loft_shells(shells)
+
+    points, quads, boundary, next_to_wall = ogrid(nt, nr, core)
+    theta = -0.25 * math.pi + 2. * math.pi * np.arange(nt) / nt
+    u = np.linspace(0., 1., nu)
+
+    # Center and axes of each ring: x, y of the disk map to C + x A + y B
+    knots, net = lofts[0]
+    frames = np.matmul(Loft.bspline_basis(knots, len(knots) - net.shape[0] - 1, u),
+                       net.reshape(net.shape[0], 9)).reshape(nu, 3, 3)
+    C, A, B = frames[:, 0], frames[:, 1], frames[:, 2]
+
+    surface = Loft.evaluate(knots, net, u, theta)
+
+    nodes = C[:, None] + points[None, :, :1] * A[:, None] + points[None, :, 1:] * B[:, None]
+    nodes[:, boundary] = surface
+    n = len(points)
+
+    elements = _sweep(quads, nu, n)
+
+    # Orientation of the sweep, hexahedra must have positive volume
+    if np.dot(np.cross(A[0], B[0]), C[-1] - C[0]) < 0.:
+        elements = elements[:, [4, 5, 6, 7, 0, 1, 2, 3]]
+        bottom, top = TOP, BOTTOM
+    else:
+        bottom, top = BOTTOM, TOP
+
+    cells = len(quads)
+    lumen = Mesh(nodes.reshape(-1, 3), elements,
+                 nsets={'inlet': np.arange(n), 'outlet': np.arange((nu - 1) * n, nu * n)},
+                 surfaces={'inlet': (np.arange(cells), bottom),
+                           'outlet': (np.arange((nu - 2) * cells, (nu - 1) * cells), top),
+                           'wall': ((np.arange(nu - 1)[:, None] * cells + next_to_wall).ravel(), OUTSIDE)})
+
+    if outer is None:
+        return lumen, None
+
+    knots, net = lofts[1]
+    t = np.linspace(0., 1., nw + 1)[None, :, None, None]
+    layers = (1. - t) * surface[:, None] + t * Loft.evaluate(knots, net, u, theta)[:, None]
+    layers[:, 0] = surface
+
+    index = np.arange((nw + 1) * nt).reshape(nw + 1, nt)
+    w, k = np.meshgrid(np.arange(nw), np.arange(nt), indexing='ij')
+    kn = (k + 1) % nt
+    wall_quads = np.stack((index[w, k], index[w + 1, k], index[w + 1, kn], index[w, kn]), axis=-1).reshape(-1, 4)
+
+    elements = _sweep(wall_quads, nu, (nw + 1) * nt)
+    if bottom == TOP:
+        elements = elements[:, [4, 5, 6, 7, 0, 1, 2, 3]]
+
+    m = (nw + 1) * nt
+    cells = len(wall_quads)
+    rows = np.arange(nu - 1)[:, None] * cells
+    wall = Mesh(layers.reshape(-1, 3), elements,
+                nsets={'inlet': np.arange(m), 'outlet': np.arange((nu - 1) * m, nu * m),
+                       'inner': (np.arange(nu)[:, None] * m + index[0]).ravel()},
+                surfaces={'inlet': (np.arange(cells), bottom),
+                          'outlet': (np.arange((nu - 2) * cells, (nu - 1) * cells), top),
+                          'inner': ((rows + np.arange(nt)).ravel(), INSIDE),
+                          'outer': ((rows + np.arange((nw - 1) * nt, nw * nt)).ravel(), OUTSIDE)})
+
+    return lumen, wall
@@ -0,0 +1,480 @@
+# =============================================================================
+#
+# Pipeline.py
+#
+# Python module to run the CAD, CAE and job stages of variants with checkpoints
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import os
+import json
+import time
+import signal
+import hashlib
+import tempfile
+import traceback
+import subprocess
+import multiprocessing
+
+try:
+    from aneupy import Cache
+except ImportError:
+    import Cache
+
+
+def digest(path, chunk=1 << 20):
+    """ Returns the SHA-256 of the content of a file"""
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(chunk), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def _update(sha, value, seen=None):
+    """ Adds a value of the code of a function to a hash: nested code
+        objects and functions by their content, the rest by their repr
+    """
+
+    seen = set() if seen is None else seen
+
+    if hasattr(value, 'co_code'):
+        sha.update(value.co_code)
+        sha.update(repr(value.co_names).encode('utf-8'))
+        for item in value.co_consts:
+            _update(sha, item, seen)
+    elif hasattr(value, '__code__'):
+        # Functions of defaults or closures, once each for recursive ones
+        if id(value) not in seen:
+            seen.add(id(value))
+            _update(sha, value.__code__, seen)
+            _update(sha, getattr(value, '__defaults__', None), seen)
+            _update(sha, getattr(value, '__kwdefaults__', None), seen)
+            _update(sha, [cell.cell_contents for cell in getattr(value, '__closure__', None) or ()], seen)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _update(sha, item, seen)
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            _update(sha, key, seen)
+            _update(sha, value[key], seen)
+    else:
+        sha.update(repr(value).encode('utf-8'))
+
+
+def signature(function):
+    """ Returns what identifies the code of a stage: its command, or the name
+        of its function and a hash of its bytecode, constants, global names,
+        default arguments and closure values
+    """
+
+    if isinstance(function, (list, tuple)):
+        return list(function)
+
+    sha = None
+    if hasattr(function, '__code__'):
+        sha = hashlib.sha256()
+        _update(sha, function)
+        sha = sha.hexdigest()
+
+    return [getattr(function, '__module__', None), getattr(function, '__name__', repr(function)), sha]
+
+
+def _worker(conn, function, directory, params):
+    """ Runs the function of a stage in the directory of its pipeline"""
+
+    try:
+        os.chdir(directory)
+        function(**params)
+        conn.send({'status': 'done', 'error': None})
+
+    except BaseException:
+        conn.send({'status': 'failed', 'error': traceback.format_exc()})
+
+    finally:
+        conn.close()
+
+
+class Stage(object):
+    """ Step of a pipeline that turns input files into output files.
+
+        function is a function function(**params), run in a new process, or
+        a command (list of arguments) whose items are formatted with the
+        name of the pipeline and the params, as ['abaqus', 'cae',
+        'noGUI={script}']. Both run in the directory of the pipeline, and
+        commands get the params as JSON in the environment variable
+        ANEUPY_PARAMS and write their output to <stage>.log.
+
+        inputs and outputs are the paths of the files read and written by
+        the stage, relative to the directory of the pipeline and formatted
+        like the command. Scripts run by a command should be listed among
+        its inputs, so that editing them invalidates the stage.
+
+    """
+
+    def __init__(self, name, function, inputs=(), outputs=(), params=None, after=(), timeout=None, retries=0):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.after = list(after)
+        self.timeout = timeout
+        self.retries = retries
+
+
+class Pipeline(object):
+    """ Stages of a variant whose outputs are kept between runs.
+
+        A stage depends on the stages that write its inputs and on those
+        named in its after list. Its key is the hash of its code, its
+        parameters (those of the pipeline updated with its own) and the
+        digests of its inputs. After it runs, the key and the digests of its
+        outputs are written to the manifest <name>.pipeline.json in
+        directory. A later run skips the stage while its key is the same and
+        its outputs are unchanged, so a crash or a change of parameters only
+        reruns the stages from the first invalid one on.
+
+        Digests are kept with the size and modification time of the files,
+        so unchanged files (as a large .hdf or .cae) are not read again.
+
+    """
+
+    def __init__(self, name, directory='.', params=None):
+        self.name = name
+        self.directory = os.path.abspath(directory)
+        self.params = params or {}
+        self.stages = []
+
+        self.manifest_file = os.path.join(self.directory, name + '.pipeline.json')
+        self.manifest = {'stages': {}, 'files': {}}
+        if os.path.isfile(self.manifest_file):
+            with open(self.manifest_file) as input_file:
+                self.manifest = json.load(input_file)
+
+        self.results = {}
+
+    def add_stage(self, name, function, inputs=(), outputs=(), params=None, after=(), timeout=None, retries=0):
+        if name in [stage.name for stage in self.stages]:
+            raise ValueError('Stage {0} already in pipeline {1}'.format(name, self.name))
+
+        stage = Stage(name, function, inputs, outputs, params, after, timeout, retries)
+        self.stages.append(stage)
+
+        return stage
+
+    def _params(self, stage):
+        params = dict(self.params)
+        params.update(stage.params)
+        return params
+
+    def _format(self, stage, text):
+        return text.format(name=self.name, **self._params(stage))
+
+    def files(self, stage, kind):
+        """ Returns the paths of the inputs or outputs of a stage, relative to the directory"""
+
+        return [self._format(stage, path) for path in getattr(stage, kind)]
+
+    def dependencies(self, stage):
+        """ Returns the names of the stages that must run before stage"""
+
+        inputs = set(self.files(stage, 'inputs'))
+        names = [other.name for other in self.stages
+                 if other is not stage and inputs & set(self.files(other, 'outputs'))]
+
+        for name in stage.after:
+            if name not in [other.name for other in self.stages]:
+                raise ValueError('Stage {0} of pipeline {1} runs after unknown stage {2}'.format(
+                    stage.name, self.name, name))
+            if name not in names:
+                names.append(name)
+
+        return names
+
+    def fingerprint(self, path):
+        """ Returns the digest of a file of the pipeline, or None if it does not exist"""
+
+        full = os.path.join(self.directory, path)
+        if not os.path.isfile(full):
+            return None
+
+        stat = os.stat(full)
+        known = self.manifest['files'].get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime:
+            return known[2]
+
+        value = digest(full)
+        self.manifest['files'][path] = [stat.st_size, stat.st_mtime, value]
+
+        return value
+
+    def key(self, stage):
+        """ Returns the key of a stage, once the stages it depends on have run"""
+
+        inputs = []
+        for path in self.files(stage, 'inputs'):
+            value = self.fingerprint(path)
+            if value is None:
+                raise IOError('Input {0} of stage {1} of pipeline {2} does not exist'.format(
+                    path, stage.name, self.name))
+            inputs.append([path, value])
+
+        return Cache.hash_key('stage', signature(stage.function), self._params(stage), inputs,
+                              self.files(stage, 'outputs'))
+
+    def valid(self, stage, key):
+        """ Tells if a stage has run with this key and its outputs are unchanged"""
+
+        entry = self.manifest['stages'].get(stage.name)
+        if entry is None or entry['key'] != key:
+            return False
+
+        return all(self.fingerprint(path) == value for path, value in entry['outputs'].items())
+
+    def status(self):
+        """ Returns the status of each stage from the manifest: 'valid', 'invalid' or 'missing'.
+
+            Stages whose inputs are written by invalid or missing stages are
+            'invalid', as their inputs will change.
+
+        """
+
+        status = {}
+        for stage in self.order():
+            if any(status[name] != 'valid' for name in self.dependencies(stage)):
+                status[stage.name] = 'invalid'
+            elif stage.name not in self.manifest['stages']:
+                status[stage.name] = 'missing'
+            else:
+                try:
+                    status[stage.name] = 'valid' if self.valid(stage, self.key(stage)) else 'invalid'
+                except IOError:
+                    status[stage.name] = 'invalid'
+
+        return status
+
+    def order(self):
+        """ Returns the stages sorted so that each one comes after its dependencies"""
+
+        done, order = set(), []
+        remaining = list(self.stages)
+
+        while remaining:
+            ready = [stage for stage in remaining if set(self.dependencies(stage)) <= done]
+            if not ready:
+                raise ValueError('The stages {0} of pipeline {1} depend on each other'.format(
+                    [stage.name for stage in remaining], self.name))
+            for stage in ready:
+                remaining.remove(stage)
+                done.add(stage.name)
+                order.append(stage)
+
+        return order
+
+    def invalidate(self, stage=None):
+        """ Forgets the runs of a stage, or of all of them"""
+
+        if stage is None:
+            self.manifest['stages'] = {}
+        else:
+            self.manifest['stages'].pop(stage, None)
+
+        self.save()
+
+    def record(self, stage, key):
+        self.manifest['stages'][stage.name] = {'key': key, 'time': time.time(),
+                                               'outputs': dict((path, self.fingerprint(path))
+                                                               for path in self.files(stage, 'outputs'))}
+        self.save()
+
+    def save(self):
+        """ Writes the manifest atomically, so that a crash leaves the previous one"""
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        handle, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as output_file:
+            json.dump(self.manifest, output_file, indent=2, sort_keys=True)
+
+        if os.path.isfile(self.manifest_file) and os.name == 'nt':
+            os.remove(self.manifest_file)
+        os.rename(temp, self.manifest_file)
+
+    def start(self, stage):
+        """ Starts a stage and returns its process and the pipe of its result (None for commands)"""
+
+        params = self._params(stage)
+
+        if not isinstance(stage.function, (list, tuple)):
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_worker, args=(sender, stage.function, self.directory, params))
+            process.daemon = True
+            process.start()
+            sender.close()
+            return process, receiver
+
+        command = [self._format(stage, part) for part in stage.function]
+        env = dict(os.environ, ANEUPY_PARAMS=json.dumps(Cache.canonical(params), sort_keys=True))
+
+        with open(os.path.join(self.directory, stage.name + '.log'), 'w') as log:
+            kwargs = {'preexec_fn': os.setsid} if hasattr(os, 'setsid') else {}
+            process = subprocess.Popen(command, cwd=self.directory, stdout=log, stderr=subprocess.STDOUT, env=env,
+                                       **kwargs)
+
+        return process, None
+
+    def run(self, processes=1, poll=0.05, callback=None):
+        return run([self], processes, poll, callback)[0]
+
+
+def _poll(process, receiver):
+    """ Returns the status and error of a finished stage, or None if it is running"""
+
+    if receiver is None:
+        code = process.poll()
+        if code is None:
+            return None
+        return ('done', None) if code == 0 else ('failed', 'Command exited with code {0}'.format(code))
+
+    # The worker may send its result and exit between a poll of the pipe and
+    # is_alive, so is_alive comes first: once it is dead the pipe holds all
+    alive = process.is_alive()
+    if receiver.poll():
+        try:
+            result = receiver.recv()
+            return result['status'], result['error']
+        except EOFError:
+            pass
+    elif alive:
+        return None
+
+    process.join()
+    return 'failed', 'Worker exited with code {0}'.format(process.exitcode)
+
+
+def _kill(process, receiver):
+    """ Kills a stage and, for commands, the programs it started"""
+
+    if receiver is not None:
+        process.terminate()
+        process.join()
+        return
+
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+    except OSError:
+        pass
+
+    process.wait()
+
+
+def run(pipelines, processes=1, poll=0.05, callback=None):
+    """ Runs the stages of several pipelines, up to processes at a time.
+
+        A stage starts as soon as the stages it depends on have finished, so
+        independent stages of the same or different pipelines run at the
+        same time. Valid stages are skipped (see Pipeline). A stage that
+        fails or times out is retried up to its retries, and then the stages
+        that depend on it are not run.
+
+        Returns for each pipeline a dictionary with the result of each
+        stage: its status ('done', 'skipped', 'failed', 'timeout' or
+        'blocked'), the error, the number of attempts and the wall time of
+        the last attempt. callback(pipeline, stage, result) is called when a
+        stage finishes.
+
+    """
+
+    pending = [(pipeline, stage) for pipeline in pipelines for stage in pipeline.order()]
+    results = [{} for _ in pipelines]
+    attempts = {}
+    running = {}
+
+    def finish(index, pipeline, stage, result):
+        results[index][stage.name] = result
+        if callback is not None:
+            callback(pipeline, stage, result)
+
+    while pending or running:
+
+        for pipeline, stage in list(pending):
+            if len(running) >= processes:
+                break
+
+            index = pipelines.index(pipeline)
+            done = results[index]
+            dependencies = pipeline.dependencies(stage)
+
+            if any(name in done and done[name]['status'] not in ('done', 'skipped') for name in dependencies):
+                pending.remove((pipeline, stage))
+                finish(index, pipeline, stage, {'status': 'blocked', 'error': None, 'attempts': 0, 'time': 0.})
+                continue
+            if not all(name in done for name in dependencies):
+                continue
+
+            pending.remove((pipeline, stage))
+            try:
+                key = pipeline.key(stage)
+            except IOError as error:
+                finish(index, pipeline, stage, {'status': 'failed', 'error': str(error), 'attempts': 0, 'time': 0.})
+                continue
+
+            if pipeline.valid(stage, key):
+                finish(index, pipeline, stage, {'status': 'skipped', 'error': None, 'attempts': 0, 'time': 0.})
+                continue
+
+            # A crash while the stage runs must not leave its previous run as valid
+            pipeline.manifest['stages'].pop(stage.name, None)
+            pipeline.save()
+
+            attempts[(index, stage.name)] = attempts.get((index, stage.name), 0) + 1
+            process, receiver = pipeline.start(stage)
+            running[(index, stage.name)] = (pipeline, stage, key, process, receiver, time.time())
+
+        for (index, name), (pipeline, stage, key, process, receiver, start) in list(running.items()):
+            outcome = _poll(process, receiver)
+
+            if outcome is None:
+                if stage.timeout is None or time.time() - start <= stage.timeout:
+                    continue
+                _kill(process, receiver)
+                outcome = ('timeout', 'Stage exceeded {0} s'.format(stage.timeout))
+            elif receiver is not None:
+                process.join()
+                receiver.close()
+
+            del running[(index, name)]
+            status, error = outcome
+
+            if status == 'done':
+                missing = [path for path in pipeline.files(stage, 'outputs')
+                           if not os.path.isfile(os.path.join(pipeline.directory, path))]
+                if missing:
+                    status, error = 'failed', 'Stage did not write {0}'.format(', '.join(missing))
+                else:
+                    pipeline.record(stage, key)
+
+            if status != 'done' and attempts[(index, name)] <= stage.retries:
+                pending.insert(0, (pipeline, stage))
+                continue
+
+            finish(index, pipeline, stage, {'status': status, 'error': error, 'attempts': attempts[(index, name)],
+                                            'time': time.time() - start})
+
+        if running:
+            time.sleep(poll)
+
+    for pipeline, result in zip(pipelines, results):
+        pipeline.results = result
+
+    return results
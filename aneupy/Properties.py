@@ -0,0 +1,285 @@
+# =============================================================================
+#
+# Properties.py
+#
+# Batched mass properties of sections, shells and solids with NumPy
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import math
+
+import numpy as np
+
+try:
+    from aneupy import Loft
+except ImportError:
+    import Loft
+
+PROPERTIES = ('Length', 'Area', 'Volume', 'Inertia', 'CDG')
+
+INERTIA = ('I11', 'I12', 'I13', 'I21', 'I22', 'I23', 'I31', 'I32', 'I33', 'Ix', 'Iy', 'Iz')
+
+
+def section_properties(origins, R, radii, properties=PROPERTIES):
+    """ Returns the properties of circular faces as arrays.
+
+        origins (n, 3), R (n, 3, 3) and radii (n) define the circles as in
+        Section. Inertia is the tensor about the centroid with unit density.
+
+    """
+
+    origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+    R = np.asarray(R, dtype=float).reshape(-1, 3, 3)
+    r = np.asarray(radii, dtype=float).reshape(-1)
+
+    result = {}
+
+    if 'Length' in properties:
+        result['Length'] = 2. * math.pi * r
+    if 'Area' in properties:
+        result['Area'] = math.pi * r**2
+    if 'Volume' in properties:
+        result['Volume'] = np.zeros_like(r)
+    if 'Inertia' in properties:
+        J = 0.25 * math.pi * r**4
+        D = np.stack((J, J, 2. * J), axis=-1)
+        result['Inertia'] = np.einsum('nji,nj,njk->nik', R, D, R)
+    if 'CDG' in properties:
+        result['CDG'] = origins
+
+    return result
+
+
+def loft_shells(shells):
+    """ Lofts shells with the same number of sections and degree in batches.
+
+        Shells with a tolerance are fitted one by one with Loft.fit. Returns
+        the knot vectors and control nets in the order of shells.
+
+    """
+
+    lofts = [None] * len(shells)
+
+    groups = {}
+    for index, shell in enumerate(shells):
+        if getattr(shell, 'tolerance', None) is not None:
+            lofts[index] = Loft.fit([section.origin for section in shell.sections],
+                                    [np.asarray(section.R)[0] for section in shell.sections],
+                                    [np.asarray(section.R)[1] for section in shell.sections],
+                                    [section.radius for section in shell.sections],
+                                    shell.tolerance, shell.minBSplineDegree, shell.maxBSplineDegree)[:2]
+            continue
+
+        degree = Loft.loft_degree(len(shell.sections), shell.minBSplineDegree, shell.maxBSplineDegree)
+        groups.setdefault((len(shell.sections), degree), []).append(index)
+
+    for (n, degree), indices in groups.items():
+        origins = [[section.origin for section in shells[i].sections] for i in indices]
+        OX = [[np.asarray(section.R)[0] for section in shells[i].sections] for i in indices]
+        OY = [[np.asarray(section.R)[1] for section in shells[i].sections] for i in indices]
+        radii = [[section.radius for section in shells[i].sections] for i in indices]
+
+        knots, net = Loft.loft(origins, OX, OY, radii, degree)
+        for j, i in enumerate(indices):
+            lofts[i] = (knots[j], net[j])
+
+    return lofts
+
+
+def tessellate_shells(shells, lofts, nu, nt):
+    """ Triangulates shells in batches of identical topology.
+
+        Returns a dictionary closed -> (indices, vertices, triangles, sign)
+        where vertices stacks the shells with that closed flag.
+
+    """
+
+    batches = {}
+
+    groups = {}
+    for index, shell in enumerate(shells):
+        knots, net = lofts[index]
+        groups.setdefault((bool(shell.closed), knots.shape, net.shape), []).append(index)
+
+    for (closed, _, _), indices in groups.items():
+        knots = np.stack([lofts[i][0] for i in indices])
+        net = np.stack([lofts[i][1] for i in indices])
+        vertices, triangles, inward = Loft.tessellate(knots, net, nu, nt, closed)
+
+        if closed in batches:
+            previous = batches[closed]
+            batches[closed] = (previous[0] + indices, np.concatenate((previous[1], vertices)),
+                               triangles, np.concatenate((previous[3], np.where(inward, -1., 1.))))
+        else:
+            batches[closed] = (indices, vertices, triangles, np.where(inward, -1., 1.))
+
+    return batches
+
+
+def cad_info(sections, shells, solids, properties=None, nu=64, nt=96):
+    """ Returns the CAD information of all entities computed in one batched pass.
+
+        sections and shells are dictionaries of Section and Shell objects of
+        any backend. solids maps each name to the list of (shell, sign) pairs
+        that bound it: the volume enclosed by the shells with sign 1 minus
+        those with sign -1. Shells are lofted with the Loft module and
+        measured on a nu x nt tessellation, but for their Length, that of the
+        rings at their ends (see Loft.boundary_length); sections are measured
+        exactly.
+
+        The properties of a cut are those of the main solid minus those of
+        the tool, which is only right when the tool lies inside the main
+        solid (its end caps may lie on the caps of the main one). Other cuts
+        are not detected here: Domain.add_solid_from_cut checks the wall
+        with Wall.check, unless check is False, and only the kernel method
+        measures cuts of shells that cross.
+
+        properties is a subset of PROPERTIES. The result has the layout of
+        Domain.info, with Inertia expanded in the I11 ... Iz entries.
+
+    """
+
+    properties = PROPERTIES if properties is None else tuple(properties)
+    info = {'sections': {}, 'shells': {}, 'solids': {}}
+
+    # Sections
+    if sections:
+        names = list(sections.keys())
+        result = section_properties([sections[name].origin for name in names],
+                                    [sections[name].R for name in names],
+                                    [sections[name].radius for name in names],
+                                    properties)
+        _fill(info['sections'], names, result)
+
+    # Shells, including those only needed to bound solids
+    all_shells = []
+    index = {}
+    for shell in list(shells.values()) + [shell for pairs in solids.values() for shell, sign in pairs]:
+        if id(shell) not in index:
+            index[id(shell)] = len(all_shells)
+            all_shells.append(shell)
+
+    n = len(all_shells)
+    if not n:
+        return info
+
+    surface = set(properties) & set(('Area', 'Inertia', 'CDG'))
+    volume = solids and set(properties) & set(('Volume', 'Inertia', 'CDG'))
+
+    length, area = np.zeros(n), np.zeros(n)
+    surface_first, surface_second = np.zeros((n, 3)), np.zeros((n, 3, 3))
+    volume_moments = np.zeros(n), np.zeros((n, 3)), np.zeros((n, 3, 3))
+
+    if surface or volume or 'Length' in properties:
+        lofts = loft_shells(all_shells)
+
+    if 'Length' in properties:
+        length = np.array([Loft.boundary_length(net) for _, net in lofts])
+
+    if surface or volume:
+        second = 'Inertia' in properties
+
+        for closed, (indices, vertices, triangles, sign) in tessellate_shells(all_shells, lofts, nu, nt).items():
+            a, f, s = Loft.surface_moments(vertices, triangles, second)
+            area[indices], surface_first[indices] = a, f
+            if second:
+                surface_second[indices] = s
+
+            if volume and closed:
+                v, f, s = Loft.volume_moments(vertices, triangles, sign, second)
+                volume_moments[0][indices], volume_moments[1][indices] = v, f
+                if second:
+                    volume_moments[2][indices] = s
+
+    if shells:
+        names = list(shells.keys())
+        rows = [index[id(shells[name])] for name in names]
+
+        centroid, inertia = Loft.central_inertia(area[rows], surface_first[rows], surface_second[rows])
+        result = {'Length': length[rows], 'Area': area[rows], 'Volume': np.zeros(len(rows)),
+                  'Inertia': inertia, 'CDG': centroid}
+        _fill(info['shells'], names, dict((k, v) for k, v in result.items() if k in properties))
+
+    if solids:
+        names = list(solids.keys())
+        S = np.zeros((len(names), n))
+        for i, name in enumerate(names):
+            for shell, sign in solids[name]:
+                S[i, index[id(shell)]] += sign
+
+        mass = S.dot(volume_moments[0])
+        first = S.dot(volume_moments[1])
+        second = np.einsum('ij,jkl->ikl', S, volume_moments[2])
+        centroid, inertia = Loft.central_inertia(mass, first, second)
+
+        result = {'Length': np.abs(S).dot(length), 'Area': np.abs(S).dot(area), 'Volume': mass,
+                  'Inertia': inertia, 'CDG': centroid}
+        _fill(info['solids'], names, dict((k, v) for k, v in result.items() if k in properties))
+
+    return info
+
+
+def _fill(info, names, result):
+    """ Writes the arrays of result in the per entity dictionaries of info"""
+
+    if 'Inertia' in result:
+        I = result['Inertia']
+        principal = np.linalg.eigvalsh(I)
+        result = dict(result)
+        result['Inertia'] = np.concatenate((I.reshape(-1, 9), principal), axis=-1)
+
+    for i, name in enumerate(names):
+        entry = info.setdefault(name, {})
+        for key, values in result.items():
+            if key == 'Inertia':
+                entry.update(zip(INERTIA, values[i].tolist()))
+            elif key == 'CDG':
+                entry['CDG'] = values[i].tolist()
+            else:
+                entry[key] = float(values[i])
+
+
+def compare(info, reference, tolerance=1.E-2):
+    """ Compares two CAD information dictionaries.
+
+        Returns a list of (entity type, name, property, value, reference,
+        relative error) for the values of info that differ from reference by
+        more than tolerance. Inertia and CDG errors are relative to the
+        largest principal moment and to the size of the entity, so that
+        components close to zero are not flagged by round-off.
+
+        Batch values of cuts whose tool is not inside the main solid (see
+        cad_info) are wrong, and are reported here as mismatches against
+        kernel values.
+
+    """
+
+    mismatches = []
+
+    for entity_type, entities in info.items():
+        for name, entry in entities.items():
+            ref = reference.get(entity_type, {}).get(name)
+            if ref is None:
+                continue
+
+            inertia_scale = max([abs(ref.get(k, 0.)) for k in ('Ix', 'Iy', 'Iz')] + [1.E-300])
+            size = max(ref.get('Length', 0.) / (2. * math.pi), math.sqrt(abs(ref.get('Area', 0.))), 1.E-300)
+
+            for key, value in entry.items():
+                if key not in ref:
+                    continue
+
+                if key == 'CDG':
+                    error = max(abs(a - b) for a, b in zip(value, ref[key])) / max(size, max(abs(b) for b in ref[key]))
+                elif key in INERTIA:
+                    error = abs(value - ref[key]) / inertia_scale
+                else:
+                    error = abs(value - ref[key]) / max(abs(ref[key]), 1.E-300)
+
+                if error > tolerance:
+                    mismatches.append((entity_type, name, key, value, ref[key], error))
+
+    return sorted(mismatches)
@@ -0,0 +1,247 @@
+# =============================================================================
+#
+# Results.py
+#
+# Streaming extraction of ODB field outputs into memory mappable arrays
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+# Runs in the Python of Abaqus, whose NumPy 1.6 has neither np.stack nor
+# np.full. odbAccess and abaqusConstants are only imported when needed.
+
+import os
+import json
+
+import numpy as np
+
+
+def frames(odb, steps=None, every=1):
+    """ Yields the step name, the index and the frame of the frames of an ODB.
+
+        steps are the names of the steps to read, all of them if None, and
+        every the stride between frames. Only the frame being read is kept,
+        so that Abaqus can release the previous ones.
+
+    """
+
+    for name in (steps or list(odb.steps.keys())):
+        step = odb.steps[name]
+        for index in range(0, len(step.frames), every):
+            yield name, index, step.frames[index]
+
+
+def region(odb, name):
+    """ Returns the node or element set of an ODB from its name, as 'WALL' or 'PART-1.WALL'"""
+
+    if '.' in name:
+        instance, name = name.split('.', 1)
+        container = odb.rootAssembly.instances[instance]
+    else:
+        container = odb.rootAssembly
+
+    for sets in (container.elementSets, container.nodeSets):
+        if name in sets:
+            return sets[name]
+
+    raise KeyError('No node or element set {0} in {1}'.format(name, odb.name))
+
+
+def bulk(field):
+    """ Returns the labels and the data (n, k) of a field output, from its bulk data blocks"""
+
+    labels, data = [], []
+    for block in field.bulkDataBlocks:
+        block_labels = block.elementLabels if block.elementLabels is not None else block.nodeLabels
+        labels.append(np.asarray(block_labels, dtype=np.int64).ravel())
+        data.append(np.asarray(block.data, dtype=np.float32).reshape(len(labels[-1]), -1))
+
+    if not labels:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 1), dtype=np.float32)
+
+    return np.concatenate(labels), np.concatenate(data)
+
+
+class Store(object):
+    """ Array of frames of a field output, appended to a file on disk.
+
+        Each frame holds the values (n, k) of the same n labels. Frames are
+        written chunk at a time, so that only chunk frames are in memory,
+        and the file is read back as a np.memmap (frames, n, k) with open.
+        The steps and total times (from the start of the analysis), labels
+        and the statistics of each frame (min, mean and max of the values, or
+        of their magnitudes for vectors, and the label of the max) are kept
+        in name.json.
+
+    """
+
+    def __init__(self, directory, name, chunk=16):
+        self.directory = directory
+        self.name = name
+        self.chunk = chunk
+
+        self.labels = None
+        self.shape = None
+        self.buffer = []
+        self.meta = {'name': name, 'dtype': 'float32', 'frames': 0, 'steps': [], 'times': [],
+                     'min': [], 'mean': [], 'max': [], 'max_label': []}
+
+        self.path = os.path.join(directory, name + '.bin')
+        open(self.path, 'wb').close()
+
+    def append(self, step, time, labels, values):
+        values = np.asarray(values, dtype=np.float32)
+        if values.ndim < 2:
+            values = values.reshape(len(labels), -1)
+
+        if self.labels is None:
+            self.labels = np.asarray(labels, dtype=np.int64)
+            self.shape = values.shape
+        elif values.shape != self.shape:
+            raise ValueError('Frame {0} of {1} has shape {2}, not {3}'.format(self.meta['frames'], self.name,
+                                                                             values.shape, self.shape))
+
+        scalar = values[:, 0] if values.shape[1] == 1 else np.sqrt((values * values).sum(axis=1))
+        i = int(scalar.argmax()) if len(scalar) else 0
+
+        self.meta['frames'] += 1
+        self.meta['steps'].append(step)
+        self.meta['times'].append(float(time))
+        self.meta['min'].append(float(scalar.min()) if len(scalar) else 0.)
+        self.meta['mean'].append(float(scalar.mean()) if len(scalar) else 0.)
+        self.meta['max'].append(float(scalar[i]) if len(scalar) else 0.)
+        self.meta['max_label'].append(int(self.labels[i]) if len(scalar) else 0)
+
+        self.buffer.append(values)
+        if len(self.buffer) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            with open(self.path, 'ab') as output_file:
+                np.concatenate(self.buffer).tofile(output_file)
+            self.buffer = []
+
+    def summary(self):
+        """ Returns the peak of the frames (value, label, step and total time) and the max over time"""
+
+        if not self.meta['frames']:
+            return {'frames': 0}
+
+        i = int(np.argmax(self.meta['max']))
+        return {'frames': self.meta['frames'], 'peak': self.meta['max'][i], 'label': self.meta['max_label'][i],
+                'step': self.meta['steps'][i], 'time': self.meta['times'][i], 'max': self.meta['max'],
+                'times': self.meta['times']}
+
+    def close(self):
+        self.flush()
+
+        self.meta['shape'] = list(self.shape) if self.shape is not None else [0, 1]
+        np.save(os.path.join(self.directory, self.name + '.labels.npy'),
+                self.labels if self.labels is not None else np.zeros(0, dtype=np.int64))
+
+        with open(os.path.join(self.directory, self.name + '.json'), 'w') as output_file:
+            json.dump(self.meta, output_file, indent=2, sort_keys=True)
+
+    @staticmethod
+    def open(directory, name):
+        """ Returns the memmap (frames, n, k), the labels and the metadata of a stored field"""
+
+        with open(os.path.join(directory, name + '.json')) as input_file:
+            meta = json.load(input_file)
+
+        labels = np.load(os.path.join(directory, name + '.labels.npy'))
+        shape = (meta['frames'],) + tuple(meta['shape'])
+        if not meta['frames']:
+            return np.zeros(shape, dtype=meta['dtype']), labels, meta
+
+        data = np.memmap(os.path.join(directory, name + '.bin'), dtype=meta['dtype'], mode='r', shape=shape)
+
+        return data, labels, meta
+
+
+def extract(odb, directory, fields, region_name=None, steps=None, every=1, position=None, chunk=16):
+    """ Writes field outputs of the frames of an ODB into Stores.
+
+        odb is an Odb or the path of one, which is then opened read only and
+        closed at the end. fields maps the names of the stores to the key
+        of a field output, as 'U', to a pair (key, invariant), as ('S',
+        'MISES'), or to a dictionary with the key and optionally the
+        invariant, the position, as 'INTEGRATION_POINT' or 'NODAL', and the
+        region, the name of a node or element set. region_name and position
+        are the defaults of the fields that do not give theirs, and None
+        reads the whole field at the positions where it was written. A field
+        left without values by its region and position, as a nodal field at
+        'INTEGRATION_POINT', raises a ValueError.
+
+        The frames are read one by one (see frames) and stored at their total
+        time, the time of the step plus that of the frame in it, so that the
+        frames of different steps do not share times. Returns the summary of
+        each store, also written to summary.json in directory.
+
+    """
+
+    import abaqusConstants
+
+    close = False
+    if not hasattr(odb, 'steps'):
+        from odbAccess import openOdb
+        odb = openOdb(path=odb, readOnly=True)
+        close = True
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    regions = {}
+    specs = {}
+    for name, spec in fields.items():
+        if isinstance(spec, dict):
+            spec = dict(spec)
+        elif isinstance(spec, (tuple, list)):
+            spec = {'key': spec[0], 'invariant': spec[1]}
+        else:
+            spec = {'key': spec}
+
+        subset = {}
+        set_name = spec.get('region', region_name)
+        if set_name is not None:
+            if set_name not in regions:
+                regions[set_name] = region(odb, set_name)
+            subset['region'] = regions[set_name]
+        where = spec.get('position', position)
+        if where is not None:
+            subset['position'] = getattr(abaqusConstants, where)
+
+        invariant = spec.get('invariant')
+        specs[name] = (spec['key'], getattr(abaqusConstants, invariant) if invariant else None, subset)
+
+    stores = dict((name, Store(directory, name, chunk)) for name in specs)
+
+    try:
+        for step, index, frame in frames(odb, steps, every):
+            time = odb.steps[step].totalTime + frame.frameValue
+            for name, (key, invariant, subset) in specs.items():
+                field = frame.fieldOutputs[key]
+                if subset:
+                    field = field.getSubset(**subset)
+                if invariant is not None:
+                    field = field.getScalarField(invariant=invariant)
+
+                labels, values = bulk(field)
+                if subset and not len(labels) and len(frame.fieldOutputs[key].bulkDataBlocks):
+                    raise ValueError('Field {0} ({1}) has no values at {2}'.format(
+                        name, key, ', '.join('{0} {1}'.format(k, getattr(v, 'name', v)) for k, v in subset.items())))
+                stores[name].append(step, time, labels, values)
+    finally:
+        for store in stores.values():
+            store.close()
+        if close:
+            odb.close()
+
+    summary = dict((name, store.summary()) for name, store in stores.items())
+    with open(os.path.join(directory, 'summary.json'), 'w') as output_file:
+        json.dump(summary, output_file, indent=2, sort_keys=True)
+
+    return summary
@@ -0,0 +1,313 @@
+# =============================================================================
+#
+# Scheduler.py
+#
+# Python module to queue and monitor Abaqus co-execution jobs
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import os
+import re
+import time
+import signal
+import subprocess
+from collections import deque
+
+# Command of a co-execution, formatted with the solver, the name of the
+# co-execution and the names and input files of its jobs
+COMMAND = ['{solver}', 'cosimulation', 'cosimulationjob={name}', 'job={jobs}', 'input={inputs}', 'cpus={cpus}',
+           'interactive']
+
+# Lines of a .sta file with an increment: step, increment, attempt (with a
+# U after cutbacks), severe, equilibrium and total iterations, total time,
+# step time and time increment
+INCREMENT = re.compile(r'^\s*(\d+)\s+(\d+)\s+(\d+)(U?)\s+\d+\s+\d+\s+\d+\s+(\S+)\s+(\S+)\s+(\S+)\s*$')
+
+# Warning of an attempt that diverges, which Abaqus cuts back, and the
+# errors after which it stops
+DIVERGING = 'THE SOLUTION APPEARS TO BE DIVERGING'
+FATAL = ('TOO MANY ATTEMPTS MADE FOR THIS INCREMENT', 'TIME INCREMENT REQUIRED IS LESS THAN THE MINIMUM')
+LICENSE = ('License for', 'license server', 'Queued for license')
+
+
+def license_tokens(cpus):
+    """ Abaqus license tokens of an analysis on cpus cores"""
+
+    return int(5 * cpus**0.422)
+
+
+class Tail(object):
+    """ Reads the lines appended to a file since the last read"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.partial = ''
+
+    def read(self):
+        if not os.path.isfile(self.path):
+            return []
+
+        with open(self.path) as input_file:
+            input_file.seek(self.offset)
+            text = input_file.read()
+            self.offset = input_file.tell()
+
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+
+        return lines
+
+
+class Status(object):
+    """ Progress of a co-execution, from the .sta, .msg and .log files of its jobs.
+
+        update reads what the solvers appended since the last call. step,
+        increment and time are the last converged increment of any job,
+        cutbacks the attempts cut back in a row and divergences the warnings
+        that the solution diverges since the last increment of any job, and
+        diverging, license, errors and completed what the messages of the
+        jobs reported, diverging being one of the FATAL errors.
+
+    """
+
+    def __init__(self, directory, name, jobs):
+        self.names = [name] + list(jobs)
+        self.tails = dict((extension, [Tail(os.path.join(directory, job + extension)) for job in self.names])
+                          for extension in ('.sta', '.msg', '.log'))
+
+        self.step = 0
+        self.increment = 0
+        self.time = 0.
+        self.time_increment = None
+        self.cutbacks = 0
+        self.divergences = 0
+
+        # Attempts cut back and diverging warnings of each job since its last increment
+        self.attempts = [0] * len(self.names)
+        self.warnings = [0] * len(self.names)
+        self.diverging = False
+        self.license = False
+        self.errors = []
+        self.completed = set()
+        self.failed = False
+
+    def update(self):
+        for i, tail in enumerate(self.tails['.sta']):
+            for line in tail.read():
+                match = INCREMENT.match(line)
+                if match:
+                    step, increment, attempt, cutback, total, _, dt = match.groups()
+                    if cutback:
+                        self.attempts[i] += 1
+                    else:
+                        self.attempts[i] = self.warnings[i] = 0
+                        self.step, self.increment = int(step), int(increment)
+                        self.time, self.time_increment = max(self.time, float(total)), float(dt)
+                elif 'HAS NOT BEEN COMPLETED' in line:
+                    self.failed = True
+
+        for i, tail in enumerate(self.tails['.msg']):
+            for line in tail.read():
+                if DIVERGING in line:
+                    self.warnings[i] += 1
+                if any(text in line for text in FATAL):
+                    self.diverging = True
+                if '***ERROR' in line:
+                    self.errors.append(line.strip())
+        self.cutbacks, self.divergences = max(self.attempts), max(self.warnings)
+
+        for job, tail in zip(self.names, self.tails['.log']):
+            for line in tail.read():
+                if any(text in line for text in LICENSE):
+                    self.license = True
+                if 'COMPLETED' in line and 'NOT' not in line:
+                    self.completed.add(job)
+                if 'exited with error' in line or 'Error' in line:
+                    self.failed = True
+                    self.errors.append(line.strip())
+
+        return self
+
+    def progress(self):
+        return {'step': self.step, 'increment': self.increment, 'time': self.time, 'cutbacks': self.cutbacks,
+                'divergences': self.divergences}
+
+
+class Job(object):
+    """ Co-execution of the fluid and solid analyses of an FSI model.
+
+        inputs maps the names of the jobs to their input files, in
+        directory. cpus are the cores of each job and tokens the license
+        tokens of the whole co-execution, license_tokens(total cores) by
+        default.
+
+    """
+
+    def __init__(self, name, inputs, directory='.', cpus=1, tokens=None):
+        self.name = name
+        self.inputs = inputs
+        self.directory = directory
+        self.cpus = cpus
+        self.tokens = tokens if tokens is not None else license_tokens(cpus * len(inputs))
+
+    def command(self, solver, template=None):
+        jobs = sorted(self.inputs)
+        values = {'solver': solver, 'name': self.name, 'jobs': ','.join(jobs), 'cpus': self.cpus,
+                  'inputs': ','.join(self.inputs[job] for job in jobs)}
+
+        return [part.format(**values) for part in (template or COMMAND)]
+
+    def clean(self):
+        """ Removes the status files of a previous attempt"""
+
+        for job in [self.name] + sorted(self.inputs):
+            for extension in ('.sta', '.msg', '.log', '.lck'):
+                path = os.path.join(self.directory, job + extension)
+                if os.path.isfile(path):
+                    os.remove(path)
+
+
+class Scheduler(object):
+    """ Queue of co-execution jobs run with a limit of jobs and license tokens.
+
+        Jobs start in the order they were added, skipping those that do not
+        fit in the free tokens while smaller ones do. The status files of the
+        running jobs are read every poll seconds (see Status). A job is
+        killed as 'diverged' when it cuts back, or warns that the solution
+        diverges, max_cutbacks times in the same increment, and as 'timeout'
+        after timeout s. A job that Abaqus stops with a FATAL error ends as
+        'diverged'. Jobs that fail, time out or find no license are queued
+        again up to retries times.
+
+        solver is the Abaqus command, or a list of the program and its first
+        arguments, as [sys.executable, '-m', 'aneupy.stubs.solver'] for the
+        fake solver. template replaces COMMAND.
+
+    """
+
+    def __init__(self, solver='abaqus', jobs=1, tokens=None, retries=0, timeout=None, max_cutbacks=5,
+                 template=None):
+        self.solver = solver
+        self.jobs = jobs
+        self.tokens = tokens
+        self.retries = retries
+        self.timeout = timeout
+        self.max_cutbacks = max_cutbacks
+        self.template = template
+
+        self.queue = []
+        self.results = []
+
+    def add(self, job):
+        self.queue.append(job)
+        return job
+
+    def _start(self, job):
+        job.clean()
+
+        solver = list(self.solver) if isinstance(self.solver, (list, tuple)) else [self.solver]
+        command = solver + job.command(None, self.template)[1:]
+
+        with open(os.devnull, 'w') as null:
+            kwargs = {'preexec_fn': os.setsid} if hasattr(os, 'setsid') else {}
+            process = subprocess.Popen(command, cwd=job.directory, stdout=null, stderr=subprocess.STDOUT, **kwargs)
+
+        return process, Status(job.directory, job.name, sorted(job.inputs))
+
+    def _kill(self, process):
+        """ Kills a solver and the analyses it started"""
+
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(process.pid, signal.SIGTERM)
+            else:
+                process.terminate()
+        except OSError:
+            pass
+
+        process.wait()
+
+    def run(self, poll=0.5, callback=None):
+        """ Runs all the jobs and returns the list of results in queue order.
+
+            Each result is a dictionary with the name of the job, its status
+            ('completed', 'failed', 'license', 'diverged' or 'timeout'), its
+            progress and errors, the exit code of the solver, the number of
+            attempts and the wall time of the last attempt. callback(job,
+            status) is called after each poll of a running job.
+
+        """
+
+        results = [None] * len(self.queue)
+        attempts = [0] * len(self.queue)
+        pending = deque(range(len(self.queue)))
+        running = {}
+
+        while pending or running:
+
+            used = sum(self.queue[index].tokens for index in running)
+            for index in list(pending):
+                if len(running) >= self.jobs:
+                    break
+                job = self.queue[index]
+                if self.tokens is not None and used + job.tokens > self.tokens:
+                    if not running and job.tokens > self.tokens:
+                        raise ValueError('Job {0} needs {1} tokens, more than the {2} available'.format(
+                            job.name, job.tokens, self.tokens))
+                    continue
+
+                pending.remove(index)
+                attempts[index] += 1
+                used += job.tokens
+                process, status = self._start(job)
+                running[index] = (process, status, time.time())
+
+            for index, (process, status, start) in list(running.items()):
+                job = self.queue[index]
+                code = process.poll()
+                status.update()
+
+                if callback is not None:
+                    callback(job, status)
+
+                if code is None:
+                    if max(status.cutbacks, status.divergences) >= self.max_cutbacks:
+                        self._kill(process)
+                        result = 'diverged'
+                    elif self.timeout is not None and time.time() - start > self.timeout:
+                        self._kill(process)
+                        result = 'timeout'
+                    else:
+                        continue
+                elif code == 0 and not status.failed and not status.errors:
+                    result = 'completed'
+                elif status.license:
+                    result = 'license'
+                else:
+                    result = 'diverged' if status.diverging else 'failed'
+
+                del running[index]
+
+                if result in ('failed', 'license', 'timeout') and attempts[index] <= self.retries:
+                    pending.append(index)
+                    continue
+
+                results[index] = {'name': job.name, 'status': result, 'progress': status.progress(),
+                                  'errors': status.errors, 'code': process.returncode, 'attempts': attempts[index],
+                                  'time': time.time() - start}
+
+            if running or pending:
+                time.sleep(poll)
+
+        self.results = results
+
+        return results
+
+    def failed(self):
+        """ Returns the results of the jobs that did not complete"""
+
+        return [result for result in self.results if result['status'] != 'completed']
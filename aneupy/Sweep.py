@@ -0,0 +1,214 @@
+# =============================================================================
+#
+# Sweep.py
+#
+# Python module to run parametric sweeps of Domain models in worker processes
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import os
+import time
+import traceback
+import multiprocessing
+from collections import deque
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from aneupy import Geometry
+except ImportError:
+    import Geometry
+
+
+def _worker(conn, build, name, params, options):
+    """ Builds, exports and saves one variant and sends back its CAD information"""
+
+    if options['memory'] and resource is not None:
+        limit = int(options['memory'] * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    try:
+        d = Geometry.Domain(backend=options['backend'], cache=options['cache'], headless=options['headless'])
+        build(d, **params)
+
+        directory = options['directory']
+        for solid, file in options['exports'].items():
+            d.export_iges(solid=solid, file=os.path.join(directory or os.getcwd(), file.format(name=name)))
+
+        if directory is not None:
+            d.save(file=os.path.join(directory, name))
+        else:
+            d._get_cad_info()
+
+        info = dict(d.info)
+        if d.walls:
+            info['walls'] = d.walls
+        if d.hemodynamics:
+            info['hemodynamics'] = d.hemodynamics
+        conn.send({'status': 'ok', 'info': info, 'error': None})
+
+    except Geometry.Wall.WallError as error:
+        conn.send({'status': 'invalid', 'info': {'walls': d.walls}, 'error': str(error)})
+
+    except BaseException:
+        conn.send({'status': 'error', 'info': None, 'error': traceback.format_exc()})
+
+    finally:
+        conn.close()
+
+
+class Sweep(object):
+    """ Parametric sweep of Domain models.
+
+        build is a function build(domain, **params) that adds the sections,
+        shells and solids of a variant to an empty Domain. table is a list of
+        dictionaries with the parameters of each variant; the optional key
+        'name' names the files of the variant.
+
+        Every variant is built in a new process, so each one gets its own
+        study and geometry builder and all its memory is released when it
+        finishes. memory (MB) bounds the address space of each worker and
+        timeout (s) its wall time. A variant whose worker crashes, runs out of
+        memory or times out is retried up to retries times and then reported
+        as failed, without affecting the rest of the batch.
+
+        exports maps solid names to IGES file names, where {name} is replaced
+        by the name of the variant. Files are written to directory, which
+        also receives the .hdf and .cad files written by Domain.save, or to
+        the working directory, without saving the variants, if it is None.
+
+        cache is the directory of a Cache shared by all the workers, so that
+        variants with identical geometries reuse each other's results.
+
+        The domains of the workers are headless (see Domain) unless headless
+        is False.
+
+        processes is the number of workers, the cores of the machine by
+        default. With the salome backend all the workers would share the
+        SALOME session of the environment, whose open study each Domain
+        closes, so variants are built one at a time and more processes is an
+        error.
+
+    """
+
+    def __init__(self, build, table, directory=None, exports=None, backend='salome', cache=None,
+                 processes=None, memory=None, timeout=None, retries=0, headless=True):
+        self.build = build
+        self.table = list(table)
+        self.directory = directory
+        self.exports = exports or {}
+        self.backend = backend
+        self.cache = cache
+        if backend == 'salome':
+            if processes not in (None, 1):
+                raise ValueError('The salome backend shares one SALOME session and runs with processes=1')
+            processes = 1
+        self.processes = processes or multiprocessing.cpu_count()
+        self.memory = memory
+        self.timeout = timeout
+        self.retries = retries
+        self.headless = headless
+
+        self.results = []
+
+    def _name(self, index, row):
+        return str(row.get('name', 'variant_{0:05d}'.format(index)))
+
+    def run(self, poll=0.01):
+        """ Runs all variants and returns the list of results in table order.
+
+            Each result is a dictionary with the name and parameters of the
+            variant, its status ('ok', 'invalid', 'error', 'crashed' or 'timeout'), the
+            CAD information, the traceback of a failure, the number of
+            attempts and the wall time of the last attempt.
+
+        """
+
+        if self.directory is not None and not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        options = {'backend': self.backend, 'cache': self.cache, 'directory': self.directory,
+                   'exports': self.exports, 'memory': self.memory, 'headless': self.headless}
+
+        results = [None] * len(self.table)
+        attempts = [0] * len(self.table)
+        pending = deque(range(len(self.table)))
+        running = {}
+
+        while pending or running:
+
+            while pending and len(running) < self.processes:
+                index = pending.popleft()
+                row = dict(self.table[index])
+                name = self._name(index, row)
+                row.pop('name', None)
+
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=_worker, args=(sender, self.build, name, row, options))
+                process.daemon = True
+                process.start()
+                sender.close()
+
+                attempts[index] += 1
+                running[index] = (process, receiver, time.time())
+
+            for index, (process, receiver, start) in list(running.items()):
+                result = None
+
+                # The worker may send its result and exit between a poll of
+                # the pipe and is_alive, so is_alive comes first
+                alive = process.is_alive()
+
+                if receiver.poll():
+                    try:
+                        result = receiver.recv()
+                    except EOFError:
+                        result = {'status': 'crashed', 'info': None, 'error': None}
+
+                elif not alive:
+                    result = {'status': 'crashed', 'info': None, 'error': None}
+
+                elif self.timeout is not None and time.time() - start > self.timeout:
+                    process.terminate()
+                    result = {'status': 'timeout', 'info': None,
+                              'error': 'Worker exceeded {0} s'.format(self.timeout)}
+
+                if result is None:
+                    continue
+
+                process.join()
+                receiver.close()
+                del running[index]
+
+                if result['status'] == 'crashed':
+                    result['error'] = 'Worker exited with code {0}'.format(process.exitcode)
+
+                if result['status'] in ('crashed', 'timeout') and attempts[index] <= self.retries:
+                    pending.append(index)
+                    continue
+
+                row = dict(self.table[index])
+                result['name'] = self._name(index, row)
+                row.pop('name', None)
+                result['params'] = row
+                result['attempts'] = attempts[index]
+                result['time'] = time.time() - start
+                results[index] = result
+
+            if running:
+                time.sleep(poll)
+
+        self.results = results
+
+        return results
+
+    def failed(self):
+        """ Returns the results of the variants that did not finish"""
+
+        return [result for result in self.results if result['status'] != 'ok']
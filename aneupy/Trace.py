@@ -0,0 +1,233 @@
+# =============================================================================
+#
+# Trace.py
+#
+# Instrumentation of the calls to the geometry and FE backends
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Types of the values that Instrumented returns without wrapping them
+PRIMITIVES = (type(None), bool, int, float, complex, str, bytes, tuple, list, set, frozenset)
+try:
+    PRIMITIVES += (long, unicode)
+except NameError:
+    pass
+
+# Fields of Instrumented, which are never looked up in its target
+FIELDS = ('_target', '_recorder', '_category', '_prefix', '_methods', '_objects')
+
+
+def size(value):
+    """ Rough size of an argument: the length of sequences, 1 otherwise"""
+
+    if isinstance(value, (str, bytes)) or not hasattr(value, '__len__'):
+        return 1
+
+    try:
+        return len(value)
+    except TypeError:
+        return 1
+
+
+class Recorder(object):
+    """ Record of the backend calls of a run.
+
+        Each call is kept as an event with its name, category, start time,
+        duration and the number and total size of its arguments. events can
+        be written as a Chrome trace (chrome://tracing, Perfetto) and
+        summary adds them up per call.
+
+    """
+
+    def __init__(self):
+        self.events = []
+        self.origin = time.time()
+        self.pid = os.getpid()
+
+    def record(self, name, category, start, duration, args=()):
+        self.events.append({'name': name, 'cat': category, 'ts': start - self.origin, 'dur': duration,
+                            'tid': threading.current_thread().ident,
+                            'args': {'count': len(args), 'size': sum(size(arg) for arg in args)}})
+
+    @contextmanager
+    def span(self, name, category='aneupy'):
+        """ Records the block of a with statement as an event"""
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, category, start, time.time() - start)
+
+    def call(self, function, name, category, args, kwargs):
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(name, category, start, time.time() - start, args + tuple(kwargs.values()))
+
+    def summary(self):
+        """ Returns the calls, total time (s) and total argument size of each call name"""
+
+        summary = {}
+        for event in self.events:
+            entry = summary.setdefault(event['name'], {'category': event['cat'], 'calls': 0, 'time': 0., 'size': 0})
+            entry['calls'] += 1
+            entry['time'] += event['dur']
+            entry['size'] += event['args']['size']
+
+        return summary
+
+    def chrome_trace(self):
+        """ Returns the events in the Chrome trace event format (times in us)"""
+
+        events = []
+        for event in self.events:
+            events.append({'name': event['name'], 'cat': event['cat'], 'ph': 'X', 'pid': self.pid,
+                           'tid': event['tid'], 'ts': 1.E6 * event['ts'], 'dur': 1.E6 * event['dur'],
+                           'args': event['args']})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, file):
+        with open(file, 'w') as output_file:
+            json.dump(self.chrome_trace(), output_file)
+
+
+class Instrumented(object):
+    """ Proxy that records the calls to the methods of an object.
+
+        Attributes, items and results of calls that are plain values (see
+        PRIMITIVES) are returned as they are, and other objects, as the
+        repositories and parts of an Abaqus model or the materials it
+        creates, wrapped in turn, so that their calls are recorded too,
+        named after the path to them ('rootAssembly.Instance', 'parts[].Set',
+        'Material().Density'). Wrapped objects passed to a call are
+        unwrapped. The wrapped methods and attributes are kept, so each one
+        is only built once.
+
+    """
+
+    def __init__(self, target, recorder, category, prefix=''):
+        self._target = target
+        self._recorder = recorder
+        self._category = category
+        self._prefix = prefix
+        self._methods = {}
+        self._objects = {}
+
+    def _wrap(self, value, name):
+        if isinstance(value, PRIMITIVES) or hasattr(value, '__array_interface__'):
+            return value
+
+        wrapped = self._objects.get(name)
+        if wrapped is None or wrapped._target is not value:
+            wrapped = Instrumented(value, self._recorder, self._category, name + '.')
+            if not name.endswith((']', ')')):
+                self._objects[name] = wrapped
+
+        return wrapped
+
+    def __getattr__(self, name):
+        # Only reached for the fields of the proxy before __init__, as when
+        # it is copied
+        if name in FIELDS:
+            raise AttributeError(name)
+
+        value = getattr(self._target, name)
+
+        if name.startswith('_'):
+            return value
+
+        if not callable(value):
+            return self._wrap(value, self._prefix + name)
+
+        if name not in self._methods:
+            recorder, category, label, wrap = self._recorder, self._category, self._prefix + name, self._wrap
+
+            def method(*args, **kwargs):
+                args = tuple(_unwrap(arg) for arg in args)
+                kwargs = dict((key, _unwrap(arg)) for key, arg in kwargs.items())
+                return wrap(recorder.call(value, label, category, args, kwargs), label + '()')
+
+            self._methods[name] = method
+
+        return self._methods[name]
+
+    def __getitem__(self, key):
+        return self._wrap(self._target[key], self._prefix.rstrip('.') + '[]')
+
+    def __reduce_ex__(self, protocol):
+        # Pickled, as in the cache of shapes, and copied as the target
+        return _target_of, (self._target, )
+
+    def __setitem__(self, key, value):
+        self._target[key] = _unwrap(value)
+
+    def __delitem__(self, key):
+        del self._target[key]
+
+    def __contains__(self, key):
+        return key in self._target
+
+    def __len__(self):
+        return len(self._target)
+
+    def __bool__(self):
+        return bool(self._target)
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        return iter(self._target)
+
+
+def _target_of(target):
+    return target
+
+
+def _unwrap(value):
+    """ Returns the object of an Instrumented proxy, also inside lists and tuples"""
+
+    if isinstance(value, Instrumented):
+        return value._target
+
+    if isinstance(value, (list, tuple)) and any(isinstance(item, Instrumented) for item in value):
+        return type(value)(_unwrap(item) for item in value)
+
+    return value
+
+
+@contextmanager
+def _null():
+    yield
+
+
+def span(recorder, name, category='aneupy'):
+    """ Returns recorder.span(name, category), or an empty context without recorder"""
+
+    if recorder is None:
+        return _null()
+
+    return recorder.span(name, category)
+
+
+def instrument(target, recorder, category):
+    """ Returns target wrapped to record its calls, or target itself without
+        recorder. A target that is already wrapped, as the result of a call
+        of another instrumented object, is wrapped again from its root
+    """
+
+    if recorder is None:
+        return target
+
+    return Instrumented(_unwrap(target), recorder, category)
@@ -0,0 +1,289 @@
+# =============================================================================
+#
+# Wall.py
+#
+# Wall thickness and clearance between lofted shells with NumPy
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import math
+
+import numpy as np
+
+try:
+    from aneupy import Loft, Properties
+except ImportError:
+    import Loft
+    import Properties
+
+
+class WallError(ValueError):
+    """ The inner shell of a wall crosses the outer one or is too close to it"""
+
+    def __init__(self, message, stats):
+        ValueError.__init__(self, message)
+        self.stats = stats
+
+
+def sample(knots, net, nu, nt):
+    """ Returns the points (nu, nt, 3) of a lofted surface and their unit outward normals"""
+
+    u = np.linspace(0., 1., nu)
+    theta = np.linspace(0., 2. * math.pi, nt, endpoint=False)
+
+    points = Loft.evaluate(knots, net, u, theta)
+    centers = points.mean(axis=1)
+
+    du = np.gradient(points, axis=0)
+    dt = np.roll(points, -1, axis=1) - np.roll(points, 1, axis=1)
+    normals = np.cross(du, dt)
+
+    # Away from the center of each ring
+    outward = np.sum(normals * (points - centers[:, None]), axis=-1) < 0.
+    normals[outward] *= -1.
+    normals /= np.maximum(np.linalg.norm(normals, axis=-1), 1.E-300)[..., None]
+
+    return points, normals
+
+
+class Grid(object):
+    """ Uniform grid of points for nearest neighbour queries.
+
+        The points are sorted by cell, so the candidates of all the queries
+        in the 27 cells around them are gathered with array operations.
+        Queries without candidates there, farther than cell from any point,
+        are answered by brute force.
+
+    """
+
+    def __init__(self, points, cell):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.cell = float(cell)
+
+        self.origin = self.points.min(axis=0)
+        index = np.floor((self.points - self.origin) / self.cell).astype(np.int64)
+        self.shape = index.max(axis=0) + 3
+
+        keys = self._keys(index)
+        self.order = np.argsort(keys, kind='mergesort')
+        self.keys = keys[self.order]
+
+    def _keys(self, index):
+        index = index + 1
+        return (index[..., 0] * self.shape[1] + index[..., 1]) * self.shape[2] + index[..., 2]
+
+    def nearest(self, queries, chunk=65536):
+        """ Returns the distance to and the index of the nearest point of each query"""
+
+        queries = np.asarray(queries, dtype=float).reshape(-1, 3)
+        distance = np.full(len(queries), np.inf)
+        nearest = np.zeros(len(queries), dtype=np.int64)
+
+        index = np.floor((queries - self.origin) / self.cell).astype(np.int64)
+        inside = np.all((index >= -1) & (index <= self.shape - 2), axis=-1)
+
+        offsets = np.stack(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1], indexing='ij'), axis=-1).reshape(-1, 3)
+
+        for offset in offsets:
+            cells = np.clip(index + offset, -1, self.shape - 2)
+            keys = self._keys(cells)
+            start = np.searchsorted(self.keys, keys, side='left')
+            stop = np.searchsorted(self.keys, keys, side='right')
+            count = np.where(inside, stop - start, 0)
+
+            found = np.nonzero(count)[0]
+            if not len(found):
+                continue
+            count = count[found]
+            segments = np.cumsum(count) - count
+
+            # Candidates of each query, contiguous and in query order
+            query = np.repeat(found, count)
+            position = np.arange(len(query)) - np.repeat(segments, count)
+            candidate = self.order[np.repeat(start[found], count) + position]
+
+            delta = queries[query] - self.points[candidate]
+            d = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+
+            # Keep the closest candidate of each query
+            best = np.minimum.reduceat(d, segments)
+            hit = np.nonzero(d == np.repeat(best, count))[0]
+            hit = hit[np.concatenate(([True], query[hit][1:] != query[hit][:-1]))]
+
+            closer = best < distance[found]
+            distance[found[closer]] = best[closer]
+            nearest[found[closer]] = candidate[hit][closer]
+
+        # Only a point within cell is sure to be the nearest one
+        missing = np.nonzero(distance > self.cell)[0]
+        for i0 in range(0, len(missing), max(1, chunk // len(self.points))):
+            rows = missing[i0:i0 + max(1, chunk // len(self.points))]
+            d = np.linalg.norm(queries[rows, None] - self.points[None], axis=-1)
+            nearest[rows] = d.argmin(axis=-1)
+            distance[rows] = d[np.arange(len(rows)), nearest[rows]]
+
+        return distance, nearest
+
+
+def derivatives(knots, net, u, order=2):
+    """ Returns the curves (len(u), 3, 3) of a loft (its center and the two
+        radius vectors of its rings) at the parameters u, and their first
+        order derivatives in u
+    """
+
+    knots = np.asarray(knots, dtype=float)
+    net = np.asarray(net, dtype=float)
+    degree = len(knots) - len(net) - 1
+    n = len(net)
+
+    # The k-th derivative is a spline of degree - k on knots[k:-k], whose
+    # basis is that of degree - k on all the knots without the first and
+    # last k functions
+    lower = min(order, degree)
+    bases = Loft.bspline_basis(knots, degree, u, lower=lower) if lower else [Loft.bspline_basis(knots, degree, u)]
+
+    curves = []
+    for k in range(order + 1):
+        if k > degree:
+            curves.append(np.zeros((len(u), 3, 3)))
+            continue
+
+        curves.append(np.einsum('ij,jkl->ikl', bases[-1 - k][:, k:n], net))
+
+        # Control net of the derivative, of one degree less
+        p = degree - k
+        span = knots[k + p + 1:n + p] - knots[k + 1:n]
+        net = np.where(span > 0., p / np.where(span > 0., span, 1.), 0.)[:, None, None] * (net[1:] - net[:-1])
+
+    return curves
+
+
+def project(knots, net, points, u, theta, iterations=8, tolerance=1.E-12):
+    """ Returns the closest points of a lofted surface to points, and their
+        parameters, by Newton's method from the parameters u and theta.
+
+        Where the Hessian of the squared distance is not positive definite
+        the Gauss-Newton step is taken, and at the ends of the surface,
+        where u is clamped to [0, 1], only theta is updated. Points stop
+        when their steps are below tolerance, at their last evaluated point.
+
+    """
+
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    u = np.asarray(u, dtype=float).copy()
+    theta = np.asarray(theta, dtype=float).copy()
+
+    def dot(x, y):
+        return np.einsum('ij,ij->i', x, y)
+
+    closest = np.empty_like(points)
+    active = np.arange(len(points))
+    for _ in range(iterations):
+        if not len(active):
+            break
+
+        # Points sharing a parameter, as those started from a grid, share its curves
+        values, inverse = np.unique(u[active], return_inverse=True)
+        (c, a, b), (c1, a1, b1), (c2, a2, b2) = [np.swapaxes(curve[inverse.ravel()], 0, 1)
+                                                 for curve in derivatives(knots, net, values)]
+        cos, sin = np.cos(theta[active])[:, None], np.sin(theta[active])[:, None]
+
+        closest[active] = c + cos * a + sin * b
+        r = closest[active] - points[active]
+        Su, St = c1 + cos * a1 + sin * b1, cos * b - sin * a
+        gu, gt = dot(r, Su), dot(r, St)
+
+        huu, hut, htt = dot(Su, Su), dot(Su, St), dot(St, St)
+        Huu = huu + dot(r, c2 + cos * a2 + sin * b2)
+        Hut = hut + dot(r, cos * b1 - sin * a1)
+        Htt = htt - dot(r, cos * a + sin * b)
+
+        newton = (Huu > 0.) & (Huu * Htt - Hut * Hut > 0.)
+        huu, hut, htt = np.where(newton, Huu, huu), np.where(newton, Hut, hut), np.where(newton, Htt, htt)
+        det = huu * htt - hut * hut
+        det = np.where(det > 0., det, np.inf)
+
+        step = u[active] - (htt * gu - hut * gt) / det
+        ends = (step < 0.) | (step > 1.)
+        dt = np.where(ends, gt / np.where(htt > 0., htt, np.inf), (huu * gt - hut * gu) / det)
+        du = np.clip(step, 0., 1.) - u[active]
+
+        u[active] += du
+        theta[active] -= dt
+        active = active[np.abs(du) + np.abs(dt) > tolerance]
+
+    if len(active):
+        c, a, b = np.swapaxes(derivatives(knots, net, u[active], order=0)[0], 0, 1)
+        closest[active] = c + np.cos(theta[active])[:, None] * a + np.sin(theta[active])[:, None] * b
+
+    return closest, u, theta
+
+
+def thickness(outer, inner, nu=64, nt=96, cell=None):
+    """ Computes the thickness of the wall between two shells.
+
+        Both shells are lofted from their sections and sampled on a nu x nt
+        grid. The thickness at each point of the inner shell is its distance
+        to the outer surface, negative where it lies outside of it, that is,
+        where the shells intersect. The nearest sampled point of the outer
+        shell, found in a grid, is the start of the projection on its surface
+        (see project).
+
+        Returns a dictionary with the thickness map (nu, nt), its min, mean
+        and max, the location of the min and the number of intersecting
+        points. cell is the size of the search grid, by default the larger of
+        the median spacings of the outer samples along and around the shell.
+
+    """
+
+    (outer_knots, outer_net), (inner_knots, inner_net) = Properties.loft_shells([outer, inner])
+
+    points, normals = sample(outer_knots, outer_net, nu, nt)
+    queries, _ = sample(inner_knots, inner_net, nu, nt)
+
+    if cell is None:
+        along = np.median(np.linalg.norm(np.diff(points, axis=0), axis=-1))
+        around = np.median(np.linalg.norm(points - np.roll(points, 1, axis=1), axis=-1))
+        cell = max(along, around, 1.E-12)
+
+    distance, nearest = Grid(points, cell).nearest(queries)
+
+    closest, _, _ = project(outer_knots, outer_net, queries, (nearest // nt) / (nu - 1.),
+                            (nearest % nt) * (2. * math.pi / nt))
+    offset = queries.reshape(-1, 3) - closest
+    projected = np.linalg.norm(offset, axis=-1)
+
+    # The projection can only get closer than the sampled point
+    better = projected < distance
+    distance = np.where(better, projected, distance)
+    offset = np.where(better[:, None], offset, queries.reshape(-1, 3) - points.reshape(-1, 3)[nearest])
+
+    # Outside the outer shell when beyond the tangent plane of the nearest point
+    outside = np.sum(offset * normals.reshape(-1, 3)[nearest], axis=-1) > 0.
+
+    thickness = np.where(outside, -distance, distance).reshape(nu, nt)
+    i = np.argmin(thickness)
+
+    return {'map': thickness, 'min': float(thickness.min()), 'mean': float(thickness.mean()),
+            'max': float(thickness.max()), 'location': queries.reshape(-1, 3)[i].tolist(),
+            'intersections': int(outside.sum())}
+
+
+def check(outer, inner, min_thickness=0., nu=64, nt=96):
+    """ Returns the thickness statistics of a wall, or raises WallError if it is invalid"""
+
+    stats = thickness(outer, inner, nu, nt)
+    stats.pop('map')
+
+    if stats['intersections']:
+        raise WallError('The inner shell {0} crosses the outer shell {1} at {2} points, near {3}'.format(
+            inner.name, outer.name, stats['intersections'], stats['location']), stats)
+
+    if stats['min'] < min_thickness:
+        raise WallError('The wall between {0} and {1} is {2:.4g} thick at {3}, less than {4:.4g}'.format(
+            outer.name, inner.name, stats['min'], stats['location'], min_thickness), stats)
+
+    return stats
@@ -1,3 +1,71 @@
-from Aneurysm import *
-from Geometry import *
-from Abaqus import *
+# =============================================================================
+#
+# aneupy
+#
+# Lazy loading of the aneupy modules
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import sys
+import types
+import importlib
+
+# Names exported by the package and the module that defines them. The
+# modules are only imported on first use, so that the package can be
+# imported outside SALOME and Abaqus.
+EXPORTS = {
+    'Aneurysm': 'Aneurysm',
+    'Context': 'Geometry',
+    'Domain': 'Geometry',
+    'Section': 'Geometry',
+    'Shell': 'Geometry',
+    'Solid': 'Geometry',
+    'Database': 'Abaqus',
+    'Model': 'Abaqus',
+    'Pipeline': 'Pipeline',
+    'run': 'Pipeline',
+    'extract': 'Results',
+    'Store': 'Results',
+    'Sweep': 'Sweep',
+}
+
+MODULES = ('Abaqus', 'Aneurysm', 'Cache', 'CadTable', 'Centerline', 'Export', 'Geometry', 'Graph', 'Hemodynamics',
+           'Iges', 'Index', 'Ingest', 'Inp', 'Loft', 'Materials', 'Mesh', 'Pipeline', 'Properties', 'Results',
+           'Scheduler', 'Sweep', 'Trace', 'Wall')
+
+__all__ = sorted(EXPORTS)
+
+
+def loaded():
+    """ Returns the aneupy modules imported so far"""
+
+    return sorted(name for name in MODULES if __name__ + '.' + name in sys.modules)
+
+
+class _Package(types.ModuleType):
+    """ Package module that imports submodules and exported names on first access"""
+
+    def __getattr__(self, name):
+        if name in EXPORTS:
+            value = getattr(importlib.import_module(__name__ + '.' + EXPORTS[name]), name)
+        elif name in MODULES:
+            value = importlib.import_module(__name__ + '.' + name)
+        else:
+            raise AttributeError("module '{0}' has no attribute '{1}'".format(__name__, name))
+
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(EXPORTS) | set(MODULES))
+
+
+# The original module is kept referenced, as Python 2 clears the globals of
+# the functions above when it is collected
+_package = _Package(__name__, __doc__)
+_package.__dict__.update(sys.modules[__name__].__dict__)
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
@@ -0,0 +1,14 @@
+# =============================================================================
+#
+# GEOM.py
+#
+# Stub of the SALOME GEOM module
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+FOM_Default = 0
+FOM_UseOri = 1
+FOM_AutoCorrect = 2
@@ -0,0 +1,39 @@
+# =============================================================================
+#
+# stubs
+#
+# Stub SALOME and Abaqus modules that record the calls made by aneupy
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import os
+
+PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+# Abaqus modules that are only star-imported by aneupy.Abaqus
+EMPTY = ('caeModules', 'part', 'material', 'section', 'assembly', 'step', 'interaction', 'load', 'mesh', 'job',
+         'sketch', 'visualization', 'connectorBehavior', 'regionToolset', 'odbSection')
+
+
+def install():
+    """ Puts the stub salome, GEOM and abaqus modules first in sys.path.
+
+        Must be called before importing aneupy.Geometry or aneupy.Abaqus.
+        The calls made to the study manager, the object browser and geompy
+        are counted in salome.calls, and those made to mdb in abaqus.calls.
+
+    """
+
+    import sys
+    import types
+
+    if PATH not in sys.path:
+        sys.path.insert(0, PATH)
+
+    for name in EMPTY:
+        if name not in sys.modules:
+            sys.modules[name] = types.ModuleType(name)
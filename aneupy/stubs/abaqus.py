@@ -0,0 +1,217 @@
+# =============================================================================
+#
+# abaqus.py
+#
+# Stub of the Abaqus/CAE kernel that counts the calls to mdb and session
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+from collections import Counter
+
+__all__ = ['mdb', 'session', 'Mdb']
+
+calls = Counter()
+
+
+def reset():
+    calls.clear()
+
+
+class Record(object):
+    """ Abaqus object that accepts any call.
+
+        Attributes and items are new records and calling a record counts the
+        call in calls, under the name of the attribute, and returns a new
+        record.
+
+    """
+
+    def __init__(self, _name, **kwargs):
+        self._name = _name
+        self.__dict__.update(kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        value = Record(name)
+        setattr(self, name, value)
+        return value
+
+    def __getitem__(self, key):
+        # Items by name, as the sets of an instance, but not by index, so that
+        # records are not iterable
+        if isinstance(key, int):
+            raise IndexError(key)
+        return Record(key)
+
+    def __call__(self, *args, **kwargs):
+        calls[self._name] += 1
+        return Record(self._name, **kwargs)
+
+
+class Repository(dict):
+    """ Dictionary of named objects, as mdb.models or part.sets"""
+
+    def changeKey(self, fromName, toName):
+        self[toName] = self.pop(fromName)
+
+
+class Entity(object):
+    """ Face, edge or node of a part, with its bounding box"""
+
+    def __init__(self, index, low, high=None, label=None):
+        self.index = index
+        self.low = tuple(low)
+        self.high = self.low if high is None else tuple(high)
+        self.label = label
+        self.coordinates = self.low
+
+
+class EntityArray(list):
+    """ FaceArray, EdgeArray or MeshNodeArray of a part"""
+
+    def __getitem__(self, key):
+        value = list.__getitem__(self, key)
+        return EntityArray(value) if isinstance(key, slice) else value
+
+    def __getslice__(self, i, j):
+        return self.__getitem__(slice(i, j))
+
+    def getBoundingBox(self):
+        calls['getBoundingBox'] += 1
+        return {'low': tuple(min(entity.low[i] for entity in self) for i in range(3)),
+                'high': tuple(max(entity.high[i] for entity in self) for i in range(3))}
+
+    def getClosest(self, coordinates, searchTolerance=1.E-6):
+        """ Closest entity and point of its box to each point within searchTolerance"""
+
+        calls['getClosest'] += 1
+        closest = {}
+        for k, point in enumerate(coordinates):
+            for entity in self:
+                p = tuple(min(max(point[i], entity.low[i]), entity.high[i]) for i in range(3))
+                d = sum((p[i] - point[i])**2 for i in range(3))**0.5
+                if d <= searchTolerance and (k not in closest or d < closest[k][2]):
+                    closest[k] = (entity, p, d)
+
+        return dict((k, value[:2]) for k, value in closest.items())
+
+    def getSequenceFromMask(self, mask):
+        calls['getSequenceFromMask'] += 1
+        words = [int(word, 16) for word in mask[0].strip('[]').replace('#', '').split()]
+        return EntityArray(self[i] for i in range(len(self)) if i // 32 < len(words) and words[i // 32] >> i % 32 & 1)
+
+    def sequenceFromLabels(self, labels):
+        calls['sequenceFromLabels'] += 1
+        labels = set(labels)
+        return EntityArray(entity for entity in self if entity.label in labels)
+
+
+class PartStub(Record):
+    """ Part with empty faces, edges and nodes, to be filled by the tests"""
+
+    def __init__(self, name, **kwargs):
+        Record.__init__(self, 'part', name=name, **kwargs)
+        self.sets = Repository()
+        self.surfaces = Repository()
+        self.faces = EntityArray()
+        self.edges = EntityArray()
+        self.nodes = EntityArray()
+
+    def Set(self, name, **kwargs):
+        calls['Set'] += 1
+        self.sets[name] = Record('set', name=name, **kwargs)
+        return self.sets[name]
+
+    def Surface(self, name, **kwargs):
+        calls['Surface'] += 1
+        self.surfaces[name] = Record('surface', name=name, **kwargs)
+        return self.surfaces[name]
+
+
+class ModelStub(Record):
+
+    def __init__(self, name, **kwargs):
+        Record.__init__(self, 'model', name=name, **kwargs)
+        self.parts = Repository()
+        self.materials = Repository()
+        self.sections = Repository()
+        self.steps = Repository()
+        self.rootAssembly = Record('rootAssembly', instances=Repository())
+
+    def PartFromGeometryFile(self, name, geometryFile, **kwargs):
+        calls['PartFromGeometryFile'] += 1
+        self.parts[name] = PartStub(name, geometryFile=geometryFile)
+        return self.parts[name]
+
+    def Part(self, name, objectToCopy=None, **kwargs):
+        calls['Part'] += 1
+        self.parts[name] = PartStub(name, **kwargs)
+        if objectToCopy is not None:
+            for entities in ('faces', 'edges', 'nodes'):
+                getattr(self.parts[name], entities).extend(getattr(objectToCopy, entities))
+        return self.parts[name]
+
+    def Material(self, name, **kwargs):
+        calls['Material'] += 1
+        self.materials[name] = Record('material', name=name)
+        return self.materials[name]
+
+    def copyMaterials(self, sourceModel, materialsToCopy=None):
+        calls['copyMaterials'] += 1
+        for name in (materialsToCopy or list(sourceModel.materials)):
+            self.materials[name] = sourceModel.materials[name]
+
+
+class MdbStub(object):
+
+    def __init__(self):
+        self.models = Repository()
+        self.jobs = Repository()
+
+    def Model(self, name, **kwargs):
+        calls['Model'] += 1
+        self.models[name] = ModelStub(name, **kwargs)
+        return self.models[name]
+
+    def Job(self, name, **kwargs):
+        calls['Job'] += 1
+        self.jobs[name] = Record('job', name=name, **kwargs)
+        return self.jobs[name]
+
+    def openIges(self, fileName, **kwargs):
+        calls['openIges'] += 1
+        return Record('iges', fileName=fileName)
+
+    def saveAs(self, pathName):
+        calls['saveAs'] += 1
+        with open(pathName, 'w') as output_file:
+            output_file.write('\n'.join(sorted(self.models)))
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Record(name)
+
+
+class SessionStub(object):
+
+    def __init__(self):
+        self.odbs = Repository()
+
+
+mdb = MdbStub()
+session = SessionStub()
+
+
+def Mdb():
+    """ Starts a new model database, with the default Model-1"""
+
+    calls['Mdb'] += 1
+    mdb.__init__()
+    mdb.Model('Model-1')
+    return mdb
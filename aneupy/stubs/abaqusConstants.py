@@ -0,0 +1,25 @@
+# =============================================================================
+#
+# abaqusConstants.py
+#
+# Stub of the Abaqus symbolic constants
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+NAMES = ('ON', 'OFF', 'DEFAULT', 'CFD', 'STANDARD_EXPLICIT', 'THREE_D', 'DEFORMABLE_BODY', 'ISOTROPIC',
+         'ARRUDA_BOYCE', 'MOONEY_RIVLIN', 'NEO_HOOKE', 'POLYNOMIAL', 'REDUCED_POLYNOMIAL', 'OGDEN',
+         'YEOH', 'VOLUMETRIC_DATA', 'WITHOUT_VOLUMETRIC_DATA', 'ANALYSIS', 'PERCENTAGE', 'SINGLE',
+         'FREE', 'SWEEP', 'STRUCTURED', 'HEX', 'TET', 'C3D8R', 'C3D8H', 'C3D10', 'FC3D8', 'FC3D4',
+         'STANDARD', 'EXPLICIT', 'UNSET', 'MIDDLE_SURFACE', 'FROM_SECTION', 'MISES', 'MAGNITUDE', 'TRESCA',
+         'INTEGRATION_POINT', 'NODAL', 'ELEMENT_NODAL', 'CENTROID', 'QUASI_STATIC', 'LAGGED')
+
+
+class SymbolicConstant(str):
+    pass
+
+
+for _name in NAMES:
+    globals()[_name] = SymbolicConstant(_name)
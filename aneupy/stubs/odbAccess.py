@@ -0,0 +1,179 @@
+# =============================================================================
+#
+# odbAccess.py
+#
+# Stub of the Abaqus ODB API over fields computed on the fly
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+from collections import OrderedDict
+
+import numpy as np
+
+from abaqus import calls, Repository
+
+__all__ = ['openOdb']
+
+# Odbs returned by openOdb, by path
+odbs = {}
+
+# Frames built so far, to check that readers do not keep them
+built = [0]
+
+
+def mises(s):
+    """ Von Mises stress of the components S11, S22, S33, S12, S13, S23"""
+
+    return np.sqrt(0.5 * ((s[:, 0] - s[:, 1])**2 + (s[:, 1] - s[:, 2])**2 + (s[:, 2] - s[:, 0])**2) +
+                   3. * (s[:, 3]**2 + s[:, 4]**2 + s[:, 5]**2))
+
+
+class OdbSet(object):
+    """ Node or element set, with the labels of its members and, for element
+        sets, optionally those of the nodes of its elements
+    """
+
+    def __init__(self, name, labels, nodal=False, nodes=None):
+        self.name = name
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.nodal = nodal
+        self.nodes = self.labels if nodal else np.asarray(nodes if nodes is not None else [], dtype=np.int64)
+
+
+class FieldBulkData(object):
+
+    def __init__(self, labels, data, nodal):
+        self.data = data
+        self.nodeLabels = labels if nodal else None
+        self.elementLabels = None if nodal else labels
+
+
+class FieldValue(object):
+
+    def __init__(self, label, data, nodal):
+        self.data = data
+        self.nodeLabel = label if nodal else None
+        self.elementLabel = None if nodal else label
+
+
+class FieldOutput(object):
+    """ Field output with one row of data per label, at nodes (position
+        NODAL) or at the integration points of elements (one per element)
+    """
+
+    def __init__(self, name, labels, data, nodal=False):
+        self.name = name
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.data = np.asarray(data, dtype=np.float32).reshape(len(self.labels), -1 if len(self.labels) else 1)
+        self.nodal = nodal
+        self.position = 'NODAL' if nodal else 'INTEGRATION_POINT'
+
+    def _subset(self, keep):
+        return FieldOutput(self.name, self.labels[keep], self.data[keep], self.nodal)
+
+    @property
+    def bulkDataBlocks(self):
+        if not len(self.labels):
+            return []
+        return [FieldBulkData(self.labels, self.data, self.nodal)]
+
+    @property
+    def values(self):
+        return [FieldValue(label, row, self.nodal) for label, row in zip(self.labels.tolist(), self.data)]
+
+    def getSubset(self, region=None, position=None, **kwargs):
+        """ Values of a region and position. There is no extrapolation: a
+            position other than that of the field gives no values, as does a
+            node set for an element field. An element set gives the values of
+            its nodes of a nodal field
+        """
+
+        calls['getSubset'] += 1
+        field = self
+        if position is not None and str(position) != self.position:
+            field = field._subset(np.zeros(len(self.labels), dtype=bool))
+        if region is not None:
+            if self.nodal:
+                field = field._subset(np.isin(field.labels, region.nodes))
+            elif region.nodal:
+                field = field._subset(np.zeros(len(field.labels), dtype=bool))
+            else:
+                field = field._subset(np.isin(field.labels, region.labels))
+        return field
+
+    def getScalarField(self, invariant=None, componentLabel=None):
+        calls['getScalarField'] += 1
+        if invariant == 'MISES':
+            data = mises(self.data)
+        else:
+            data = np.sqrt((self.data * self.data).sum(axis=1))
+        return FieldOutput(self.name, self.labels, data, self.nodal)
+
+
+class OdbFrame(object):
+
+    def __init__(self, frameId, frameValue, fieldOutputs):
+        built[0] += 1
+        self.frameId = frameId
+        self.frameValue = frameValue
+        self.fieldOutputs = fieldOutputs
+
+
+class FrameSequence(object):
+    """ Frames of a step, built when they are accessed"""
+
+    def __init__(self, step, count, function):
+        self.step = step
+        self.count = count
+        self.function = function
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        time, fields = self.function(self.step, index)
+        return OdbFrame(index, time, Repository(fields))
+
+
+class OdbStep(object):
+
+    def __init__(self, name, count, function, totalTime=0.):
+        self.name = name
+        self.totalTime = totalTime
+        self.frames = FrameSequence(name, count, function)
+
+
+class OdbAssembly(object):
+
+    def __init__(self):
+        self.nodeSets = Repository()
+        self.elementSets = Repository()
+        self.instances = Repository()
+
+
+class Odb(object):
+    """ ODB whose frames are computed by function(step, index), which returns
+        the time of the frame in its step and its fields as {key: FieldOutput}.
+        steps are pairs (name, count) or triples (name, count, totalTime)
+    """
+
+    def __init__(self, name, steps, function):
+        self.name = name
+        self.steps = OrderedDict((step[0], OdbStep(step[0], step[1], function, *step[2:])) for step in steps)
+        self.rootAssembly = OdbAssembly()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def openOdb(path, readOnly=True, **kwargs):
+    calls['openOdb'] += 1
+    return odbs[path]
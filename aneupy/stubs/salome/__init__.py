@@ -0,0 +1,82 @@
+# =============================================================================
+#
+# salome
+#
+# Stub of the SALOME module that counts the calls to the study and the GUI
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+from collections import Counter
+
+calls = Counter()
+
+
+def reset():
+    """ Clears the counts and closes all the studies"""
+
+    calls.clear()
+    myStudyManager.studies = []
+
+
+class StudyBuilder(object):
+
+    def RemoveObjectWithChildren(self, sobject):
+        calls['RemoveObjectWithChildren'] += 1
+
+
+class Study(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def FindObjectID(self, entry):
+        calls['FindObjectID'] += 1
+        return entry
+
+    def NewBuilder(self):
+        calls['NewBuilder'] += 1
+        return StudyBuilder()
+
+
+class StudyManager(object):
+
+    def __init__(self):
+        self.studies = []
+
+    def GetOpenStudies(self):
+        calls['GetOpenStudies'] += 1
+        return [study.name for study in self.studies]
+
+    def GetStudyByName(self, name):
+        calls['GetStudyByName'] += 1
+        for study in self.studies:
+            if study.name == name:
+                return study
+
+    def NewStudy(self, name):
+        calls['NewStudy'] += 1
+        study = Study(name)
+        self.studies.append(study)
+        return study
+
+    def Close(self, study):
+        calls['Close'] += 1
+        self.studies.remove(study)
+
+    def SaveAs(self, file, study, multifile=False):
+        calls['SaveAs'] += 1
+        with open(file, 'w') as output_file:
+            output_file.write(study.name)
+
+
+class SalomeGUI(object):
+
+    def updateObjBrowser(self, update):
+        calls['updateObjBrowser'] += 1
+
+
+myStudyManager = StudyManager()
+sg = SalomeGUI()
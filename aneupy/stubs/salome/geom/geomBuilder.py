@@ -0,0 +1,118 @@
+# =============================================================================
+#
+# geomBuilder.py
+#
+# Stub of the SALOME geomBuilder that counts the geometry kernel calls
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+import salome
+
+
+def iges(operation):
+    """ Returns a valid IGES file with a single line entity, named after operation"""
+
+    def line(data, section, number):
+        return '{0:<72}{1}{2:7d}\n'.format(data, section, number)
+
+    return ''.join([
+        line('aneupy stub ' + operation, 'S', 1),
+        line('1H,,1H;,4Hstub;', 'G', 1),
+        line('{0:8d}{1:8d}{2:8d}{2:8d}{2:8d}{2:8d}{2:8d}{2:8d}{3:8}'.format(110, 1, 0, '00000000'), 'D', 1),
+        line('{0:8d}{1:8d}{1:8d}{2:8d}{1:8d}'.format(110, 0, 1), 'D', 2),
+        line('{0:<64}{1:8d}'.format('110,0.,0.,0.,1.,1.,1.;', 1), 'P', 1),
+        line('S{0:7d}G{0:7d}D{1:7d}P{0:7d}'.format(1, 2), 'T', 1),
+    ])
+
+
+class Shape(object):
+    """ Result of a stub operation, with the operation and its arguments"""
+
+    def __init__(self, operation, args):
+        self.operation = operation
+        self.args = args
+
+
+class Folder(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class GeomBuilder(object):
+    """ geompy that records every call in salome.calls.
+
+        Construction operations return Shape objects, and the measurement
+        operations return fixed values with the layout of the real ones.
+
+    """
+
+    def __init__(self, study):
+        self.study = study
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def operation(*args, **kwargs):
+            salome.calls[name] += 1
+            return Shape(name, args)
+
+        return operation
+
+    def _count(self, name):
+        salome.calls[name] += 1
+
+    def NewFolder(self, name):
+        self._count('NewFolder')
+        return Folder(name)
+
+    def addToStudy(self, shape, name):
+        self._count('addToStudy')
+        shape.name = name
+        return '0:1:1:{0}'.format(salome.calls['addToStudy'])
+
+    def PutToFolder(self, shape, folder):
+        self._count('PutToFolder')
+
+    def BasicProperties(self, shape):
+        self._count('BasicProperties')
+        return 0., 0., 0.
+
+    def Inertia(self, shape):
+        self._count('Inertia')
+        return (0.,) * 12
+
+    def MinDistance(self, shape1, shape2):
+        self._count('MinDistance')
+        return 0.
+
+    def PointCoordinates(self, shape):
+        self._count('PointCoordinates')
+        return [0., 0., 0.]
+
+    def _export(self, name, shape, file):
+        self._count(name)
+        with open(file, 'w') as output_file:
+            output_file.write(shape.operation)
+
+    def ExportIGES(self, shape, file, theVersion='5.1'):
+        self._count('ExportIGES')
+        with open(file, 'w') as output_file:
+            output_file.write(iges(shape.operation))
+
+    def ExportBREP(self, shape, file):
+        self._export('ExportBREP', shape, file)
+
+    def ImportBREP(self, file):
+        self._count('ImportBREP')
+        with open(file) as input_file:
+            return Shape(input_file.read(), (file,))
+
+
+def New(study):
+    salome.calls['geomBuilder.New'] += 1
+    return GeomBuilder(study)
@@ -0,0 +1,121 @@
+# =============================================================================
+#
+# solver.py
+#
+# Fake Abaqus co-execution that writes the status files of a real run
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+# python -m aneupy.stubs.solver cosimulation cosimulationjob=fsi job=fluid,solid input=fluid.inp,solid.inp
+#
+# The behaviour is read from a comment of the first input file, as
+#
+#     ** fake: mode=diverge increments=10 delay=0.01
+#
+# mode is 'complete' (the default), 'diverge' (cuts back the time increment
+# and warns that the solution diverges, until too many attempts), 'fail'
+# (an error in the input), 'license' (no license available) or 'flaky'
+# (fails the first attempt and completes the next ones).
+
+import os
+import sys
+import time
+
+HEADER = ('\n SUMMARY OF JOB INFORMATION:\n'
+          ' STEP  INC ATT SEVERE EQUIL TOTAL  TOTAL      STEP       INC OF       DOF    IF\n'
+          '               DISCON ITERS ITERS  TIME/      TIME/LPF   TIME/LPF     MONITOR RIKS\n'
+          '               ITERS               FREQ\n')
+
+
+def options(inputs):
+    """ Returns the options of the fake comment of the first input file"""
+
+    values = {'mode': 'complete', 'increments': '10', 'delay': '0.01'}
+    if inputs and os.path.isfile(inputs[0]):
+        with open(inputs[0]) as input_file:
+            for line in input_file:
+                if line.startswith('** fake:'):
+                    values.update(item.split('=', 1) for item in line[8:].split())
+
+    return values['mode'], int(values['increments']), float(values['delay'])
+
+
+def write(file, text):
+    with open(file, 'a') as output_file:
+        output_file.write(text)
+
+
+def main(argv):
+    arguments = dict(argument.split('=', 1) for argument in argv if '=' in argument)
+    jobs = arguments.get('job', 'job').split(',')
+    name = arguments.get('cosimulationjob', jobs[0])
+    inputs = arguments.get('input', '').split(',')
+
+    mode, increments, delay = options(inputs)
+
+    if mode == 'flaky':
+        marker = name + '.attempt'
+        mode = 'fail' if not os.path.isfile(marker) else 'complete'
+        write(marker, 'x')
+
+    write(name + '.log', 'Abaqus JOB {0}\nAbaqus Version 6.14-2\nBegin Co-simulation\n'.format(name))
+
+    if mode == 'license':
+        write(name + '.log', 'Abaqus License Manager checked out the following licenses:\n'
+                             'License for standard is not available. Queued for license.\n'
+                             'Abaqus/Analysis exited with errors\n')
+        return 1
+
+    for job in jobs:
+        write(job + '.log', 'Abaqus JOB {0}\nBegin Analysis Input File Processor\n'.format(job))
+        write(job + '.msg', '\n   Abaqus 6.14-2                                  Date {0}\n'.format(time.ctime()))
+        write(job + '.sta', ' Abaqus/Standard 6.14-2                  DATE {0}\n'.format(time.ctime()) + HEADER)
+
+    if mode == 'fail':
+        for job in jobs:
+            write(job + '.msg', '\n ***ERROR: NODE SET INLET HAS NOT BEEN DEFINED\n')
+            write(job + '.sta', '\n THE ANALYSIS HAS NOT BEEN COMPLETED\n')
+            write(job + '.log', 'Abaqus/Analysis exited with errors\n')
+        write(name + '.log', 'Abaqus/Analysis exited with errors\n')
+        return 1
+
+    dt = 1. / increments
+    total = 0.
+
+    for increment in range(1, increments + 1):
+        time.sleep(delay)
+
+        if mode == 'diverge' and increment > increments // 2:
+            for attempt in range(1, 6):
+                dt *= 0.25
+                for job in jobs:
+                    write(job + '.sta', '  1  {0:4d}  {1:2d}U   4    12    16  {2:<10.4g} {2:<10.4g} '
+                                        '{3:<10.4g}\n'.format(increment, attempt, total, dt))
+                    write(job + '.msg', ' ***WARNING: THE SOLUTION APPEARS TO BE DIVERGING. CONVERGENCE IS JUDGED '
+                                        'UNLIKELY.\n')
+                time.sleep(delay)
+
+            for job in jobs:
+                write(job + '.msg', ' ***ERROR: TOO MANY ATTEMPTS MADE FOR THIS INCREMENT\n')
+                write(job + '.sta', '\n THE ANALYSIS HAS NOT BEEN COMPLETED\n')
+                write(job + '.log', 'Abaqus/Analysis exited with errors\n')
+            return 1
+
+        total += dt
+        for job in jobs:
+            write(job + '.sta', '  1  {0:4d}   1     0     3     3  {1:<10.4g} {1:<10.4g} {2:<10.4g}\n'.format(
+                increment, total, dt))
+
+    for job in jobs:
+        write(job + '.sta', '\n THE ANALYSIS HAS COMPLETED SUCCESSFULLY\n')
+        write(job + '.log', 'End Abaqus/Standard Analysis\nAbaqus JOB {0} COMPLETED\n'.format(job))
+    write(name + '.log', 'Abaqus JOB {0} COMPLETED\n'.format(name))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+# =============================================================================
+#
+# import_time.py
+#
+# Benchmark of the import time of aneupy in a plain interpreter
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+# python benchmarks/import_time.py [--repeat 20] [--threshold 50]
+#
+# Every statement is timed in a new interpreter, so that nothing is cached
+# between runs. The script exits with status 1 if the median time of any
+# statement exceeds its threshold (ms), or if importing the package loads a
+# backend or NumPy.
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Statement and threshold (ms) of the import time on top of the interpreter
+STATEMENTS = [
+    ('import aneupy', 20.),
+    ('import aneupy.Cache', 50.),
+    ('import aneupy.Graph', 50.),
+    ('import aneupy.Loft', 500.),
+    ('import aneupy.Geometry', 1000.),
+]
+
+# Modules that importing the package alone must not load
+HEAVY = ('salome', 'GEOM', 'abaqus', 'numpy', 'aneupy.Geometry', 'aneupy.Abaqus')
+
+SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+start = time.time()
+{statement}
+elapsed = time.time() - start
+print(json.dumps({{'time': elapsed, 'modules': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(statement, repeat):
+    times, modules = [], set()
+
+    for i in range(repeat):
+        script = SCRIPT.format(root=ROOT, statement=statement, heavy=HEAVY)
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        times.append(1000. * result['time'])
+        modules.update(result['modules'])
+
+    times.sort()
+    return times[len(times) // 2], times[0], sorted(modules)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import time of aneupy')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='threshold (ms) of all the statements, instead of the defaults')
+    args = parser.parse_args(argv)
+
+    failed = False
+
+    print('{0:<30} {1:>10} {2:>10} {3:>10}'.format('statement', 'median ms', 'min ms', 'limit ms'))
+
+    for statement, threshold in STATEMENTS:
+        threshold = args.threshold if args.threshold is not None else threshold
+
+        try:
+            median, best, modules = measure(statement, args.repeat)
+        except subprocess.CalledProcessError:
+            print('{0:<30} {1:>10}'.format(statement, 'failed'))
+            if statement == 'import aneupy':
+                failed = True
+            continue
+
+        status = ''
+        if median > threshold:
+            status, failed = 'SLOW', True
+        if statement == 'import aneupy' and modules:
+            status, failed = 'loads ' + ', '.join(modules), True
+
+        print('{0:<30} {1:>10.1f} {2:>10.1f} {3:>10.1f} {4}'.format(statement, median, best, threshold, status))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+# =============================================================================
+#
+# suite.py
+#
+# Benchmark suite of the CAD and FSI pipelines with stand-in backends
+#
+# Jacobo Diaz - jdiaz@udc.es
+# 2015
+#
+# =============================================================================
+
+# python benchmarks/suite.py [--sections 9] [--shells 2] [--variants 20] [--update]
+#
+# The scenarios are the scripts of test/ scaled to N sections per shell, M
+# shells and K variants. SALOME and Abaqus are replaced by the recording stubs
+# of aneupy.stubs, so the times measure the overhead of aneupy itself, and
+# the call counts how much work it asks from the kernels. The numpy backend
+# runs the real computation.
+#
+# Results are compared with benchmarks/baselines.json: a scenario regresses
+# when its median time exceeds the baseline times the time threshold (and
+# by more than the slack, in s, so that runs of a few ms are not flagged by
+# noise), or when it makes more kernel calls than the baseline. --update writes the
+# current results as the new baselines.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aneupy import stubs
+stubs.install()
+
+import salome
+import abaqus
+from aneupy import Geometry, Abaqus, Mesh, Materials
+from aneupy.stubs.abaqus import Entity
+from salome.geom import geomBuilder
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# Profile of the sac of aneurysm_1_CAD.py: height and radius of the outer wall
+PROFILE_Z = [0., 10., 20., 30., 50., 70., 80., 90., 100.]
+PROFILE_R = [5., 5., 5., 7., 12.5, 7., 5., 5., 5.]
+
+
+def interpolate(x, xs, ys):
+    for i in range(1, len(xs)):
+        if x <= xs[i]:
+            t = (x - xs[i - 1]) / (xs[i] - xs[i - 1])
+            return ys[i - 1] + t * (ys[i] - ys[i - 1])
+    return ys[-1]
+
+
+def aneurysm_1(d, directory, sections=9, shells=2, scale=1.):
+    """ aneurysm_1_CAD.py with sections per shell and concentric shells.
+
+        Each shell gives a solid, and each pair of consecutive solids a cut,
+        the wall between them.
+
+    """
+
+    for k in range(shells):
+        names = []
+        for i in range(sections):
+            z = 100. * i / (sections - 1)
+            name = 's{0}_{1}'.format(k, i)
+            d.add_section(name=name, origin=[0., 4. * interpolate(z, [0., 50., 100.], [0., 1., 0.]), z])
+            d.sections[name].add_circle(radius=scale * (1. - 0.05 * k) * interpolate(z, PROFILE_Z, PROFILE_R))
+            names.append(name)
+
+        d.add_shell(name='shell_{0}'.format(k), sections=names, minBSplineDegree=10, maxBSplineDegree=20,
+                    approximation=True)
+        d.add_solid_from_shell(name='solid_{0}'.format(k), shell='shell_{0}'.format(k))
+
+    for k in range(0, shells - 1, 2):
+        d.add_solid_from_cut(name='wall_{0}'.format(k), solids=['solid_{0}'.format(k), 'solid_{0}'.format(k + 1)])
+
+    if d.backend == 'salome':
+        for k in range(0, shells - 1, 2):
+            d.export_iges(solid='wall_{0}'.format(k), file=os.path.join(directory, 'wall_{0}.iges'.format(k)))
+        d.export_iges(solid='solid_{0}'.format(shells - 1), file=os.path.join(directory, 'fluid.iges'))
+    else:
+        d.export_stl('solid_{0}'.format(shells - 1), os.path.join(directory, 'fluid.stl'))
+
+    d.save(file=os.path.join(directory, 'aneurysm_1'), method='batch')
+
+
+def aneurysm_2(d, directory, sections=5):
+    """ aneurysm_2_CAD.py, a bent tube, with sections along the same path"""
+
+    path = [[0., 0., 0.], [0., 0., 50.], [50., 0., 60.], [100., 0., 60.], [120., 30., 80.]]
+    radii = [5., 4., 4., 6., 5.]
+    rotations = [None, None, ('rotateY', 90.), ('rotateY', 90.), ('rotateX', 90.)]
+
+    names = []
+    for i in range(sections):
+        t = 4. * i / (sections - 1)
+        j = min(int(t), 3)
+        u = t - j
+        origin = [(1. - u) * a + u * b for a, b in zip(path[j], path[j + 1])]
+        name = 's{0}'.format(i)
+        d.add_section(name=name, origin=origin)
+        d.sections[name].add_circle(radius=(1. - u) * radii[j] + u * radii[j + 1])
+        rotation = rotations[j + 1] if u > 0.5 else rotations[j]
+        if rotation is not None:
+            getattr(d.sections[name], rotation[0])(angle=rotation[1])
+        names.append(name)
+
+    d.add_shell(name='aneurysm_2', sections=names)
+    d.add_solid_from_shell(name='aneurysm_2', shell='aneurysm_2')
+
+    if d.backend == 'salome':
+        d.export_iges(solid='aneurysm_2', file=os.path.join(directory, 'aneurysm_2.iges'))
+
+    d.save(file=os.path.join(directory, 'aneurysm_2'), method='batch')
+
+
+def aneurysm_1_fsi(directory, shells=2):
+    """ The working part of aneurysm_1_FSI.py, with the parts of all the walls"""
+
+    db = Abaqus.Database()
+
+    f = Abaqus.Model('aneurysm_fluid', cfd=True)
+    s = Abaqus.Model('aneurysm_solid')
+
+    for k in range(0, shells - 1, 2):
+        f.part_from_iges(os.path.join(directory, 'wall_{0}.iges'.format(k)))
+        s.part_from_iges(os.path.join(directory, 'wall_{0}.iges'.format(k)))
+    f.part_from_iges(os.path.join(directory, 'fluid.iges'))
+
+    f.create_assembly()
+    s.create_assembly()
+
+    db.save(file=os.path.join(directory, 'aneurysm.cae'))
+
+
+def fsi_selection(directory, sections=9):
+    """ Sets and surfaces of a wall part selected by coordinates.
+
+        The faces and nodes of the stub part are the quads and nodes of a
+        hexahedral wall mesh of aneurysm_1, and the outer surface is selected
+        from the points of the lumen.
+
+    """
+
+    d = Geometry.Domain(backend='numpy')
+    aneurysm_1(d, directory, sections, 2)
+    lumen, wall = Mesh.vessel(d.shells['shell_1'], d.shells['shell_0'], nu=4 * sections, nt=64, nr=4, nw=2)
+
+    with open(os.path.join(directory, 'wall.iges'), 'w') as output_file:
+        output_file.write(geomBuilder.iges('wall'))
+
+    Abaqus.Database()
+    s = Abaqus.Model('aneurysm_solid')
+    s.part_from_iges(os.path.join(directory, 'wall.iges'))
+    part = s.model.parts['wall']
+
+    quads = wall.nodes[wall.elements[:, [0, 1, 2, 3]]]
+    part.faces.extend(Entity(i, box_low, box_high) for i, (box_low, box_high) in
+                      enumerate(zip(quads.min(axis=1).tolist(), quads.max(axis=1).tolist())))
+    part.nodes.extend(Entity(i, point, label=i + 1) for i, point in enumerate(wall.nodes.tolist()))
+
+    s.create_surface('inner', 'wall', coord=lumen.nodes[lumen.nsets['inlet']], radius=0.5)
+    s.create_set('inlet', 'wall', 'node', plane=([0., 0., 0.], [0., 0., 1.]))
+    s.create_set('outlet', 'wall', 'node', plane=([0., 0., 100.], [0., 0., 1.]))
+
+
+def fsi_materials(directory, specimens=200, models=4):
+    """ Arruda-Boyce walls fitted to the uniaxial tests of all the specimens
+        at once and added to several solid models, with their sections
+    """
+
+    k = np.arange(specimens)
+    stretch = np.linspace(1., 1.8, 40) + np.zeros((specimens, 1))
+    parameters = np.array([0.1 + 0.4 * (k % 7) / 6., 1.5 + 4.5 * (k % 11) / 10.]).T
+    stress = Materials.uniaxial('arruda_boyce', stretch, parameters)
+
+    library = Materials.Library(os.path.join(directory, 'materials.json'))
+    names = library.add_fit(['wall_{0}'.format(i) for i in k], Materials.fit(stretch, stress), density=1100.)
+    library.save()
+
+    Abaqus.Database(library=library)
+    for m in range(models):
+        s = Abaqus.Model('aneurysm_solid_{0}'.format(m))
+        for name in names[:10]:
+            s.add_section(name, name)
+
+
+def scenarios(sections, shells, variants):
+    """ Returns the scenarios as name -> function(directory)"""
+
+    def cad(backend, **kwargs):
+        return lambda directory: aneurysm_1(Geometry.Domain(backend=backend, **kwargs), directory, sections, shells)
+
+    def bent(backend, **kwargs):
+        return lambda directory: aneurysm_2(Geometry.Domain(backend=backend, **kwargs), directory, sections)
+
+    def fsi(directory):
+        aneurysm_1(Geometry.Domain(headless=True), directory, sections, shells)
+        aneurysm_1_fsi(directory, shells)
+
+    def sweep(directory):
+        for k in range(variants):
+            d = Geometry.Domain(backend='numpy')
+            aneurysm_1(d, directory, sections, shells, scale=1. + 0.01 * k)
+
+    return [
+        ('aneurysm_1_salome', cad('salome')),
+        ('aneurysm_1_salome_headless', cad('salome', headless=True)),
+        ('aneurysm_1_numpy', cad('numpy')),
+        ('aneurysm_2_salome', bent('salome')),
+        ('aneurysm_2_numpy', bent('numpy')),
+        ('aneurysm_1_fsi', fsi),
+        ('aneurysm_1_numpy_sweep', sweep),
+        ('fsi_selection', lambda directory: fsi_selection(directory, sections)),
+        ('fsi_materials', lambda directory: fsi_materials(directory, 10 * variants)),
+    ]
+
+
+def measure(function, repeat):
+    """ Returns the median time and the kernel calls of the last run"""
+
+    times = []
+    for i in range(repeat):
+        directory = tempfile.mkdtemp()
+        salome.reset()
+        abaqus.reset()
+        try:
+            start = time.time()
+            function(directory)
+            times.append(time.time() - start)
+        finally:
+            shutil.rmtree(directory)
+
+    calls = dict(salome.calls)
+    calls.update(abaqus.calls)
+
+    times.sort()
+    return {'time': times[len(times) // 2], 'calls': sum(calls.values()), 'detail': calls}
+
+
+def compare(result, baseline, threshold, slack):
+    """ Returns the list of regressions of a result against its baseline"""
+
+    regressions = []
+    if result['time'] > threshold * baseline['time'] and result['time'] > baseline['time'] + slack:
+        regressions.append('time {0:.4f} s > {1:.1f} x {2:.4f} s'.format(result['time'], threshold, baseline['time']))
+    if result['calls'] > baseline['calls']:
+        regressions.append('calls {0} > {1}'.format(result['calls'], baseline['calls']))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='aneupy benchmark suite')
+    parser.add_argument('--sections', type=int, default=9, help='sections per shell (N)')
+    parser.add_argument('--shells', type=int, default=2, help='concentric shells (M)')
+    parser.add_argument('--variants', type=int, default=20, help='variants of the sweep (K)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=None, help='allowed time ratio over the baseline')
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--only', default=None, help='run only the scenarios that contain this text')
+    parser.add_argument('--update', action='store_true', help='store the results as the new baselines')
+    args = parser.parse_args(argv)
+
+    if os.path.isfile(args.baselines):
+        with open(args.baselines) as input_file:
+            baselines = json.load(input_file)
+    else:
+        baselines = {'threshold': 1.5, 'slack': 0.005, 'scenarios': {}}
+
+    threshold = args.threshold or baselines.get('threshold', 1.5)
+    slack = baselines.get('slack', 0.005)
+    scale = 'N{0}_M{1}_K{2}'.format(args.sections, args.shells, args.variants)
+    stored = baselines['scenarios'].setdefault(scale, {})
+
+    failed = False
+
+    print('{0:<30} {1:>10} {2:>10} {3:>8}'.format('scenario ' + scale, 'time s', 'baseline', 'calls'))
+
+    for name, function in scenarios(args.sections, args.shells, args.variants):
+        if args.only and args.only not in name:
+            continue
+
+        result = measure(function, args.repeat)
+        baseline = stored.get(name)
+
+        regressions = compare(result, baseline, threshold, slack) if baseline and not args.update else []
+        failed = failed or bool(regressions)
+
+        print('{0:<30} {1:>10.4f} {2:>10} {3:>8} {4}'.format(
+            name, result['time'], '{0:.4f}'.format(baseline['time']) if baseline else '-', result['calls'],
+            '; '.join(regressions)))
+
+        if args.update:
+            stored[name] = result
+
+    if args.update:
+        with open(args.baselines, 'w') as output_file:
+            json.dump(baselines, output_file, indent=2, sort_keys=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,7 +6,8 @@ def readme():
 
 setup(name='aneupy',
       version='0.1',
-      packages=['aneupy'],
+      packages=['aneupy', 'aneupy.stubs'],
+      package_data={'aneupy.stubs': ['salome/*.py', 'salome/geom/*.py']},
       description='Python code for simulating Abdominal Aorta Aneurysms in Abaqus/CAE',
       long_description=readme(),
       url='https://github.com/UDC-GME/aneupy',
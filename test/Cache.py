@@ -0,0 +1 @@
+aneupy/Cache.py
\ No newline at end of file
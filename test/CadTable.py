@@ -0,0 +1 @@
+aneupy/CadTable.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Centerline.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Export.py
\ No newline at end of file
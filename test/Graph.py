@@ -0,0 +1 @@
+aneupy/Graph.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Hemodynamics.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Iges.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Index.py
\ No newline at end of file
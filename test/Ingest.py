@@ -0,0 +1 @@
+aneupy/Ingest.py
\ No newline at end of file
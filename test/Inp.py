@@ -0,0 +1 @@
+aneupy/Inp.py
\ No newline at end of file
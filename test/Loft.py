@@ -0,0 +1 @@
+aneupy/Loft.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Materials.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Mesh.py
\ No newline at end of file
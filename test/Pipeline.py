@@ -0,0 +1 @@
+aneupy/Pipeline.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Properties.py
\ No newline at end of file
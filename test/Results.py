@@ -0,0 +1 @@
+aneupy/Results.py
\ No newline at end of file
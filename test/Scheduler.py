@@ -0,0 +1 @@
+aneupy/Scheduler.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Sweep.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Trace.py
\ No newline at end of file
@@ -0,0 +1 @@
+aneupy/Wall.py
\ No newline at end of file
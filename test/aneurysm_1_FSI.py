@@ -2,6 +2,9 @@
 # import os ; os.chdir(r"/home/jdiaz/Dropbox/code/aneupy/test") ; execfile(r"aneurysm_1_CAD.py")
 # import os ; os.chdir("/home/jdiaz/aneupy/test") ; execfile(r"aneurysm_1_CAD.py")
 
+import os
+import json
+from abaqusConstants import *
 import Abaqus
 aneupy = reload(Abaqus)
 # -----------------------------------------------------------------------------
@@ -16,44 +19,57 @@ f = aneupy.Model('aneurysm_fluid', cfd=True)
 s = aneupy.Model('aneurysm_solid')
 
 f.part_from_iges('aneurysm_fluid.iges')
-f.part_from_iges('aneurysm_solid.iges')
 s.part_from_iges('aneurysm_solid.iges')
 
-f.create_set(name='outer_surface', coord=, entity_type=face|edge)
-f.create_surface(name='outer_surface', coord=, entity_type=face|edge)
-f.create_set(name='front_face')
-f.create_set(name='end_face')
-
-f.add_material('water', density=1000., viscosity=1.E-3)
-f.add_material('blood', E=10, nu=.3)
+# Inlet, outlet and the interface of both models, the outer surface of the
+# lumen and the inner one of the wall, found from a point of it (the wall is
+# 0.5 thick)
+for model, part in ((f, 'aneurysm_fluid'), (s, 'aneurysm_solid')):
+    model.create_set(name='interface', part=part, coord=[[4.5, 0., 10.]], radius=0.1, entity_type='face')
+    model.create_surface(name='interface', part=part, coord=[[4.5, 0., 10.]], radius=0.1, entity_type='face')
+    model.create_set(name='front_face', part=part, plane=([0., 0., 0.], [0., 0., 1.]))
+    model.create_set(name='end_face', part=part, plane=([0., 0., 100.], [0., 0., 1.]))
+
+# The fluid model only takes the density and viscosity of its materials
+f.add_material('blood')
 s.add_material('flesh', E=20, nu=.3)
 
-f.add_section(name='fluid', material='water')
+f.add_section(name='fluid', material='blood')
+s.add_section(name='wall', material='flesh')
 
-f.assign_section(section='fluid', set|surface)
+for model, part, section in ((f, 'aneurysm_fluid', 'fluid'), (s, 'aneurysm_solid', 'wall')):
+    p = model.parts[part]
+    p.SectionAssignment(region=p.Set(name='all', cells=p.cells), sectionName=section)
+    p.setMeshControls(regions=p.cells, elemShape=TET, technique=FREE)
+    p.seedPart(size=1., deviationFactor=0.1, minSizeFactor=0.1)
+    p.generateMesh()
+    model.invalidate(part)
 
 f.create_assembly()
 s.create_assembly()
 
-f.add_global_seed
-f.add_local_seed(set|surface, elements, space, ...)
-
-f.create_mesh()
-
-f.add_step(name='fluid')
+fluid = f.instances['aneurysm_fluid']
+solid = s.instances['aneurysm_solid']
 
-f.create_load
-f.create_BC
+f.model.FlowStep(name='fluid', previous='Initial', timePeriod=0.8, timeIncrement=1.E-3)
+s.model.ImplicitDynamicsStep(name='solid', previous='Initial', timePeriod=0.8, application=QUASI_STATIC,
+                             initialInc=1.E-3, minInc=1.E-8, maxInc=1.E-3, nlgeom=ON)
 
-# Hacer el field and history output request
+f.model.VelocityBC(name='inlet', createStepName='fluid', region=fluid.sets['front_face'], v1=0., v2=0., v3=100.)
+f.model.FluidInletOutletBC(name='outlet', createStepName='fluid', region=fluid.sets['end_face'], pressure=0.)
+s.model.EncastreBC(name='inlet', createStepName='Initial', region=solid.sets['front_face'])
+s.model.EncastreBC(name='outlet', createStepName='Initial', region=solid.sets['end_face'])
 
-# PRobar si cambiando las coordenadas del iges se cambia la posición en el assembly
+# Co-simulation of the interface in each model
+f.model.FluidStructureCosimulation(name='interface', createStepName='fluid', region=fluid.surfaces['interface'],
+                                   incrementation=LAGGED, stepSize=1.E-3, stepSizeDefinition=DEFAULT)
+s.model.FluidStructureCosimulation(name='interface', createStepName='solid', region=solid.surfaces['interface'],
+                                   incrementation=LAGGED, stepSize=1.E-3, stepSizeDefinition=DEFAULT)
 
-# 3. Optionally, ensure matching nodes at the interface regions.
-# 4. In each model, create a co-simulation interaction to specify the interface region and coupling schemes.
-# 5. Create a co-execution to identify the two models involved and specify the job parameters for each analysis.
-# 6. Submit the co-execution to perform the co-simulation.
-# 7. View the results of the co-simulation using overlay plots.
+db.save(file='aneurysm.cae')
 
+# Only the input files of the co-execution are written, aneurysm_1_JOB.py
+# runs it. cpus is a parameter of the cae stage of aneurysm_1_PIPELINE.py
+params = json.loads(os.environ.get('ANEUPY_PARAMS', '{}'))
 
-db.save(file='aneurysm.cae')
+coexecution = db.coexecution('aneurysm', f, s, cpus=params.get('cpus', 2))
@@ -0,0 +1,161 @@
+# Testing ---------------------------------------------------------------------
+# import os ; os.chdir("/home/jdiaz/aneupy/test") ; execfile(r"aneurysm_1_INP.py")
+# python aneurysm_1_INP.py [--update]
+
+import os
+import sys
+import filecmp
+
+import numpy as np
+
+import Inp
+# -----------------------------------------------------------------------------
+
+# Writes the solid and fluid decks of a coarse straight vessel and compares
+# them with the golden files in golden/. --update rewrites the golden files.
+# The decks of a unit cube are also compared, keyword by keyword and value by
+# value, with the ones in golden/hand/, written by hand from the Abaqus
+# Keywords Reference, which --update does not touch.
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+
+def tube(r_in, r_out, length, nt=8, nr=1, nz=2):
+    """ Hexahedral mesh of a tube: nodes (n, 3) and C3D8 connectivity (m, 8)"""
+
+    r = np.linspace(r_in, r_out, nr + 1)
+    t = np.linspace(0., 2. * np.pi, nt, endpoint=False)
+    z = np.linspace(0., length, nz + 1)
+    Z, R, T = np.meshgrid(z, r, t, indexing='ij')
+    nodes = np.round(np.stack((R * np.cos(T), R * np.sin(T), Z), axis=-1).reshape(-1, 3), 6)
+
+    index = np.arange(len(nodes)).reshape(nz + 1, nr + 1, nt)
+    k, i, j = np.meshgrid(np.arange(nz), np.arange(nr), np.arange(nt), indexing='ij')
+    jn = (j + 1) % nt
+    bottom = [index[k, i, j], index[k, i + 1, j], index[k, i + 1, jn], index[k, i, jn]]
+    top = [index[k + 1, i, j], index[k + 1, i + 1, j], index[k + 1, i + 1, jn], index[k + 1, i, jn]]
+
+    return nodes, np.stack(bottom + top, axis=-1).reshape(-1, 8), index
+
+
+def cube():
+    """ Unit cube as one hexahedron, with its z=0 and z=1 nodes"""
+
+    nodes = [(0., 0., 0.), (1., 0., 0.), (1., 1., 0.), (0., 1., 0.),
+             (0., 0., 1.), (1., 0., 1.), (1., 1., 1.), (0., 1., 1.)]
+
+    return np.array(nodes), np.arange(8).reshape(1, 8), np.arange(4), np.arange(4, 8)
+
+
+def solid_deck(name='aneurysm_solid', heading='Wall of a straight vessel', mesh=None):
+    """ Deck of the wall, of a tube or of mesh (nodes, elements, inlet, outlet)
+        with its inner surface on the faces S6
+    """
+
+    if mesh is None:
+        nodes, elements, index = tube(4.5, 5., 20.)
+        mesh = nodes, elements, index[0].ravel(), index[-1].ravel()
+    nodes, elements, inlet, outlet = mesh
+
+    deck = Inp.Deck(name, heading)
+    node_labels, element_labels = deck.add_mesh(nodes, elements, 'C3D8R', elset='wall')
+
+    deck.add_nset('inlet', node_labels[inlet])
+    deck.add_nset('outlet', node_labels[outlet])
+    deck.add_surface('inner', element_labels, 6)
+
+    deck.add_material('flesh', density=1.1E-9, hyperelastic=('mooney_rivlin', [(0.174, 1.88, 0.)]))
+    deck.add_section('wall', 'flesh')
+    deck.add_cosimulation_controls('fsi', 1.E-3)
+
+    step = deck.add_step('pulse', 'Dynamic', 'application=QUASI-STATIC', (1.E-3, 0.8, 1.E-8, 1.E-3))
+    step.add_boundary('inlet', 1, 3)
+    step.add_boundary('outlet', 1, 3)
+    step.add_cosimulation('fsi', 'fsi', {'inner': 'U'}, {'inner': 'CF'})
+
+    return deck
+
+
+def fluid_deck(name='aneurysm_fluid', heading='Lumen of a straight vessel', mesh=None, wall=None):
+    """ Deck of the lumen, of a tube or of mesh (nodes, elements, inlet) with
+        its wall surface on the faces S4 of the elements wall
+    """
+
+    if mesh is None:
+        # An annulus around a thin core is enough to check the format
+        nodes, elements, index = tube(0.5, 4.5, 20., nr=2)
+        mesh = nodes, elements, index[0].ravel()
+        wall = np.arange(len(elements)).reshape(2, 2, 8)[:, 1].ravel()
+    nodes, elements, inlet = mesh
+
+    deck = Inp.Deck(name, heading)
+    node_labels, element_labels = deck.add_mesh(nodes, elements, 'FC3D8', elset='lumen')
+
+    deck.add_nset('inlet', node_labels[inlet])
+    deck.add_surface('wall', element_labels[wall], 4)
+
+    deck.add_material('blood', density=1.06E-9, viscosity=3.5E-9)
+    deck.add_section('lumen', 'blood', fluid=True)
+    deck.add_cosimulation_controls('fsi', 1.E-3)
+
+    step = deck.add_step('pulse', 'CFD', 'INCOMPRESSIBLE NAVIER STOKES, INCREMENTATION=FIXED', (1.E-3, 0.8),
+                         nlgeom=False)
+    step.add_boundary('inlet', 3, 3, 100.)
+    step.add_cosimulation('fsi', 'fsi', {'wall': 'CF'}, {'wall': 'U'})
+
+    return deck
+
+
+def keywords(file):
+    """ Keywords of a deck, without comments, as (keyword, options, values),
+        with the values as numbers and the sets listed label by label
+    """
+
+    def value(text):
+        try:
+            return float(text)
+        except ValueError:
+            return ' '.join(text.lower().split())
+
+    result = []
+    with open(file) as input_file:
+        for line in input_file:
+            if line.startswith('**') or not line.strip():
+                continue
+            items = [value(item) for item in line.strip().split(',')]
+            if line.startswith('*'):
+                result.append([items[0], sorted(item.replace(' ', '') for item in items[1:]), []])
+            else:
+                result[-1][2].append(items)
+
+    for entry in result:
+        if entry[0] in ('*nset', '*elset'):
+            rows = entry[2]
+            if 'generate' in entry[1]:
+                entry[1].remove('generate')
+                rows = [range(int(row[0]), int(row[1]) + 1, int(row[2] if len(row) > 2 else 1)) for row in rows]
+            entry[2] = [float(label) for row in rows for label in row]
+
+    return result
+
+
+if __name__ == '__main__':
+    update = '--update' in sys.argv
+
+    for deck in (solid_deck(), fluid_deck()):
+        golden = os.path.join(GOLDEN, deck.name + '.inp')
+        if update:
+            deck.write(golden)
+            print('{0}: updated'.format(deck.name))
+        else:
+            output = deck.name + '.inp'
+            deck.write(output)
+            print('{0}: {1}'.format(deck.name, 'ok' if filecmp.cmp(output, golden, shallow=False) else 'DIFFERENT'))
+
+    nodes, elements, bottom, top = cube()
+    for deck in (solid_deck('cube_solid', 'Unit cube of wall', (nodes, elements, bottom, top)),
+                 fluid_deck('cube_fluid', 'Unit cube of lumen', (nodes, elements, bottom), [0])):
+        output = deck.name + '.inp'
+        deck.write(output)
+        same = keywords(output) == keywords(os.path.join(GOLDEN, 'hand', deck.name + '.inp'))
+        print('{0}: {1}'.format(deck.name, 'ok' if same else 'DIFFERENT'))
@@ -0,0 +1,39 @@
+# Testing ---------------------------------------------------------------------
+# import os ; os.chdir("/home/jdiaz/aneupy/test") ; execfile(r"aneurysm_1_JOB.py")
+# python aneurysm_1_JOB.py [--fake]
+
+import os
+import sys
+import Scheduler
+aneupy = reload(Scheduler)
+# -----------------------------------------------------------------------------
+
+# Production ------------------------------------------------------------------
+# import aneupy
+# -----------------------------------------------------------------------------
+
+# Runs the co-execution whose input files aneurysm_1_FSI.py writes, with a
+# retry after a failure or a lost license, and prints its progress. --fake
+# runs the fake solver of aneupy.stubs instead of Abaqus, which only needs
+# the input files to exist (its behaviour is set by a '** fake:' comment in
+# the first one, see aneupy/stubs/solver.py).
+
+inputs = {'aneurysm_aneurysm_fluid': 'aneurysm_aneurysm_fluid.inp',
+          'aneurysm_aneurysm_solid': 'aneurysm_aneurysm_solid.inp'}
+
+if '--fake' in sys.argv:
+    solver = [sys.executable, '-m', 'aneupy.stubs.solver']
+else:
+    solver = 'abaqus'
+
+
+def progress(job, status):
+    print('{0}: {1}'.format(job.name, status.progress()))
+
+
+scheduler = aneupy.Scheduler(solver=solver, jobs=1, tokens=12, retries=1, max_cutbacks=5)
+scheduler.add(aneupy.Job('aneurysm', inputs, directory=os.getcwd(), cpus=2))
+
+for result in scheduler.run(poll=1., callback=progress):
+    print('{0}: {1} after {2} attempts, {3:.1f} s'.format(result['name'], result['status'], result['attempts'],
+                                                          result['time']))
@@ -0,0 +1,26 @@
+# Testing ---------------------------------------------------------------------
+# import os ; os.chdir("/home/jdiaz/aneupy/test") ; execfile(r"aneurysm_1_ODB.py")
+# abaqus python aneurysm_1_ODB.py
+
+import Results
+aneupy = reload(Results)
+# -----------------------------------------------------------------------------
+
+# Production ------------------------------------------------------------------
+# import aneupy
+# -----------------------------------------------------------------------------
+
+# Wall stress at the integration points and displacement at the nodes of the
+# inner surface of the solid model of aneurysm_1_FSI.py, frame by frame, into
+# results/. The stores are read back with Results.Store.open.
+
+summary = aneupy.extract('aneurysm_aneurysm_solid.odb', 'results',
+                         {'stress': {'key': 'S', 'invariant': 'MISES', 'position': 'INTEGRATION_POINT'},
+                          'displacement': {'key': 'U', 'invariant': 'MAGNITUDE', 'position': 'NODAL'}},
+                         region_name='ANEURYSM_SOLID-1.INNER')
+
+for name in sorted(summary):
+    print('{0}: peak {1:.4g} at label {2}, t = {3:.4g}'.format(name, summary[name]['peak'], summary[name]['label'],
+                                                                summary[name]['time']))
+
+stress, labels, meta = aneupy.Store.open('results', 'stress')
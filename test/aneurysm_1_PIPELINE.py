@@ -0,0 +1,45 @@
+# Testing ---------------------------------------------------------------------
+# import os ; os.chdir("/home/jdiaz/aneupy/test") ; execfile(r"aneurysm_1_PIPELINE.py")
+# python aneurysm_1_PIPELINE.py
+
+import os
+import Pipeline
+import Scheduler
+aneupy = reload(Pipeline)
+# -----------------------------------------------------------------------------
+
+# Production ------------------------------------------------------------------
+# import aneupy
+# -----------------------------------------------------------------------------
+
+# CAD in SALOME, CAE in Abaqus and the co-execution of aneurysm_1, for two
+# cpus counts, each in its own directory. Run it again after a crash or after
+# editing a script: only the stages whose inputs or parameters changed run
+# again.
+
+cad_script = os.path.abspath('aneurysm_1_CAD.py')
+fsi_script = os.path.abspath('aneurysm_1_FSI.py')
+
+iges = ['aneurysm_solid.iges', 'aneurysm_fluid.iges']
+inputs = {'aneurysm_aneurysm_fluid': 'aneurysm_aneurysm_fluid.inp',
+          'aneurysm_aneurysm_solid': 'aneurysm_aneurysm_solid.inp'}
+
+pipelines = []
+for cpus in (2, 4):
+    name = 'aneurysm_1_cpus{0}'.format(cpus)
+    if not os.path.isdir(name):
+        os.makedirs(name)
+    p = aneupy.Pipeline(name, directory=name)
+
+    p.add_stage('cad', ['runSalome', '-t', '-u', cad_script], inputs=[cad_script],
+                outputs=iges + ['aneurysm_1.hdf', 'aneurysm_1.cad'])
+    p.add_stage('cae', ['abaqus', 'cae', 'noGUI=' + fsi_script], inputs=iges + [fsi_script],
+                outputs=['aneurysm.cae'] + sorted(inputs.values()), params={'cpus': cpus})
+    p.add_stage('job', Scheduler.Job('aneurysm', inputs, cpus=cpus).command('abaqus'),
+                inputs=sorted(inputs.values()), outputs=[job + '.odb' for job in sorted(inputs)],
+                timeout=24 * 3600)
+
+    print('{0}: {1}'.format(p.name, p.status()))
+    pipelines.append(p)
+
+results = aneupy.run(pipelines, processes=2)
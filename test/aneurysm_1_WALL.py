@@ -0,0 +1,52 @@
+# Testing ---------------------------------------------------------------------
+# import os ; os.chdir("/home/jdiaz/aneupy/test") ; execfile(r"aneurysm_1_WALL.py")
+# python aneurysm_1_WALL.py
+
+import math
+
+import numpy as np
+
+import Geometry
+import Wall
+# -----------------------------------------------------------------------------
+
+# Thickness of the walls between coaxial cylinders and cones, against their
+# analytic values. The inner shells are shorter than the outer ones, so that
+# their samples fall between the rings of samples of the outer shells.
+
+d = Geometry.Domain(backend='numpy')
+
+
+def cone(name, radius, slope, start, stop, n=9):
+    """ Shell of the cone of radius + slope z, from z=start to z=stop"""
+
+    names = []
+    for i, z in enumerate(np.linspace(start, stop, n)):
+        section = '{0}_{1}'.format(name, i)
+        d.add_section(name=section, origin=[0., 0., z])
+        d.sections[section].add_circle(radius=radius + slope * z)
+        names.append(section)
+
+    d.add_shell(name=name, sections=names)
+
+    return d.shells[name]
+
+
+for name, slope in (('cylinder', 0.), ('cone', 0.05)):
+    outer = cone(name + '_outer', 5., slope, 0., 100.)
+    inner = cone(name + '_inner', 4.75, slope, 5., 95.)
+
+    # Distance between the lines of the cones in a plane of the axis
+    expected = 0.25 / math.sqrt(1. + slope * slope)
+    stats = Wall.check(outer, inner, min_thickness=0.9 * expected)
+
+    # A wall a little thinner than the limit is rejected
+    try:
+        Wall.check(outer, inner, min_thickness=1.01 * expected)
+        rejected = False
+    except Wall.WallError:
+        rejected = True
+
+    error = max(abs(stats['min'] - expected), abs(stats['max'] - expected))
+    print('{0}: {1} (thickness {2:.6f} to {3:.6f}, {4:.6f} expected)'.format(
+        name, 'ok' if error < 1.E-6 and rejected else 'DIFFERENT', stats['min'], stats['max'], expected))